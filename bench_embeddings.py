@@ -0,0 +1,56 @@
+import sys
+import os
+import time
+import random
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.rag_service import EMBEDDING_MODEL_NAME
+from services.embedding_pool import EmbeddingPool
+from services.simulation import synthetic_catalogue
+
+# Embedding throughput with concurrent callers: in-process SentenceTransformer vs the
+# process pool (EMBEDDING_PROCESSES) at several sizes. Use it to size EMBEDDING_PROCESSES:
+#   python bench_embeddings.py --processes 1 2 4 --callers 16 --texts 2000
+
+def run(embed, texts: list, callers: int, per_call: int) -> float:
+    calls = [texts[i:i + per_call] for i in range(0, len(texts), per_call)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=callers) as pool:
+        list(pool.map(embed, calls))
+    return len(texts) / (time.perf_counter() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding throughput.")
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, os.cpu_count() or 1])
+    parser.add_argument("--callers", type=int, default=16, help="Threads embedding at once (like concurrent requests)")
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--per-call", type=int, default=1, help="Texts per call (1 = query-style)")
+    parser.add_argument("--batch-window-ms", type=float, default=5)
+    parser.add_argument("--max-batch", type=int, default=64)
+    args = parser.parse_args()
+
+    texts = [f"{s['title']} by {s['artist']}. {s['tags']}" for s in synthetic_catalogue(args.texts, seed=random.randrange(10 ** 6))]
+    print(f"{args.texts} texts, {args.callers} concurrent callers, {args.per_call} per call, {os.cpu_count()} cores")
+    print(f"{'encoder':<14} {'texts/s':>9} {'avg batch':>10}")
+
+    from chromadb.utils import embedding_functions
+    in_process = embedding_functions.SentenceTransformerEmbeddingFunction(model_name=EMBEDDING_MODEL_NAME)
+    in_process(["warm up"])
+    print(f"{'in-process':<14} {run(in_process, texts, args.callers, args.per_call):>9.0f} {'-':>10}")
+
+    for processes in args.processes:
+        pool = EmbeddingPool(EMBEDDING_MODEL_NAME, processes=processes,
+                             batch_window=args.batch_window_ms / 1000, max_batch=args.max_batch)
+        try:
+            pool.warm_up()
+            throughput = run(pool, texts, args.callers, args.per_call)
+            print(f"{f'pool x{processes}':<14} {throughput:>9.0f} {pool.stats()['avg_batch_size']:>10}")
+        finally:
+            pool.shutdown()
+
+if __name__ == "__main__":
+    main()
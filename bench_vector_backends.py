@@ -0,0 +1,82 @@
+import sys
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.vector_backend import ChromaVectorBackend, NumpyVectorBackend
+
+# Compares the RAG vector backends on synthetic 384-dim vectors (the all-MiniLM-L6-v2 size):
+#   python bench_vector_backends.py --sizes 1000 10000 50000 --queries 200
+# Reports insert throughput, query latency (p50/p99) and how often Chroma's approximate
+# top-k agrees with the exact NumPy top-k. Use it to pick VECTOR_BACKEND per deployment.
+
+def random_unit_vectors(count: int, dim: int, rng) -> np.ndarray:
+    vectors = rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def fill(backend, vectors: np.ndarray, batch_size: int = 1000) -> float:
+    started = time.perf_counter()
+    for start in range(0, len(vectors), batch_size):
+        batch = vectors[start:start + batch_size]
+        ids = [str(i) for i in range(start, start + len(batch))]
+        backend.upsert(ids, batch, [{"title": f"Song {i}", "artist": "Bench", "type": "song"} for i in ids])
+    return time.perf_counter() - started
+
+def time_queries(backend, queries: np.ndarray, n_results: int):
+    latencies, results = [], []
+    for query in queries:
+        started = time.perf_counter()
+        results.append([c["id"] for c in backend.query(query, n_results=n_results)])
+        latencies.append((time.perf_counter() - started) * 1000)
+    return np.array(latencies), results
+
+def overlap(expected: list, actual: list) -> float:
+    hits = sum(len(set(e) & set(a)) for e, a in zip(expected, actual))
+    return hits / max(sum(len(e) for e in expected), 1)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Chroma vs NumPy vector backends.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    try:
+        import chromadb
+    except ImportError:
+        chromadb = None
+        print("chromadb not installed; benchmarking the NumPy backend only.")
+
+    rng = np.random.default_rng(42)
+    print(f"{'backend':<8} {'songs':>8} {'insert/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'recall':>7}")
+    for size in args.sizes:
+        vectors = random_unit_vectors(size, args.dim, rng)
+        queries = random_unit_vectors(args.queries, args.dim, rng)
+        workdir = tempfile.mkdtemp(prefix="vector-bench-")
+        try:
+            numpy_backend = NumpyVectorBackend(os.path.join(workdir, "numpy"))
+            insert_seconds = fill(numpy_backend, vectors)
+            latencies, exact = time_queries(numpy_backend, queries, args.top_k)
+            print(f"{'numpy':<8} {size:>8} {size / insert_seconds:>10.0f} "
+                  f"{np.percentile(latencies, 50):>8.3f} {np.percentile(latencies, 99):>8.3f} {1.0:>7.2f}")
+
+            if chromadb:
+                client = chromadb.PersistentClient(path=os.path.join(workdir, "chroma"))
+                chroma_backend = ChromaVectorBackend(client.get_or_create_collection("bench"))
+                insert_seconds = fill(chroma_backend, vectors)
+                latencies, approximate = time_queries(chroma_backend, queries, args.top_k)
+                print(f"{'chroma':<8} {size:>8} {size / insert_seconds:>10.0f} "
+                      f"{np.percentile(latencies, 50):>8.3f} {np.percentile(latencies, 99):>8.3f} "
+                      f"{overlap(exact, approximate):>7.2f}")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,7 @@ load_dotenv()
 
 
 # LLM Configuration
-LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai").lower() # openai, gemini, openrouter
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai").lower() # openai, gemini, openrouter, fake
 LLM_MODEL_NAME = os.getenv("LLM_MODEL_NAME", "gpt-4o") # Default model
 
 # Keys
@@ -14,7 +14,94 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 
 YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")
+YOUTUBE_PROVIDER = os.getenv("YOUTUBE_PROVIDER", "youtube").lower() # youtube, fake (offline fixture catalogue)
 DATA_DIR = os.getenv("DATA_DIR", "./data")
 
+# Database (DATABASE_URL overrides the SQLite file under DATA_DIR)
+DATABASE_URL = os.getenv("DATABASE_URL")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL") # NORMAL is durable enough with WAL
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "20000"))
+
+# Buffered Writes (Vote/PlayHistory rows are group-committed)
+DB_WRITE_BUFFER = os.getenv("DB_WRITE_BUFFER", "true").lower() == "true"
+DB_FLUSH_INTERVAL_MS = float(os.getenv("DB_FLUSH_INTERVAL_MS", "200"))
+DB_FLUSH_MAX_ROWS = int(os.getenv("DB_FLUSH_MAX_ROWS", "100"))
+DB_BUFFER_MAX_ROWS = int(os.getenv("DB_BUFFER_MAX_ROWS", "10000")) # Rows kept for retry while flushes fail
+
+# Suggest Pipeline (timeouts in seconds)
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "8"))
+YOUTUBE_TIMEOUT = float(os.getenv("YOUTUBE_TIMEOUT", "5"))
+SUGGEST_MAX_CONCURRENCY = int(os.getenv("SUGGEST_MAX_CONCURRENCY", "16")) # Suggestions processed at once
+SUGGEST_BATCH_MAX_ITEMS = int(os.getenv("SUGGEST_BATCH_MAX_ITEMS", "500")) # Largest /api/suggest/batch import
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20")) # Pooled connections per HTTP client
+
+# YouTube Response Caches (TTL in seconds) and Details Batching
+YOUTUBE_CACHE_SIZE = int(os.getenv("YOUTUBE_CACHE_SIZE", "4096"))
+YOUTUBE_SEARCH_CACHE_TTL = float(os.getenv("YOUTUBE_SEARCH_CACHE_TTL", str(6 * 3600)))
+YOUTUBE_DETAILS_CACHE_TTL = float(os.getenv("YOUTUBE_DETAILS_CACHE_TTL", str(24 * 3600)))
+YOUTUBE_BATCH_WINDOW_MS = float(os.getenv("YOUTUBE_BATCH_WINDOW_MS", "10")) # Wait to coalesce detail lookups
+
+# Queue Storage: "sqlite" (shared by all workers, survives restarts) or "memory" (single worker)
+QUEUE_BACKEND = os.getenv("QUEUE_BACKEND", "sqlite").lower()
+STATE_SYNC_INTERVAL = float(os.getenv("STATE_SYNC_INTERVAL", "1.0")) # Seconds between checks for other workers' changes
+STATE_COMPRESS_MIN_BYTES = int(os.getenv("STATE_COMPRESS_MIN_BYTES", "1024")) # /api/state bodies below this aren't gzip/brotli'd
+STATE_MAX_PAGE_SIZE = int(os.getenv("STATE_MAX_PAGE_SIZE", "200")) # Largest ?limit= for queue pages
+
+# Queue Ordering (score = up - down - skip_weight*skips - fairness_weight*requester's songs already queued)
+QUEUE_SKIP_WEIGHT = float(os.getenv("QUEUE_SKIP_WEIGHT", "1.0"))
+QUEUE_FAIRNESS_WEIGHT = float(os.getenv("QUEUE_FAIRNESS_WEIGHT", "0.5"))
+
+# Auto-DJ Candidate Selection
+AUTO_DJ_RECENT_LIMIT = int(os.getenv("AUTO_DJ_RECENT_LIMIT", "20")) # Last N plays are never auto-picked
+AUTO_DJ_DIVERSITY = float(os.getenv("AUTO_DJ_DIVERSITY", "0.7")) # MMR lambda: 1.0 = most similar only, lower = more varied
+AUTO_DJ_MUSIC_ONLY = os.getenv("AUTO_DJ_MUSIC_ONLY", "true").lower() == "true" # Skip songs tagged Non-Music
+AUTO_DJ_PREFETCH = int(os.getenv("AUTO_DJ_PREFETCH", "3")) # Picks kept ready in the background, 0 = compute on demand
+
+# RL Agent (seconds between background snapshots of the learned model)
+RL_FLUSH_INTERVAL = float(os.getenv("RL_FLUSH_INTERVAL", "5"))
+RL_UCB_ALPHA = float(os.getenv("RL_UCB_ALPHA", "1.0")) # Exploration: higher tries uncertain vibes more often
+RL_RECENT_VOTES = int(os.getenv("RL_RECENT_VOTES", "50")) # Votes in the recent up/down/skip ratio features
+RL_RECENT_PLAYS = int(os.getenv("RL_RECENT_PLAYS", "5")) # Plays in the "what was just played" centroid
+
+# RAG (seconds a RAG call waits for the background model/Chroma warm-up)
+RAG_READY_TIMEOUT = float(os.getenv("RAG_READY_TIMEOUT", "60"))
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000")) # Cached vectors (~1.5KB each)
+EMBEDDING_PROCESSES = int(os.getenv("EMBEDDING_PROCESSES", "0")) # Encoder processes (~1 per core), 0 = encode in-process
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5")) # Wait to merge concurrent callers
+EMBEDDING_MAX_BATCH = int(os.getenv("EMBEDDING_MAX_BATCH", "64")) # Texts per forward pass
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma").lower() # chroma, numpy (in-process mmap index)
+VECTOR_COMPACT_RATIO = float(os.getenv("VECTOR_COMPACT_RATIO", "0.25")) # numpy: rewrite once this share of rows is dead
+
+# RAG Re-index (songs read per checkpointed page, embedding threads)
+REINDEX_CHUNK_SIZE = int(os.getenv("REINDEX_CHUNK_SIZE", "512"))
+REINDEX_WORKERS = int(os.getenv("REINDEX_WORKERS", "4"))
+
+# RAG Ingestion (new songs are embedded in micro-batches off the request path)
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "1000")) # Overflow stays in the DB backlog
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "32"))
+INGEST_BATCH_WINDOW_MS = float(os.getenv("INGEST_BATCH_WINDOW_MS", "50")) # Wait to fill a batch
+INGEST_MAX_RETRIES = int(os.getenv("INGEST_MAX_RETRIES", "3"))
+INGEST_RETRY_DELAY = float(os.getenv("INGEST_RETRY_DELAY", "1.0")) # Seconds, doubled per retry
+
+# LLM Correction Cache
+CORRECTION_CACHE_SIZE = int(os.getenv("CORRECTION_CACHE_SIZE", "2048")) # Max cached queries (LRU)
+CORRECTION_CACHE_TTL = float(os.getenv("CORRECTION_CACHE_TTL", str(7 * 24 * 3600))) # Seconds, 0 = never expire
+CORRECTION_CACHE_PERSIST = os.getenv("CORRECTION_CACHE_PERSIST", "true").lower() == "true" # Saved under DATA_DIR
+
+# Fake Providers (YOUTUBE_PROVIDER=fake / LLM_PROVIDER=fake, for offline load tests)
+FAKE_CATALOGUE_PATH = os.getenv("FAKE_CATALOGUE_PATH") # JSON list of songs; unset = synthetic catalogue
+FAKE_CATALOGUE_SIZE = int(os.getenv("FAKE_CATALOGUE_SIZE", "5000"))
+FAKE_SEED = int(os.getenv("FAKE_SEED", "7"))
+FAKE_YOUTUBE_LATENCY_MS = float(os.getenv("FAKE_YOUTUBE_LATENCY_MS", "80")) # Mean injected latency per call
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "400"))
+FAKE_ERROR_RATE = float(os.getenv("FAKE_ERROR_RATE", "0.0")) # Share of calls that fail
+
+# Local Song Resolution (0-1 similarity needed to skip YouTube search)
+LOCAL_MATCH_THRESHOLD = float(os.getenv("LOCAL_MATCH_THRESHOLD", "0.8"))
+
 if not os.path.exists(DATA_DIR):
     os.makedirs(DATA_DIR)
@@ -0,0 +1,184 @@
+import sys
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+import httpx
+import numpy as np
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.fake_providers import load_catalogue
+
+# Locust-style load test for /api/suggest, /api/vote and /api/next. Start the server on the
+# fake providers so no request leaves the box, then point this at it:
+#   YOUTUBE_PROVIDER=fake LLM_PROVIDER=fake uvicorn main:app --workers 2
+#   python load_test.py --users 50 --duration 60
+# Each simulated user loops: pick a task by weight, call it, wait a think time. Suggest
+# queries come from the same fixture catalogue the fake providers serve (FAKE_* settings),
+# reworded like people type them or pasted as YouTube links/ids (--link-rate). Reports requests, failures and latency per endpoint.
+
+PHRASINGS = ["{title} by {artist}", "play {title}", "{title} {artist}", "that {title} song", "{title} - {artist}"]
+# Suggestions pasted as a YouTube link or bare id (no LLM or search, just a details lookup)
+LINKS = ["https://www.youtube.com/watch?v={id}", "https://youtu.be/{id}", "{id}"]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load test the jukebox API.")
+    parser.add_argument("--host", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", type=int, default=20, help="Concurrent simulated users")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to run")
+    parser.add_argument("--ramp-up", type=float, default=5, help="Seconds over which users start")
+    parser.add_argument("--think-min", type=float, default=0.5, help="Min seconds between a user's requests")
+    parser.add_argument("--think-max", type=float, default=2.0)
+    parser.add_argument("--suggest-weight", type=int, default=2)
+    parser.add_argument("--vote-weight", type=int, default=6)
+    parser.add_argument("--next-weight", type=int, default=1)
+    parser.add_argument("--miss-rate", type=float, default=0.1, help="Share of suggestions for songs not in the catalogue")
+    parser.add_argument("--link-rate", type=float, default=0.2, help="Share of suggestions sent as a YouTube link or id")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--max-p99-ms", type=float, help="Exit 1 if any endpoint's p99 is above this")
+    parser.add_argument("--max-failure-rate", type=float, help="Exit 1 if more than this share of requests fail")
+    return parser.parse_args()
+
+
+class LoadTest:
+    def __init__(self, args, catalogue: list):
+        self.args = args
+        self.catalogue = catalogue
+        self.song_ids = [] # Songs seen in responses, voted on by users
+        self.latencies = {}
+        self.failures = {}
+        self.rng = random.Random(args.seed)
+        self.tasks = [
+            (self.suggest, args.suggest_weight),
+            (self.vote, args.vote_weight),
+            (self.next, args.next_weight),
+        ]
+
+    def record(self, name: str, started: float, ok: bool):
+        self.latencies.setdefault(name, []).append((time.perf_counter() - started) * 1000)
+        if not ok:
+            self.failures[name] = self.failures.get(name, 0) + 1
+
+    def remember(self, response: httpx.Response):
+        song = response.json()
+        if song and song.get("id") is not None:
+            self.song_ids.append(song["id"])
+            del self.song_ids[:-200]
+
+    async def request(self, client: httpx.AsyncClient, name: str, method: str, path: str, ok_codes=(200,), **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, path, **kwargs)
+        except httpx.HTTPError:
+            self.record(name, started, ok=False)
+            return None
+        self.record(name, started, ok=response.status_code in ok_codes)
+        return response
+
+    async def suggest(self, client: httpx.AsyncClient, user: int):
+        chance = self.rng.random()
+        if chance < self.args.miss_rate:
+            query = f"unknown song {self.rng.randrange(10 ** 6)}"
+        elif chance < self.args.miss_rate + self.args.link_rate:
+            query = self.rng.choice(LINKS).format(id=self.rng.choice(self.catalogue)["youtube_id"])
+        else:
+            song = self.rng.choice(self.catalogue)
+            query = self.rng.choice(PHRASINGS).format(title=song["title"], artist=song["artist"]).lower()
+        # 404 is the expected answer for a song nobody has heard of
+        response = await self.request(client, "POST /api/suggest", "POST", "/api/suggest", ok_codes=(200, 404),
+                                      json={"query": query, "requested_by": f"user{user}"})
+        if response is not None and response.status_code == 200:
+            self.remember(response)
+
+    async def vote(self, client: httpx.AsyncClient, user: int):
+        if not self.song_ids:
+            return await self.suggest(client, user)
+        await self.request(client, "POST /api/vote", "POST", "/api/vote", json={
+            "song_id": self.rng.choice(self.song_ids),
+            "vote_type": self.rng.choices(["up", "down", "skip"], weights=[6, 2, 1])[0]
+        })
+
+    async def next(self, client: httpx.AsyncClient, user: int):
+        response = await self.request(client, "POST /api/next", "POST", "/api/next")
+        if response is not None and response.status_code == 200:
+            self.remember(response)
+
+    async def user(self, client: httpx.AsyncClient, user: int, deadline: float):
+        await asyncio.sleep(self.args.ramp_up * user / max(self.args.users, 1))
+        functions, weights = zip(*self.tasks)
+        while time.perf_counter() < deadline:
+            task = self.rng.choices(functions, weights=weights)[0]
+            await task(client, user)
+            await asyncio.sleep(self.rng.uniform(self.args.think_min, self.args.think_max))
+
+    async def run(self) -> float:
+        limits = httpx.Limits(max_connections=self.args.users, max_keepalive_connections=self.args.users)
+        async with httpx.AsyncClient(base_url=self.args.host, timeout=self.args.timeout, limits=limits) as client:
+            started = time.perf_counter()
+            deadline = started + self.args.duration
+            await asyncio.gather(*(self.user(client, user, deadline) for user in range(self.args.users)))
+            return time.perf_counter() - started
+
+    def report(self, wall_seconds: float) -> dict:
+        endpoints = {}
+        for name, latencies in sorted(self.latencies.items()):
+            latencies_ms = np.array(latencies)
+            endpoints[name] = {
+                "requests": len(latencies),
+                "failures": self.failures.get(name, 0),
+                "rps": round(len(latencies) / wall_seconds, 2),
+                "p50_ms": round(float(np.percentile(latencies_ms, 50)), 1),
+                "p95_ms": round(float(np.percentile(latencies_ms, 95)), 1),
+                "p99_ms": round(float(np.percentile(latencies_ms, 99)), 1),
+                "max_ms": round(float(latencies_ms.max()), 1)
+            }
+        requests = sum(e["requests"] for e in endpoints.values())
+        failures = sum(e["failures"] for e in endpoints.values())
+        return {
+            "users": self.args.users,
+            "wall_seconds": round(wall_seconds, 2),
+            "requests": requests,
+            "failures": failures,
+            "rps": round(requests / wall_seconds, 2),
+            "endpoints": endpoints
+        }
+
+
+def main():
+    args = parse_args()
+    catalogue = load_catalogue()
+    test = LoadTest(args, catalogue)
+    print(f"{args.users} users for {args.duration:.0f}s against {args.host} ({len(catalogue)} fixture songs)")
+    results = test.report(asyncio.run(test.run()))
+
+    print(f"{'endpoint':<18} {'reqs':>7} {'fails':>6} {'req/s':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for name, e in results["endpoints"].items():
+        print(f"{name:<18} {e['requests']:>7} {e['failures']:>6} {e['rps']:>7.1f} {e['p50_ms']:>8.1f} "
+              f"{e['p95_ms']:>8.1f} {e['p99_ms']:>8.1f} {e['max_ms']:>8.1f}")
+    print(f"{'total':<18} {results['requests']:>7} {results['failures']:>6} {results['rps']:>7.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    failures = []
+    if args.max_p99_ms is not None:
+        for name, e in results["endpoints"].items():
+            if e["p99_ms"] > args.max_p99_ms:
+                failures.append(f"{name} p99 {e['p99_ms']} ms > {args.max_p99_ms} ms")
+    if args.max_failure_rate is not None and results["requests"]:
+        rate = results["failures"] / results["requests"]
+        if rate > args.max_failure_rate:
+            failures.append(f"failure rate {rate:.3f} > {args.max_failure_rate}")
+    for failure in failures:
+        print(f"REGRESSION: {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,22 @@
+import time
+_process_started = time.perf_counter() # Cold start is measured from here
+
 import os
+import asyncio
 import logging
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from routers import api_router, bot_router
+from services import ai_service, youtube_service, rag_service
+from services.event_service import state_broadcaster
+from services.queue_manager import queue_manager
+from services.write_buffer import db_writer
+from services.ingest_service import ingestor
+from services.rl_service import agent
+from services import metrics_service
 import config
 
 # Setup Logging
@@ -20,8 +32,27 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template (/api/songs/{song_id}/stats), not the raw path
+        route = request.scope.get("route")
+        metrics_service.HTTP_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=route.path if route else "unmatched",
+            status=status
+        )
+
 # Static Files & Templates
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
@@ -30,16 +61,63 @@ templates = Jinja2Templates(directory="templates")
 app.include_router(api_router.router)
 app.include_router(bot_router.router)
 
+startup_seconds = None
+
 @app.on_event("startup")
 async def startup_event():
+    global startup_seconds
     logger.info("Initializing AI Office Jukebox...")
     # Queue/DB initialized on import of queue_manager
-    pass
+    # Embedding model + Chroma load in the background; non-RAG endpoints serve right away
+    rag_service.warm_up()
+    state_broadcaster.attach_loop(asyncio.get_running_loop())
+    db_writer.start()
+    agent.start()
+    # New songs are embedded in the background, plus any left over from the last run
+    ingestor.start()
+    # Keep the next Auto-DJ picks ready so /api/next doesn't compute them inline
+    queue_manager.prefetcher.start()
+    # Other workers share the queue store; forward their changes to our sockets
+    asyncio.create_task(queue_manager.watch_state())
+    startup_seconds = time.perf_counter() - _process_started
+    logger.info(f"Serving after {startup_seconds:.2f}s.")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Release pooled HTTP connections
+    await youtube_service.close_async_client()
+    await ai_service.close_async_clients()
+    ai_service.correction_cache.save()
+    # Write buffered votes/plays before exiting
+    db_writer.stop()
+    agent.stop()
+    queue_manager.prefetcher.stop()
+    ingestor.stop()
+    rag_service.close()
+
+@app.get("/health/ready")
+def health_ready():
+    """200 once the RAG model/collection are loaded, 503 while warming up."""
+    ready = rag_service.is_ready()
+    body = {
+        "status": "ready" if ready else "warming_up",
+        "rag_ready": ready,
+        "startup_seconds": startup_seconds,
+        "rag_warmup_seconds": rag_service.warmup_seconds
+    }
+    return JSONResponse(body, status_code=200 if ready else 503)
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus text format: per-route latency, pipeline stage spans, external calls, caches."""
+    return PlainTextResponse(metrics_service.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/")
 def read_root(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 if __name__ == "__main__":
+    # Development only. With EMBEDDING_PROCESSES > 0 serve with `uvicorn main:app`:
+    # spawned encoder processes would re-import this script and build the whole app.
     import uvicorn
     uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True)
@@ -1,16 +1,146 @@
 from sqlmodel import SQLModel, create_engine, Session
+from sqlalchemy import event, inspect
+from sqlalchemy.exc import OperationalError
 import os
-from config import DATA_DIR
-from models.db_models import Song, Vote, PlayHistory
+import logging
+from config import (
+    DATA_DIR,
+    DATABASE_URL,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    SQLITE_JOURNAL_MODE,
+    SQLITE_SYNCHRONOUS,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_CACHE_SIZE_KB
+)
+from models.db_models import Song, Vote, PlayHistory, SongStats
+
+logger = logging.getLogger(__name__)
 
 sqlite_file_name = "jukebox.db"
 sqlite_url = f"sqlite:///{os.path.join(DATA_DIR, sqlite_file_name)}"
 
-connect_args = {"check_same_thread": False}
-engine = create_engine(sqlite_url, connect_args=connect_args)
+def make_engine(url: str = None):
+    """
+    Creates the app engine. SQLite connections get WAL journaling, a busy timeout
+    (writers wait for the lock instead of failing) and a larger page cache.
+    """
+    url = url or DATABASE_URL or sqlite_url
+    if not url.startswith("sqlite"):
+        return create_engine(url, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW)
+
+    connect_args = {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}
+    new_engine = create_engine(
+        url,
+        connect_args=connect_args,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW
+    )
+
+    @event.listens_for(new_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+
+    return new_engine
+
+engine = make_engine()
+
+# Full-text index over Song title/artist, kept in sync by triggers
+SONG_FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS song_fts USING fts5(
+        title, artist, content='song', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS song_fts_ai AFTER INSERT ON song BEGIN
+        INSERT INTO song_fts(rowid, title, artist) VALUES (new.id, new.title, new.artist);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS song_fts_ad AFTER DELETE ON song BEGIN
+        INSERT INTO song_fts(song_fts, rowid, title, artist) VALUES ('delete', old.id, old.title, old.artist);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS song_fts_au AFTER UPDATE OF title, artist ON song BEGIN
+        INSERT INTO song_fts(song_fts, rowid, title, artist) VALUES ('delete', old.id, old.title, old.artist);
+        INSERT INTO song_fts(rowid, title, artist) VALUES (new.id, new.title, new.artist);
+    END""",
+]
+
+fts_available = False
 
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
+    add_missing_columns()
+    create_missing_indexes()
+    create_search_index()
+    backfill_song_stats()
+
+def add_missing_columns():
+    """create_all doesn't alter existing tables; add nullable columns declared later."""
+    inspector = inspect(engine)
+    for table in SQLModel.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            column_type = column.type.compile(dialect=engine.dialect)
+            with engine.begin() as conn:
+                conn.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}')
+            logger.info(f"Added column {table.name}.{column.name}")
+
+def create_missing_indexes():
+    """create_all only indexes new tables; add indexes declared later to existing ones."""
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+def backfill_song_stats():
+    """One-off aggregation of existing Vote/PlayHistory rows when SongStats is first created."""
+    with engine.begin() as conn:
+        if conn.exec_driver_sql("SELECT 1 FROM songstats LIMIT 1").first():
+            return
+        if not conn.exec_driver_sql("SELECT 1 FROM vote UNION ALL SELECT 1 FROM playhistory LIMIT 1").first():
+            return
+        conn.exec_driver_sql("""
+            INSERT INTO songstats (song_id, up_count, down_count, skip_count, play_count, score, last_played_at)
+            SELECT song_id, SUM(up), SUM(down), SUM(skip), SUM(plays), SUM(up) - SUM(down) - SUM(skip), MAX(played_at)
+            FROM (
+                SELECT song_id,
+                       CASE WHEN vote_type = 'up' THEN 1 ELSE 0 END AS up,
+                       CASE WHEN vote_type = 'down' THEN 1 ELSE 0 END AS down,
+                       CASE WHEN vote_type = 'skip' THEN 1 ELSE 0 END AS skip,
+                       0 AS plays, NULL AS played_at
+                FROM vote
+                UNION ALL
+                SELECT song_id, 0, 0, 0, 1, played_at FROM playhistory
+            )
+            GROUP BY song_id
+        """)
+        logger.info("Backfilled SongStats from existing votes and play history.")
+
+def create_search_index():
+    """Creates the FTS5 song index (if SQLite was built with FTS5) and backfills it on first run."""
+    global fts_available
+    if engine.dialect.name != "sqlite":
+        fts_available = False # FTS5 is SQLite-only; other databases use the LIKE scan
+        return
+    try:
+        with engine.begin() as conn:
+            exists = conn.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name='song_fts'"
+            ).first()
+            for statement in SONG_FTS_DDL:
+                conn.exec_driver_sql(statement)
+            if not exists:
+                conn.exec_driver_sql("INSERT INTO song_fts(song_fts) VALUES ('rebuild')")
+        fts_available = True
+    except OperationalError as e:
+        logger.warning(f"FTS5 not available, local song lookup will use LIKE scans: {e}")
+        fts_available = False
 
 def get_session():
     with Session(engine) as session:
@@ -1,6 +1,7 @@
 from typing import Optional, List
 from datetime import datetime
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import Index
 
 class Song(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -11,18 +12,31 @@ class Song(SQLModel, table=True):
     thumbnail_url: str
     added_at: datetime = Field(default_factory=datetime.utcnow)
     is_favorite: bool = Field(default=False)
-    embedding_id: Optional[str] = None # Link to ChromaDB
+    tags: Optional[str] = None # RAG tags from YouTube category/tags; None = not fetched yet
+    embedding_id: Optional[str] = Field(default=None, index=True) # Set once indexed in RAG; NULL = ingestion backlog
 
 class Vote(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    song_id: int = Field(foreign_key="song.id")
+    song_id: int = Field(foreign_key="song.id", index=True)
     vote_type: str # "up", "down", "skip"
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: datetime = Field(default_factory=datetime.utcnow, index=True)
     
 class PlayHistory(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     song_id: int = Field(foreign_key="song.id")
-    played_at: datetime = Field(default_factory=datetime.utcnow)
+    played_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+    action: Optional[str] = None # Auto-DJ action that picked the song (None = requested by a user)
+    context: Optional[str] = None # JSON feature vector the action was chosen with (offline replay)
+
+class SongStats(SQLModel, table=True):
+    """Per-song vote/play aggregates, updated incrementally with every Vote/PlayHistory write."""
+    song_id: int = Field(foreign_key="song.id", primary_key=True)
+    up_count: int = Field(default=0)
+    down_count: int = Field(default=0)
+    skip_count: int = Field(default=0)
+    play_count: int = Field(default=0)
+    score: int = Field(default=0, index=True) # up - down - skip
+    last_played_at: Optional[datetime] = Field(default=None)
 
 class Playlist(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -34,3 +48,26 @@ class PlaylistSong(SQLModel, table=True):
     playlist_id: int = Field(foreign_key="playlist.id")
     song_id: int = Field(foreign_key="song.id")
     added_at: datetime = Field(default_factory=datetime.utcnow)
+
+class QueueEntry(SQLModel, table=True):
+    """A song that is playing or waiting to play (the live queue, shared by all workers)."""
+    __table_args__ = (Index("ix_queueentry_status_priority", "status", "priority", "id"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    song_id: int = Field(foreign_key="song.id", index=True)
+    status: str = Field(default="queued") # "queued", "playing"
+    requested_by: str = Field(default="User")
+    requester_rank: int = Field(default=0) # Requester's songs already waiting when this was added
+    up_votes: int = Field(default=0)
+    down_votes: int = Field(default=0)
+    skip_votes: int = Field(default=0)
+    priority: float = Field(default=0.0) # Negated vote score; lowest plays first
+    enqueued_at: datetime = Field(default_factory=datetime.utcnow)
+    action: Optional[str] = None # Auto-DJ action that picked the song, credited by votes on it
+    context: Optional[str] = None # JSON feature vector the action was chosen with
+
+class QueueState(SQLModel, table=True):
+    """Single row holding the queue version, bumped by every queue mutation."""
+    id: int = Field(default=1, primary_key=True)
+    version: int = Field(default=0)
+    epoch: str = Field(default="") # Random id of this queue store, part of state ETags
@@ -0,0 +1,39 @@
+import sys
+import os
+import argparse
+import logging
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import REINDEX_CHUNK_SIZE, REINDEX_WORKERS
+from models.database import create_db_and_tables
+from services import rag_service
+from services.reindex_service import reindexer
+
+# Rebuilds the Chroma collection from jukebox.db.
+#   python reindex_rag.py              # shadow build + atomic swap, resumes an interrupted run
+#   python reindex_rag.py --in-place   # upsert straight into the live collection
+#   python reindex_rag.py --fresh      # ignore the checkpoint and start over
+# The server exposes the same job as POST /api/admin/reindex (progress: GET /api/admin/reindex).
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the RAG collection from the Song table.")
+    parser.add_argument("--in-place", action="store_true", help="Write into the active collection instead of a shadow copy")
+    parser.add_argument("--fresh", action="store_true", help="Ignore any saved checkpoint")
+    parser.add_argument("--chunk-size", type=int, default=REINDEX_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=REINDEX_WORKERS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    create_db_and_tables()
+    rag_service.warm_up(background=False)
+
+    reindexer.chunk_size = args.chunk_size
+    reindexer.workers = max(1, args.workers)
+    progress = reindexer.run(shadow=not args.in_place, resume=not args.fresh)
+    print(f"Re-index {progress['status']}: {progress.get('done', 0)}/{progress.get('total', 0)} songs")
+    return 0 if progress["status"] == "done" else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
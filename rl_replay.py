@@ -0,0 +1,36 @@
+import sys
+import os
+import argparse
+import json
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import RL_UCB_ALPHA
+from models.database import create_db_and_tables
+from services.rl_service import JukeboxAgent, VOTE_REWARDS, replay_evaluate
+from services.stats_service import get_auto_dj_events
+
+# Offline replay of logged Auto-DJ decisions (PlayHistory.action/context + votes) against
+# fresh agents, e.g. to pick RL_UCB_ALPHA before changing it in production:
+#   python rl_replay.py --alpha 0.1 0.5 1.0 2.0
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the Auto-DJ bandit on logged plays and votes.")
+    parser.add_argument("--alpha", type=float, nargs="+", default=[RL_UCB_ALPHA])
+    args = parser.parse_args()
+
+    create_db_and_tables()
+    events = get_auto_dj_events(VOTE_REWARDS)
+    if not events:
+        print("No logged Auto-DJ plays yet (PlayHistory rows with an action).")
+        return 1
+
+    for alpha in args.alpha:
+        # In-memory agent: nothing is read from or written to the live state file
+        result = replay_evaluate(JukeboxAgent(state_file=None, alpha=alpha), events)
+        print(f"alpha={alpha}: {json.dumps(result)}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
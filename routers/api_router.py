@@ -1,8 +1,21 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+import asyncio
+import logging
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Request, Response, WebSocket
+from fastapi.responses import StreamingResponse
 from services.queue_manager import queue_manager
+from services.event_service import state_broadcaster, choose_encoding, dumps
+from services.stats_service import get_leaderboard, get_song_stats
 from services.rl_service import agent
-from typing import Optional
+from services.ai_service import correction_cache
+from services.youtube_service import search_cache, details_cache
+from services import rag_service
+from services.rag_service import embedding_cache
+from services.reindex_service import reindexer
+from typing import List, Optional
 from pydantic import BaseModel
+from config import STATE_MAX_PAGE_SIZE, STATE_SYNC_INTERVAL, SUGGEST_BATCH_MAX_ITEMS
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api")
 
@@ -10,23 +23,99 @@ class SuggestionRequest(BaseModel):
     query: str
     requested_by: str = "User"
 
+class BatchSuggestionRequest(BaseModel):
+    items: List[str] # Search queries, YouTube links or video ids
+    requested_by: str = "User"
+
 class VoteRequest(BaseModel):
     song_id: int
     vote_type: str # "up", "down", "skip"
 
 @router.get("/state")
-def get_state():
-    """Get current playing song and queue."""
-    return queue_manager.get_queue()
+def get_state(request: Request, view: str = "slim", offset: int = 0, limit: Optional[int] = None):
+    """
+    Get current playing song and queue. Supports If-None-Match (304 when unchanged).
+    Bodies are pre-serialized once per version (and compressed once per encoding).
+    view=slim has only the fields the UI renders, view=full returns whole Song rows.
+    offset/limit page through a long queue; queue_total is always the full length.
+    Polls are answered from the last synced version; the shared queue version is only
+    looked up when that sync is older than STATE_SYNC_INTERVAL.
+    """
+    if view not in ("slim", "full"):
+        raise HTTPException(status_code=400, detail="view must be 'slim' or 'full'")
+    queue_manager.sync_state(max_age=STATE_SYNC_INTERVAL)
+    snapshot = state_broadcaster.snapshot
+    headers = {"ETag": snapshot.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if request.headers.get("if-none-match") == snapshot.etag:
+        return Response(status_code=304, headers=headers)
+    if limit is not None:
+        limit = max(0, min(limit, STATE_MAX_PAGE_SIZE))
+    body, encoding = snapshot.body(
+        view, offset, limit, encoding=choose_encoding(request.headers.get("accept-encoding", ""))
+    )
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+async def _wait_for_disconnect(websocket: WebSocket):
+    # Clients don't send anything; we only listen for the close
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+
+@router.websocket("/ws/state")
+async def state_socket(websocket: WebSocket):
+    """Pushes a full versioned state snapshot on connect and after every queue change."""
+    await websocket.accept()
+    updates = state_broadcaster.subscribe()
+    receiver = asyncio.create_task(_wait_for_disconnect(websocket))
+    try:
+        await websocket.send_text(state_broadcaster.payload)
+        while True:
+            getter = asyncio.create_task(updates.get())
+            done, _ = await asyncio.wait({getter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if receiver in done:
+                getter.cancel()
+                break
+            await websocket.send_text(getter.result())
+    except Exception:
+        pass # Client went away mid-send
+    finally:
+        receiver.cancel()
+        state_broadcaster.unsubscribe(updates)
 
 @router.post("/suggest")
-def suggest_song(request: SuggestionRequest):
+async def suggest_song(request: SuggestionRequest):
     """Search and add a song to the queue."""
-    song = queue_manager.add_song(request.query, request.requested_by)
+    song = await queue_manager.add_song_async(request.query, request.requested_by)
     if not song:
         raise HTTPException(status_code=404, detail="Song not found")
     return song
 
+@router.post("/suggest/batch")
+async def suggest_batch(request: BatchSuggestionRequest):
+    """
+    Add many songs at once (playlist import). Streams NDJSON: one line per item as it
+    resolves ({"index", "item", "status": "queued"|"duplicate"|"not_found", "song"}),
+    then a summary line with "status": "done".
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail="items must not be empty")
+    if len(request.items) > SUGGEST_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {SUGGEST_BATCH_MAX_ITEMS} items per batch")
+
+    async def progress():
+        try:
+            async for event in queue_manager.add_songs_batch(request.items, request.requested_by):
+                yield dumps(event) + b"\n"
+        except Exception as e:
+            # Headers are already sent; report the failure in the stream instead
+            logger.error(f"Batch suggestion failed: {e}")
+            yield dumps({"status": "error", "detail": str(e)}) + b"\n"
+
+    return StreamingResponse(progress(), media_type="application/x-ndjson")
+
 @router.post("/vote")
 def vote(request: VoteRequest):
     """Vote on a song."""
@@ -61,5 +150,45 @@ def add_to_playlist(playlist_id: int, song_id: int):
     return queue_manager.add_to_playlist(playlist_id, song_id)
 
 @router.get("/recommendations")
-def get_recommendations():
-    return queue_manager.get_recommendations()
+def get_recommendations(favorites_only: bool = False):
+    return queue_manager.get_recommendations(favorites_only=favorites_only)
+
+@router.get("/leaderboard")
+def leaderboard(limit: int = 10):
+    """Most up-voted songs (from the SongStats aggregates)."""
+    return get_leaderboard(min(limit, 100))
+
+@router.get("/songs/{song_id}/stats")
+def song_stats(song_id: int):
+    stats = get_song_stats(song_id)
+    if not stats:
+        raise HTTPException(status_code=404, detail="No stats for this song")
+    return stats
+
+@router.get("/cache/stats")
+def get_cache_stats():
+    """Hit/miss counters for the service caches."""
+    return {
+        "correction": correction_cache.stats(),
+        "youtube_search": search_cache.stats(),
+        "youtube_details": details_cache.stats(),
+        "embeddings": embedding_cache.stats()
+    }
+
+@router.post("/admin/reindex")
+def start_reindex(shadow: bool = True, resume: bool = True):
+    """Rebuilds the RAG collection from the Song table in the background."""
+    if not reindexer.start(shadow=shadow, resume=resume):
+        raise HTTPException(status_code=409, detail="Re-index already running")
+    return {"status": "started", "shadow": shadow, "resume": resume}
+
+@router.get("/admin/reindex")
+def reindex_progress():
+    return reindexer.progress
+
+@router.get("/admin/embeddings")
+def embedding_stats():
+    """Throughput and queue depth of the embedding process pool (EMBEDDING_PROCESSES)."""
+    if rag_service.embedding_pool is None:
+        return {"processes": 0}
+    return rag_service.embedding_pool.stats()
@@ -24,7 +24,7 @@ async def teams_webhook(request: Request):
         # Basic logic: if text starts with "play", treat as suggestion
         if text.lower().startswith("play "):
             query = text[5:].strip()
-            song = queue_manager.add_song(query, requested_by=user)
+            song = await queue_manager.add_song_async(query, requested_by=user)
             if song:
                 return {"status": "success", "message": f"Queued: {song.title}"}
             else:
@@ -1,104 +1,248 @@
 import os
+import re
 import logging
-import openai
-import google.generativeai as genai
+from typing import Optional
 from config import (
-    OPENAI_API_KEY, 
-    GEMINI_API_KEY, 
+    OPENAI_API_KEY,
+    GEMINI_API_KEY,
     OPENROUTER_API_KEY,
-    LLM_PROVIDER, 
-    LLM_MODEL_NAME
+    LLM_PROVIDER,
+    LLM_MODEL_NAME,
+    LLM_TIMEOUT,
+    DATA_DIR,
+    CORRECTION_CACHE_SIZE,
+    CORRECTION_CACHE_TTL,
+    CORRECTION_CACHE_PERSIST
 )
+from services.cache_service import TTLCache
+from services import fake_providers
+from services.metrics_service import external_call, EXTERNAL_ERRORS
 
 logger = logging.getLogger(__name__)
 
+SYSTEM_PROMPT = "You are a music assistant. Extract the likely Song Title and Artist from the user input. Return ONLY the format: 'Title - Artist'. If unsure, return the original text."
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+OPENROUTER_HEADERS = {
+    "HTTP-Referer": "https://github.com/your-repo/ai-office-jukebox", # Optional: good practice
+    "X-Title": "AI Office Jukebox"
+}
+
+# Normalized input -> corrected 'Title - Artist'
+correction_cache = TTLCache(
+    "correction",
+    maxsize=CORRECTION_CACHE_SIZE,
+    ttl=CORRECTION_CACHE_TTL,
+    path=os.path.join(DATA_DIR, "correction_cache.json") if CORRECTION_CACHE_PERSIST else None
+)
+
+# Clients are created once and reused so connections stay pooled between requests.
+# SDKs are imported on first use so LLM_PROVIDER=fake runs without them installed.
+_clients = {}
+
 def get_openai_client():
     if not OPENAI_API_KEY:
         logger.error("OPENAI_API_KEY is missing.")
         return None
-    return openai.OpenAI(api_key=OPENAI_API_KEY)
+    if "openai" not in _clients:
+        import openai
+        _clients["openai"] = openai.OpenAI(api_key=OPENAI_API_KEY, timeout=LLM_TIMEOUT)
+    return _clients["openai"]
 
 def get_openrouter_client():
     if not OPENROUTER_API_KEY:
         logger.error("OPENROUTER_API_KEY is missing.")
         return None
-    return openai.OpenAI(
-        base_url="https://openrouter.ai/api/v1",
-        api_key=OPENROUTER_API_KEY,
-        default_headers={
-             "HTTP-Referer": "https://github.com/your-repo/ai-office-jukebox", # Optional: good practice
-             "X-Title": "AI Office Jukebox"
-        }
-    )
+    if "openrouter" not in _clients:
+        import openai
+        _clients["openrouter"] = openai.OpenAI(
+            base_url=OPENROUTER_BASE_URL,
+            api_key=OPENROUTER_API_KEY,
+            default_headers=OPENROUTER_HEADERS,
+            timeout=LLM_TIMEOUT
+        )
+    return _clients["openrouter"]
+
+def get_async_openai_client():
+    if not OPENAI_API_KEY:
+        logger.error("OPENAI_API_KEY is missing.")
+        return None
+    if "openai_async" not in _clients:
+        import openai
+        _clients["openai_async"] = openai.AsyncOpenAI(api_key=OPENAI_API_KEY, timeout=LLM_TIMEOUT)
+    return _clients["openai_async"]
+
+def get_async_openrouter_client():
+    if not OPENROUTER_API_KEY:
+        logger.error("OPENROUTER_API_KEY is missing.")
+        return None
+    if "openrouter_async" not in _clients:
+        import openai
+        _clients["openrouter_async"] = openai.AsyncOpenAI(
+            base_url=OPENROUTER_BASE_URL,
+            api_key=OPENROUTER_API_KEY,
+            default_headers=OPENROUTER_HEADERS,
+            timeout=LLM_TIMEOUT
+        )
+    return _clients["openrouter_async"]
 
 def get_gemini_client():
     if not GEMINI_API_KEY:
         logger.error("GEMINI_API_KEY is missing.")
         return None
-    genai.configure(api_key=GEMINI_API_KEY)
-    return genai.GenerativeModel(LLM_MODEL_NAME or "gemini-1.5-flash")
+    if "gemini" not in _clients:
+        import google.generativeai as genai
+        genai.configure(api_key=GEMINI_API_KEY)
+        _clients["gemini"] = genai.GenerativeModel(LLM_MODEL_NAME or "gemini-1.5-flash")
+    return _clients["gemini"]
+
+async def close_async_clients():
+    """Closes the pooled async LLM clients (called on app shutdown)."""
+    for name in ("openai_async", "openrouter_async"):
+        client = _clients.pop(name, None)
+        if client:
+            await client.close()
+
+
+def _chat_messages(input_text: str) -> list:
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": input_text}
+    ]
+
+def _gemini_prompt(input_text: str) -> str:
+    # Gemini doesn't have system prompts in the same way for simple generation,
+    # but we can prepend it or use system_instruction if model supports it.
+    # For simplicity across versions, we'll prepend.
+    return f"{SYSTEM_PROMPT}\n\nUser Input: {input_text}"
+
+def normalize_query(input_text: str) -> str:
+    """Case-folds, collapses whitespace and trims surrounding punctuation so equivalent requests share a cache key."""
+    text = re.sub(r"\s+", " ", input_text.casefold()).strip()
+    return text.strip(" .,!?;:'\"")
+
+def _cache_key(input_text: str) -> str:
+    # Provider/model are part of the key so switching LLMs doesn't serve stale answers
+    return f"{LLM_PROVIDER}:{LLM_MODEL_NAME}:{normalize_query(input_text)}"
+
+def _clean_content(content, input_text: str) -> str:
+    if not content or not content.strip():
+        return input_text
+    return content.strip()
 
 
 def correct_song_name(input_text: str) -> str:
     """
     Uses the configured LLM to parse a messy input string into a clean 'Song - Artist' format.
     Example: 'play that one song by queen about mamas' -> 'Bohemian Rhapsody - Queen'
+    Repeat queries are served from correction_cache.
     """
-    system_prompt = "You are a music assistant. Extract the likely Song Title and Artist from the user input. Return ONLY the format: 'Title - Artist'. If unsure, return the original text."
-    
+    key = _cache_key(input_text)
+    cached = correction_cache.get(key)
+    if cached is not None:
+        return cached
+
+    corrected = _correct_song_name_uncached(input_text)
+    if corrected is None:
+        return input_text
+    correction_cache.set(key, corrected)
+    return corrected
+
+
+async def correct_song_name_async(input_text: str) -> str:
+    """Async variant of correct_song_name; does not block the event loop."""
+    key = _cache_key(input_text)
+    cached = correction_cache.get(key)
+    if cached is not None:
+        return cached
+
+    corrected = await _correct_song_name_uncached_async(input_text)
+    if corrected is None:
+        return input_text
+    correction_cache.set(key, corrected)
+    return corrected
+
+
+@external_call("llm", LLM_PROVIDER)
+def _correct_song_name_uncached(input_text: str) -> Optional[str]:
+    """Calls the LLM. Returns None when no answer could be obtained (so it isn't cached)."""
     try:
         if LLM_PROVIDER == "openai":
             client = get_openai_client()
-            if not client: return input_text
-            
+            if not client: return None
+
             response = client.chat.completions.create(
                 model=LLM_MODEL_NAME or "gpt-4o",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": input_text}
-                ],
+                messages=_chat_messages(input_text),
                 max_tokens=50
             )
-            content = response.choices[0].message.content
-            if not content or not content.strip():
-                return input_text
-            return content.strip()
+            return _clean_content(response.choices[0].message.content, input_text)
 
         elif LLM_PROVIDER == "openrouter":
             client = get_openrouter_client()
-            if not client: return input_text
+            if not client: return None
 
             response = client.chat.completions.create(
                 model=LLM_MODEL_NAME, # User must specify, e.g., 'openai/gpt-3.5-turbo'
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": input_text}
-                ],
+                messages=_chat_messages(input_text),
                 max_tokens=50
             )
-            content = response.choices[0].message.content
-            if not content or not content.strip():
-                return input_text
-            return content.strip()
+            return _clean_content(response.choices[0].message.content, input_text)
 
         elif LLM_PROVIDER == "gemini":
             model = get_gemini_client()
-            if not model: return input_text
-            
-            # Gemini doesn't have system prompts in the same way for simple generation, 
-            # but we can prepend it or use system_instruction if model supports it.
-            # For simplicity across versions, we'll prepend.
-            full_prompt = f"{system_prompt}\n\nUser Input: {input_text}"
-            
-            response = model.generate_content(full_prompt)
-            if response.text:
-                return response.text.strip() or input_text
-            return input_text
+            if not model: return None
+
+            response = model.generate_content(_gemini_prompt(input_text))
+            return _clean_content(response.text, input_text)
+
+        elif LLM_PROVIDER == "fake":
+            return _clean_content(fake_providers.get_llm().correct(input_text), input_text)
 
         else:
             logger.warning(f"Unknown LLM_PROVIDER: {LLM_PROVIDER}. Returning original text.")
-            return input_text
+            return None
 
     except Exception as e:
         logger.error(f"AI Correction Error ({LLM_PROVIDER}): {e}")
-        return input_text
+        EXTERNAL_ERRORS.inc(service="llm", call=LLM_PROVIDER)
+        return None
+
+
+@external_call("llm", LLM_PROVIDER)
+async def _correct_song_name_uncached_async(input_text: str) -> Optional[str]:
+    try:
+        if LLM_PROVIDER in ("openai", "openrouter"):
+            if LLM_PROVIDER == "openai":
+                client = get_async_openai_client()
+                model_name = LLM_MODEL_NAME or "gpt-4o"
+            else:
+                client = get_async_openrouter_client()
+                model_name = LLM_MODEL_NAME
+            if not client: return None
+
+            response = await client.chat.completions.create(
+                model=model_name,
+                messages=_chat_messages(input_text),
+                max_tokens=50
+            )
+            return _clean_content(response.choices[0].message.content, input_text)
+
+        elif LLM_PROVIDER == "gemini":
+            model = get_gemini_client()
+            if not model: return None
+
+            response = await model.generate_content_async(_gemini_prompt(input_text))
+            return _clean_content(response.text, input_text)
+
+        elif LLM_PROVIDER == "fake":
+            return _clean_content(await fake_providers.get_llm().correct_async(input_text), input_text)
+
+        else:
+            logger.warning(f"Unknown LLM_PROVIDER: {LLM_PROVIDER}. Returning original text.")
+            return None
+
+    except Exception as e:
+        logger.error(f"AI Correction Error ({LLM_PROVIDER}): {e}")
+        EXTERNAL_ERRORS.inc(service="llm", call=LLM_PROVIDER)
+        return None
@@ -0,0 +1,147 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with optional TTL expiry and optional JSON persistence.
+    Expiry uses wall-clock time so persisted entries keep their TTL across restarts.
+    Values must be JSON-serializable when a path is given.
+    Every cache registers itself in TTLCache.instances (exported by /metrics).
+    """
+
+    instances: list = []
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: Optional[float] = None,
+                 path: Optional[str] = None, save_every: int = 20):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self.save_every = save_every
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict() # key -> (value, expires_at or None)
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock() # One save at a time in this process
+        self._unsaved = 0
+        self._save_pending = False
+        TTLCache.instances.append(self)
+        if self.path:
+            self.load()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.time():
+                del self._data[key]
+                self.evictions += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        expires_at = time.time() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+            self._unsaved += 1
+            should_save = self.path and self._unsaved >= self.save_every and not self._save_pending
+            if should_save:
+                self._save_pending = True
+        if should_save:
+            # Written from a background thread: set() runs on request paths, even the event loop
+            threading.Thread(target=self._background_save, name=f"{self.name}-cache-save", daemon=True).start()
+
+    def _background_save(self):
+        try:
+            self.save()
+        finally:
+            with self._lock:
+                self._save_pending = False
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+    def save(self):
+        """
+        Atomically writes live entries to disk (temp file + rename). Each save uses its
+        own temp file, so concurrent saves (shutdown, other workers) never share one.
+        """
+        if not self.path:
+            return
+        with self._save_lock:
+            now = time.time()
+            with self._lock:
+                entries = [
+                    [key, value, expires_at]
+                    for key, (value, expires_at) in self._data.items()
+                    if expires_at is None or expires_at >= now
+                ]
+                self._unsaved = 0
+            tmp_path = None
+            try:
+                with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(self.path) or ".",
+                                                 prefix=os.path.basename(self.path) + ".", suffix=".tmp",
+                                                 delete=False) as f:
+                    tmp_path = f.name
+                    json.dump(entries, f)
+                os.replace(tmp_path, self.path)
+            except Exception as e:
+                logger.error(f"Failed to save {self.name} cache: {e}")
+                if tmp_path and os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                entries = json.load(f)
+        except Exception as e:
+            logger.error(f"Failed to load {self.name} cache, starting empty: {e}")
+            return
+        now = time.time()
+        with self._lock:
+            for key, value, expires_at in entries[-self.maxsize:]:
+                if expires_at is None or expires_at >= now:
+                    self._data[key] = (value, expires_at)
+        logger.info(f"Loaded {len(self._data)} entries into {self.name} cache.")
@@ -0,0 +1,89 @@
+import html
+import re
+import logging
+from typing import Optional
+from sqlmodel import Session, select, or_
+from sqlalchemy import text
+from models.db_models import Song
+from models import database
+from config import LOCAL_MATCH_THRESHOLD
+from services.metrics_service import span
+
+logger = logging.getLogger(__name__)
+
+# Words YouTube titles/channels add that say nothing about which song it is
+NOISE_TOKENS = {
+    "official", "video", "music", "audio", "lyrics", "lyric", "hd", "hq", "4k",
+    "mv", "ft", "feat", "featuring", "topic", "vevo", "visualizer", "version"
+}
+
+FEATURING_PATTERN = re.compile(r"\s(?:ft|feat|featuring)\b.*$", re.IGNORECASE)
+
+MAX_CANDIDATES = 20
+
+def tokenize(value: str) -> set:
+    """Lower-cased word tokens without noise words (handles HTML entities from the YouTube API)."""
+    words = re.findall(r"\w+", html.unescape(value).casefold())
+    tokens = set()
+    for word in words:
+        if word.endswith("vevo") and len(word) > 4:
+            word = word[:-4]
+        if word not in NOISE_TOKENS:
+            tokens.add(word)
+    return tokens
+
+def match_score(query_tokens: set, song: Song) -> float:
+    """Dice coefficient between the query tokens and the song's title+artist tokens."""
+    # Featured artists are dropped: queries rarely name them
+    song_tokens = tokenize(FEATURING_PATTERN.sub("", song.title)) | tokenize(song.artist)
+    if not query_tokens or not song_tokens:
+        return 0.0
+    return 2 * len(query_tokens & song_tokens) / (len(query_tokens) + len(song_tokens))
+
+def _candidate_ids(session: Session, query_tokens: set) -> list[int]:
+    if database.fts_available:
+        match_expr = " OR ".join(f'"{token}"' for token in query_tokens)
+        rows = session.exec(
+            text("SELECT rowid FROM song_fts WHERE song_fts MATCH :expr ORDER BY bm25(song_fts) LIMIT :limit"),
+            params={"expr": match_expr, "limit": MAX_CANDIDATES}
+        ).all()
+        return [row[0] for row in rows]
+
+    # Fallback: scan on the most specific (longest) token
+    token = max(query_tokens, key=len)
+    pattern = f"%{token}%"
+    return session.exec(
+        select(Song.id).where(or_(Song.title.like(pattern), Song.artist.like(pattern))).limit(MAX_CANDIDATES)
+    ).all()
+
+@span("local_match")
+def find_local_song(query: str, threshold: float = LOCAL_MATCH_THRESHOLD) -> Optional[Song]:
+    """
+    Resolves a (corrected) 'Title - Artist' query against the Song table.
+    Returns the best match only if it scores at least `threshold`, otherwise None
+    so the caller falls back to YouTube search.
+    """
+    query_tokens = tokenize(query)
+    if not query_tokens:
+        return None
+
+    try:
+        with Session(database.engine) as session:
+            ids = _candidate_ids(session, query_tokens)
+            if not ids:
+                return None
+            songs = session.exec(select(Song).where(Song.id.in_(ids))).all()
+    except Exception as e:
+        logger.error(f"Local song lookup error: {e}")
+        return None
+
+    best, best_score = None, 0.0
+    for song in songs:
+        score = match_score(query_tokens, song)
+        if score > best_score or (score == best_score and best and song.id < best.id):
+            best, best_score = song, score
+
+    if best and best_score >= threshold:
+        logger.info(f"Resolved '{query}' locally -> {best.title} (score {best_score:.2f})")
+        return best
+    return None
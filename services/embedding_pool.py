@@ -0,0 +1,176 @@
+import os
+import sys
+import time
+import threading
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+import numpy as np
+from services.metrics_service import register_collector, Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+EMBEDDED_TEXTS = Counter("jukebox_embedding_texts_total", "Texts encoded by the embedding process pool.")
+EMBEDDING_BATCHES = Counter("jukebox_embedding_batches_total", "Batches sent to the embedding process pool.")
+EMBEDDING_QUEUE_DEPTH = Gauge("jukebox_embedding_queue_depth", "Texts waiting for a free embedding process.")
+EMBEDDING_IN_FLIGHT = Gauge("jukebox_embedding_in_flight", "Batches being encoded right now.")
+
+THROUGHPUT_WINDOW = 60 # Seconds of completed batches behind texts_per_sec
+APP_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+# --- Worker process side: one model per process, loaded once by the initializer ---
+
+_model = None
+
+def _init_worker(model_name: str, threads: int):
+    global _model
+    import torch
+    from sentence_transformers import SentenceTransformer
+    # processes * threads ~= cores, so the workers don't oversubscribe the CPU
+    torch.set_num_threads(threads)
+    _model = SentenceTransformer(model_name)
+
+def _encode(texts: list) -> np.ndarray:
+    # Same call as chromadb's SentenceTransformerEmbeddingFunction, so vectors match
+    return _model.encode(texts, convert_to_numpy=True, normalize_embeddings=False).astype(np.float32)
+
+
+# --- App side ---
+
+class EmbeddingPool:
+    """
+    SentenceTransformer encoding in `processes` worker processes, so encoding uses every
+    core instead of queueing behind the GIL. Drop-in embedding function: call it with a
+    list of texts from any thread and it blocks until the vectors are back.
+    Calls from concurrent callers are merged: texts wait up to `batch_window` seconds
+    (or until `max_batch` texts) and while every process is busy, so one forward pass
+    serves many callers. At most one batch per process is in flight.
+    Spawned processes re-import the launching script as __mp_main__, so the app must be
+    served by a launcher (`uvicorn main:app`): started as `python main.py`, every encoder
+    would import the app and build its services, and the pool refuses to start.
+    """
+
+    def __init__(self, model_name: str, processes: int, batch_window: float, max_batch: int):
+        self.model_name = model_name
+        self.processes = processes
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        launcher = getattr(sys.modules.get("__main__"), "__file__", None)
+        if launcher and os.path.abspath(launcher) == APP_SCRIPT:
+            raise RuntimeError("the embedding pool needs the app started with `uvicorn main:app`, not `python main.py`")
+        self.texts = 0
+        self.batches = 0
+        self._waiting = deque() # (texts, future) not yet sent to a process
+        self._waiting_texts = 0
+        self._in_flight = 0
+        self._completed = deque() # (finished_at, text count) for texts_per_sec
+        self._timer = None
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+        threads = max(1, (os.cpu_count() or 1) // processes)
+        # spawn, not fork: the app process already runs threads
+        self._executor = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model_name, threads)
+        )
+        register_collector(self._collect_metrics)
+
+    def warm_up(self):
+        """Starts every process and waits until each has loaded the model."""
+        started = time.perf_counter()
+        for future in [self._executor.submit(_encode, ["warm up"]) for _ in range(self.processes)]:
+            future.result()
+        logger.info(f"Embedding pool: {self.processes} processes loaded {self.model_name} "
+                    f"in {time.perf_counter() - started:.2f}s.")
+
+    def __call__(self, input: list) -> list:
+        texts = list(input)
+        if not texts:
+            return []
+        future = Future()
+        with self._lock:
+            self._waiting.append((texts, future))
+            self._waiting_texts += len(texts)
+            if self._waiting_texts >= self.max_batch or not self.batch_window:
+                self._dispatch()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.batch_window, self._window_closed)
+                self._timer.daemon = True
+                self._timer.start()
+        return list(future.result())
+
+    def _window_closed(self):
+        with self._lock:
+            self._timer = None
+            self._dispatch()
+
+    def _dispatch(self):
+        """Sends waiting texts to free processes (lock held). The rest waits for a batch to finish."""
+        while self._waiting and self._in_flight < self.processes:
+            requests, count = [], 0
+            while self._waiting and (not requests or count + len(self._waiting[0][0]) <= self.max_batch):
+                texts, future = self._waiting.popleft()
+                requests.append((texts, future))
+                count += len(texts)
+            self._waiting_texts -= count
+            self._in_flight += 1
+            batch = [text for texts, _ in requests for text in texts]
+            try:
+                submitted = self._executor.submit(_encode, batch)
+            except Exception as e: # Pool shut down or broken
+                self._in_flight -= 1
+                for _, future in requests:
+                    future.set_exception(e)
+                continue
+            submitted.add_done_callback(lambda done, requests=requests: self._batch_done(done, requests))
+
+    def _batch_done(self, done: Future, requests: list):
+        error = done.exception()
+        if error is None:
+            vectors, start = done.result(), 0
+            for texts, future in requests:
+                future.set_result(vectors[start:start + len(texts)])
+                start += len(texts)
+        else:
+            logger.error(f"Embedding batch failed: {error}")
+            for _, future in requests:
+                future.set_exception(error)
+
+        count = sum(len(texts) for texts, _ in requests)
+        with self._lock:
+            self._in_flight -= 1
+            if error is None:
+                self.texts += count
+                self.batches += 1
+                self._completed.append((time.monotonic(), count))
+                EMBEDDED_TEXTS.inc(count)
+                EMBEDDING_BATCHES.inc()
+            if self._timer is None or self._waiting_texts >= self.max_batch:
+                self._dispatch()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            while self._completed and self._completed[0][0] < now - THROUGHPUT_WINDOW:
+                self._completed.popleft()
+            recent = sum(count for _, count in self._completed)
+            window = min(THROUGHPUT_WINDOW, now - self._started) or 1
+            return {
+                "processes": self.processes,
+                "queue_depth": self._waiting_texts,
+                "in_flight": self._in_flight,
+                "texts": self.texts,
+                "batches": self.batches,
+                "avg_batch_size": round(self.texts / self.batches, 1) if self.batches else 0,
+                "texts_per_sec": round(recent / window, 1) # Over the last minute
+            }
+
+    def _collect_metrics(self):
+        EMBEDDING_QUEUE_DEPTH.set(self._waiting_texts)
+        EMBEDDING_IN_FLIGHT.set(self._in_flight)
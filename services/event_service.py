@@ -0,0 +1,180 @@
+import asyncio
+import gzip
+import json
+import threading
+import uuid
+import logging
+from typing import Optional
+from fastapi.encoders import jsonable_encoder
+from config import STATE_COMPRESS_MIN_BYTES
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# What the UI renders; /api/state?view=full returns whole Song rows instead
+SLIM_SONG_FIELDS = ("id", "youtube_id", "title", "artist", "thumbnail_url", "is_favorite")
+SLIM_ENTRY_FIELDS = SLIM_SONG_FIELDS + ("requested_by", "votes")
+MAX_CACHED_VARIANTS = 32 # Encoded bodies kept per snapshot (views x pages x encodings)
+
+
+def dumps(obj) -> bytes:
+    if orjson:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+def _project(item, fields: tuple) -> Optional[dict]:
+    if item is None:
+        return None
+    if not isinstance(item, dict):
+        item = item.model_dump()
+    return {field: item.get(field) for field in fields}
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = {part.split(";")[0].strip() for part in accept_encoding.lower().split(",")}
+    if brotli and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+class StateSnapshot:
+    """
+    One published version of the queue state, serialized once. Queue entries are encoded
+    individually, so any page of the queue is a byte join rather than a re-encode.
+    Compressed bodies and the full view are built on first request and then reused.
+    """
+
+    def __init__(self, epoch: str, version: int, state: dict):
+        self.epoch = epoch
+        self.version = version
+        self.revision = 0 # Set by the broadcaster when it publishes
+        self._state = state
+        queue = state.get("queue", [])
+        self._entries = [dumps(_project(entry, SLIM_ENTRY_FIELDS)) for entry in queue]
+        self._header = {
+            "epoch": epoch,
+            "version": version,
+            "now_playing": _project(state.get("now_playing"), SLIM_SONG_FIELDS),
+            "up_next": [_project(song, SLIM_SONG_FIELDS) for song in state.get("up_next", [])],
+            "queue_total": len(queue)
+        }
+        self.slim = self._assemble(0, len(queue))
+        self.payload = self.slim.decode("utf-8") # Pushed as-is to WebSocket subscribers
+        self._variants = {}
+        self._lock = threading.Lock()
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.epoch}-{self.version}.{self.revision}"'
+
+    def _assemble(self, offset: int, limit: int) -> bytes:
+        # Header fields first, then the queue spliced in from the pre-encoded entries
+        header = dumps({**self._header, "offset": offset})
+        return header[:-1] + b',"queue":[' + b",".join(self._entries[offset:offset + limit]) + b"]}"
+
+    def _full(self) -> bytes:
+        return dumps(jsonable_encoder({"epoch": self.epoch, "version": self.version, **self._state}))
+
+    def body(self, view: str = "slim", offset: int = 0, limit: Optional[int] = None,
+             encoding: Optional[str] = None) -> tuple:
+        """(body bytes, Content-Encoding or None). Small bodies are never compressed."""
+        offset = max(offset, 0)
+        if view == "full" or (offset == 0 and (limit is None or limit >= len(self._entries))):
+            offset, limit = 0, None # The whole queue
+        key = (view, offset, limit, encoding)
+        with self._lock:
+            cached = self._variants.get(key)
+        if cached is not None:
+            return cached
+
+        if view == "full":
+            raw = self._full()
+        elif limit is None:
+            raw = self.slim
+        else:
+            raw = self._assemble(offset, limit)
+        result = (raw, None)
+        if encoding and len(raw) >= STATE_COMPRESS_MIN_BYTES:
+            compressed = brotli.compress(raw, quality=5) if encoding == "br" else gzip.compress(raw, compresslevel=6)
+            result = (compressed, encoding)
+
+        with self._lock:
+            if len(self._variants) < MAX_CACHED_VARIANTS:
+                self._variants[key] = result
+        return result
+
+
+class StateBroadcaster:
+    """
+    Holds the latest queue snapshot (serialized once per version) and pushes it to
+    WebSocket subscribers. publish() may be called from any thread; delivery happens
+    on the server's event loop. Slow subscribers only ever get the newest snapshot.
+    """
+
+    def __init__(self):
+        self.epoch = uuid.uuid4().hex[:8] # Queue store id; keeps ETags from matching across stores
+        self.snapshot = StateSnapshot(self.epoch, 0, {})
+        self._subscribers = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> int:
+        return self.snapshot.version
+
+    @property
+    def revision(self) -> int:
+        return self.snapshot.revision # Republishes of the same version (e.g. up_next refreshed)
+
+    @property
+    def etag(self) -> str:
+        return self.snapshot.etag
+
+    @property
+    def payload(self) -> str:
+        return self.snapshot.payload
+
+    def attach_loop(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+
+    def publish(self, version: int, state: dict):
+        snapshot = StateSnapshot(self.epoch, version, state)
+        with self._lock:
+            current = self.snapshot
+            if version < current.version:
+                return # An older snapshot lost the race
+            snapshot.revision = current.revision + 1 if version == current.version else 0
+            self.snapshot = snapshot
+        if self._loop and self._subscribers:
+            self._loop.call_soon_threadsafe(self._fan_out, snapshot.payload)
+
+    def _fan_out(self, payload: str):
+        for queue in list(self._subscribers):
+            if queue.full():
+                queue.get_nowait() # Drop the stale snapshot
+            queue.put_nowait(payload)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=1)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+
+state_broadcaster = StateBroadcaster()
@@ -0,0 +1,199 @@
+import re
+import json
+import time
+import random
+import asyncio
+import hashlib
+import logging
+from typing import Optional
+from config import (
+    FAKE_CATALOGUE_PATH,
+    FAKE_CATALOGUE_SIZE,
+    FAKE_SEED,
+    FAKE_YOUTUBE_LATENCY_MS,
+    FAKE_LLM_LATENCY_MS,
+    FAKE_ERROR_RATE
+)
+from services.simulation import synthetic_catalogue
+
+logger = logging.getLogger(__name__)
+
+# Offline stand-ins for the YouTube Data API and the LLM (YOUTUBE_PROVIDER=fake, LLM_PROVIDER=fake).
+# Both answer from a local fixture catalogue with injected latency and errors, so the full
+# suggest pipeline (caches, batching, timeouts, RAG) runs on an air-gapped box for load tests.
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9\-]+")
+MUSIC_CATEGORY_ID = "10"
+
+
+class FakeProviderError(RuntimeError):
+    """Injected failure (FAKE_ERROR_RATE); callers handle it like a network error."""
+
+
+def load_catalogue(path: Optional[str] = FAKE_CATALOGUE_PATH, size: int = FAKE_CATALOGUE_SIZE,
+                   seed: int = FAKE_SEED) -> list:
+    """
+    The fixture catalogue: a JSON list of {youtube_id, title, artist, tags[, duration]} from
+    `path`, or the synthetic catalogue from services/simulation.py when no path is set.
+    load_test.py calls this too, so its queries match what the fake providers serve.
+    """
+    if path:
+        with open(path) as f:
+            return json.load(f)
+    return synthetic_catalogue(size, seed=seed)
+
+
+def _tokens(text: str) -> list:
+    return TOKEN_PATTERN.findall(text.lower())
+
+def _duration(youtube_id: str) -> str:
+    # Stable 2:30-5:30 length per video, in the API's ISO 8601 format
+    seconds = 150 + int(hashlib.sha1(youtube_id.encode("utf-8")).hexdigest(), 16) % 180
+    return f"PT{seconds // 60}M{seconds % 60}S"
+
+
+class FakeCatalogue:
+    """Token index over the fixture songs; search ranks by shared words with the title/artist."""
+
+    def __init__(self, songs: list):
+        self.songs = songs
+        self.by_id = {song["youtube_id"]: song for song in songs}
+        self._index = {}
+        for position, song in enumerate(songs):
+            for token in set(_tokens(f"{song['title']} {song['artist']}")):
+                self._index.setdefault(token, []).append(position)
+
+    def search(self, query: str, limit: int) -> list:
+        scores = {}
+        for token in set(_tokens(query)):
+            for position in self._index.get(token, ()):
+                scores[position] = scores.get(position, 0) + 1
+        best = sorted(scores, key=lambda position: (-scores[position], position))[:limit]
+        return [self.songs[position] for position in best]
+
+
+class FakeProvider:
+    """Shared latency/error injection. Latency is uniform in 0.5x-1.5x of the configured mean."""
+
+    def __init__(self, latency_ms: float, error_rate: float, seed: int):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.calls = 0
+        self.errors = 0
+        self._rng = random.Random(seed)
+
+    def _delay(self) -> float:
+        self.calls += 1
+        if self._rng.random() < self.error_rate:
+            self.errors += 1
+            raise FakeProviderError(f"{type(self).__name__}: injected failure")
+        return self.latency_ms * self._rng.uniform(0.5, 1.5) / 1000
+
+    def _wait(self):
+        delay = self._delay()
+        if delay:
+            time.sleep(delay)
+
+    async def _wait_async(self):
+        delay = self._delay()
+        if delay:
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "errors": self.errors}
+
+
+class FakeYouTube(FakeProvider):
+    """Answers search.list / videos.list requests with the same JSON shape as the real API."""
+
+    def __init__(self, catalogue: FakeCatalogue, latency_ms: float = FAKE_YOUTUBE_LATENCY_MS,
+                 error_rate: float = FAKE_ERROR_RATE, seed: int = FAKE_SEED):
+        super().__init__(latency_ms, error_rate, seed)
+        self.catalogue = catalogue
+
+    def search(self, query: str, max_results: int) -> dict:
+        self._wait()
+        return self._search_response(query, max_results)
+
+    async def search_async(self, query: str, max_results: int) -> dict:
+        await self._wait_async()
+        return self._search_response(query, max_results)
+
+    def videos(self, video_ids: list) -> dict:
+        self._wait()
+        return self._videos_response(video_ids)
+
+    def _search_response(self, query: str, max_results: int) -> dict:
+        return {"items": [
+            {
+                "id": {"videoId": song["youtube_id"]},
+                "snippet": {
+                    "title": song["title"],
+                    "channelTitle": song["artist"],
+                    "thumbnails": {"default": {"url": f"https://i.ytimg.com/vi/{song['youtube_id']}/default.jpg"}}
+                }
+            }
+            for song in self.catalogue.search(query, max_results)
+        ]}
+
+    def _videos_response(self, video_ids: list) -> dict:
+        items = []
+        for vid in video_ids:
+            song = self.catalogue.by_id.get(vid)
+            if song is None:
+                continue
+            tags = song.get("tags", "")
+            items.append({
+                "id": vid,
+                "contentDetails": {"duration": song.get("duration") or _duration(vid)},
+                "snippet": {
+                    "title": song["title"],
+                    "channelTitle": song["artist"],
+                    "categoryId": MUSIC_CATEGORY_ID,
+                    "tags": [tag.strip() for tag in tags.split(",")] if isinstance(tags, str) else tags
+                }
+            })
+        return {"items": items}
+
+
+class FakeLLM(FakeProvider):
+    """Corrects a query to the best-matching catalogue song as 'Title - Artist', else echoes it."""
+
+    def __init__(self, catalogue: FakeCatalogue, latency_ms: float = FAKE_LLM_LATENCY_MS,
+                 error_rate: float = FAKE_ERROR_RATE, seed: int = FAKE_SEED + 1):
+        super().__init__(latency_ms, error_rate, seed)
+        self.catalogue = catalogue
+
+    def correct(self, input_text: str) -> str:
+        self._wait()
+        return self._answer(input_text)
+
+    async def correct_async(self, input_text: str) -> str:
+        await self._wait_async()
+        return self._answer(input_text)
+
+    def _answer(self, input_text: str) -> str:
+        matches = self.catalogue.search(input_text, 1)
+        if not matches:
+            return input_text
+        return f"{matches[0]['title']} - {matches[0]['artist']}"
+
+
+_providers = {}
+
+def _catalogue() -> FakeCatalogue:
+    if "catalogue" not in _providers:
+        songs = load_catalogue()
+        logger.info(f"Fake providers serving {len(songs)} fixture songs.")
+        _providers["catalogue"] = FakeCatalogue(songs)
+    return _providers["catalogue"]
+
+def get_youtube() -> FakeYouTube:
+    if "youtube" not in _providers:
+        _providers["youtube"] = FakeYouTube(_catalogue())
+    return _providers["youtube"]
+
+def get_llm() -> FakeLLM:
+    if "llm" not in _providers:
+        _providers["llm"] = FakeLLM(_catalogue())
+    return _providers["llm"]
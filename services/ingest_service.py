@@ -0,0 +1,216 @@
+import time
+import queue
+import threading
+import logging
+from typing import Optional
+from sqlalchemy import String, cast
+from sqlmodel import Session, select, update
+from models.db_models import Song
+from models import database
+from services import rag_service
+from services.metrics_service import span, register_collector, Counter, Gauge
+from config import INGEST_QUEUE_SIZE, INGEST_BATCH_SIZE, INGEST_BATCH_WINDOW_MS, INGEST_MAX_RETRIES, INGEST_RETRY_DELAY
+
+logger = logging.getLogger(__name__)
+
+INGESTED = Counter("jukebox_ingest_songs_total", "Songs embedded and upserted by the ingestion worker.", ("result",))
+INGEST_QUEUED = Gauge("jukebox_ingest_queue_size", "Song ids waiting for the ingestion worker.")
+
+RECONCILE_CHUNK = 500 # Backlog ids checked against the index per lookup
+
+
+class IngestionWorker:
+    """
+    Embeds new songs and upserts them into the RAG index from a background thread, so
+    /api/suggest returns right after the DB commit. Ids wait in a bounded queue and are
+    processed in micro-batches (up to `batch_size`, collected for at most `batch_window`
+    seconds) with one embedding pass per batch; failed batches are retried with backoff.
+    The persisted backlog is the Song table itself: rows with embedding_id NULL. It is
+    rescanned on start (so nothing is lost on restart) and after the queue overflowed.
+    The first scan marks backlog songs the active index already holds (indexed before
+    embedding_id was tracked), so only songs that are really missing get embedded.
+    """
+
+    def __init__(self, maxsize: int, batch_size: int, batch_window: float, max_retries: int, retry_delay: float):
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.ingested = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._queued = set() # Ids in the queue, so backlog scans don't add duplicates
+        self._lock = threading.Lock()
+        self._reconciled = False
+        self._rescan = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def submit(self, song_id: int):
+        """Queues a saved song for indexing; never blocks the caller."""
+        if not self._thread:
+            # Not running (scripts, Teams bot tests): index inline like before
+            try:
+                self._ingest([song_id])
+            except Exception as e:
+                logger.error(f"Indexing song {song_id} failed: {e}")
+            return
+        with self._lock:
+            if song_id in self._queued:
+                return
+            try:
+                self._queue.put_nowait(song_id)
+            except queue.Full:
+                # Still in the backlog (embedding_id NULL); picked up by the next scan
+                self._rescan.set()
+                return
+            self._queued.add(song_id)
+
+    def submit_many(self, song_ids: list):
+        """Queues several saved songs (bulk imports); inline they're indexed in one batch."""
+        if not self._thread:
+            try:
+                self._ingest(list(song_ids))
+            except Exception as e:
+                logger.error(f"Indexing {len(song_ids)} songs failed: {e}")
+            return
+        for song_id in song_ids:
+            self.submit(song_id)
+
+    def _scan_backlog(self):
+        self._rescan.clear()
+        with Session(database.engine) as session:
+            song_ids = session.exec(select(Song.id).where(Song.embedding_id == None).order_by(Song.id)).all()
+        if song_ids and not self._reconciled:
+            song_ids = self._mark_indexed(song_ids)
+            if song_ids is None:
+                logger.warning("RAG not available; ingestion backlog left for the next start.")
+                return
+            self._reconciled = True
+        if song_ids:
+            logger.info(f"Ingestion backlog: {len(song_ids)} songs without embeddings.")
+        for song_id in song_ids:
+            with self._lock:
+                if song_id in self._queued:
+                    continue
+                if self._queue.full():
+                    self._rescan.set()
+                    return
+                self._queue.put_nowait(song_id)
+                self._queued.add(song_id)
+
+    def _mark_indexed(self, song_ids: list) -> Optional[list]:
+        """Sets embedding_id for backlog songs already in the active index; returns the rest (None without RAG)."""
+        missing = []
+        marked = 0
+        for start in range(0, len(song_ids), RECONCILE_CHUNK):
+            chunk = song_ids[start:start + RECONCILE_CHUNK]
+            indexed = rag_service.indexed_ids(chunk)
+            if indexed is None:
+                return None
+            found = [song_id for song_id in chunk if str(song_id) in indexed]
+            if found:
+                with Session(database.engine) as session:
+                    session.exec(update(Song).where(Song.id.in_(found)).values(embedding_id=cast(Song.id, String)))
+                    session.commit()
+                marked += len(found)
+            missing.extend(song_id for song_id in chunk if str(song_id) not in indexed)
+        if marked:
+            logger.info(f"Marked {marked} songs already in the RAG index as indexed.")
+        return missing
+
+    def _next_batch(self) -> list:
+        try:
+            batch = [self._queue.get(timeout=1.0)]
+        except queue.Empty:
+            return []
+        # Whatever arrives within the window joins the batch
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        with self._lock:
+            self._queued.difference_update(batch)
+        return batch
+
+    @span("ingest_batch")
+    def _ingest(self, song_ids: list) -> bool:
+        with Session(database.engine) as session:
+            rows = session.exec(select(Song).where(Song.id.in_(song_ids), Song.embedding_id == None)).all()
+            songs = [
+                {"song_id": song.id, "title": song.title, "artist": song.artist, "tags": rag_service.index_tags(song.tags)}
+                for song in rows
+            ]
+        if not songs:
+            return True # Already indexed (e.g. by a re-index)
+        if not rag_service.add_songs_to_rag(songs):
+            return False
+        with Session(database.engine) as session:
+            for song in songs:
+                session.exec(update(Song).where(Song.id == song["song_id"]).values(embedding_id=str(song["song_id"])))
+            session.commit()
+        return True
+
+    def _ingest_with_retries(self, song_ids: list):
+        for attempt in range(self.max_retries + 1):
+            try:
+                if self._ingest(song_ids):
+                    self.ingested += len(song_ids)
+                    INGESTED.inc(len(song_ids), result="ok")
+                    return
+            except Exception as e:
+                logger.error(f"Ingestion of {len(song_ids)} songs failed: {e}")
+            if attempt < self.max_retries and self._stopping.wait(self.retry_delay * 2 ** attempt):
+                return # Shutting down; the songs stay in the backlog
+        # Left with embedding_id NULL: retried on the next start or re-index
+        self.failed += len(song_ids)
+        INGESTED.inc(len(song_ids), result="failed")
+        logger.error(f"Gave up indexing songs {song_ids} after {self.max_retries} retries.")
+
+    def _run(self):
+        self._rescan.set()
+        while not self._stopping.is_set():
+            if self._rescan.is_set():
+                try:
+                    self._scan_backlog()
+                except Exception as e:
+                    logger.error(f"Ingestion backlog scan failed: {e}")
+            batch = self._next_batch()
+            if batch:
+                self._ingest_with_retries(batch)
+
+    def start(self):
+        if not self._thread:
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="rag-ingest", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stops after the current batch; queued songs stay in the DB backlog for the next start."""
+        if self._thread:
+            self._stopping.set()
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> dict:
+        return {"pending": self.pending, "ingested": self.ingested, "failed": self.failed}
+
+
+ingestor = IngestionWorker(
+    maxsize=INGEST_QUEUE_SIZE,
+    batch_size=INGEST_BATCH_SIZE,
+    batch_window=INGEST_BATCH_WINDOW_MS / 1000,
+    max_retries=INGEST_MAX_RETRIES,
+    retry_delay=INGEST_RETRY_DELAY
+)
+
+register_collector(lambda: INGEST_QUEUED.set(ingestor.pending))
@@ -0,0 +1,200 @@
+import time
+import asyncio
+import threading
+import functools
+import logging
+from contextlib import contextmanager
+from typing import Callable, Optional
+from services.cache_service import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# In-process metrics rendered in the Prometheus text format on GET /metrics.
+# Counters and histograms are per process: with several uvicorn workers, scrape each one
+# (or aggregate with sum()/histogram_quantile() across instances, which the format supports).
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_metrics = []
+_collectors = []
+
+
+def _label_key(labelnames: tuple, labels: dict) -> tuple:
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+def _format_labels(labelnames: tuple, key: tuple, extra: Optional[dict] = None) -> str:
+    pairs = list(zip(labelnames, key)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, value: float, **labels):
+        """For totals that are counted elsewhere (e.g. TTLCache.hits) and copied in at scrape time."""
+        with self._lock:
+            self._values[_label_key(self.labelnames, labels)] = value
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_label_key(self.labelnames, labels)] = value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0] # bucket counts, sum, count
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            items = sorted((key, (list(s[0]), s[1], s[2])) for key, s in self._values.items())
+        for key, (counts, total, count) in items:
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, {'le': bound})} {bucket_count}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, {'le': '+Inf'})} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+HTTP_SECONDS = Histogram("jukebox_http_request_duration_seconds", "HTTP request latency by route.",
+                         ("method", "route", "status"))
+STAGE_SECONDS = Histogram("jukebox_stage_duration_seconds", "Time spent in an internal pipeline stage.", ("stage",))
+STAGE_ERRORS = Counter("jukebox_stage_errors_total", "Pipeline stages that raised.", ("stage",))
+STAGE_TIMEOUTS = Counter("jukebox_stage_timeouts_total", "Suggest stages that hit their timeout.", ("stage",))
+EXTERNAL_SECONDS = Histogram("jukebox_external_call_duration_seconds", "Latency of calls to YouTube/LLM providers.",
+                             ("service", "call"))
+EXTERNAL_ERRORS = Counter("jukebox_external_call_errors_total", "Failed calls to YouTube/LLM providers.",
+                          ("service", "call"))
+CACHE_HITS = Counter("jukebox_cache_hits_total", "Cache lookups that found an entry.", ("cache",))
+CACHE_MISSES = Counter("jukebox_cache_misses_total", "Cache lookups that missed.", ("cache",))
+CACHE_SIZE = Gauge("jukebox_cache_entries", "Entries currently held in a cache.", ("cache",))
+AUTO_DJ_PREFETCH_PICKS = Counter("jukebox_auto_dj_prefetch_total",
+                                 "Auto-DJ picks served from the prefetcher (hit) or computed inline (miss).", ("result",))
+RECOMMENDATION_REQUESTS = Counter("jukebox_recommendations_total",
+                                  "Recommendation requests served from the shared result (hit) or computed (miss).",
+                                  ("result",))
+
+
+@contextmanager
+def _timed(histogram: Histogram, errors: Counter, **labels):
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        errors.inc(**labels)
+        raise
+    finally:
+        histogram.observe(time.perf_counter() - started, **labels)
+
+def span(stage: str):
+    """Times a block (or, as a decorator, a sync/async function) as an internal stage."""
+    return _Span(STAGE_SECONDS, STAGE_ERRORS, stage=stage)
+
+def external_call(service: str, call: str):
+    """Times one call to an external provider; exceptions raised inside count as errors."""
+    return _Span(EXTERNAL_SECONDS, EXTERNAL_ERRORS, service=service, call=call)
+
+
+class _Span:
+    """Context manager and decorator around _timed."""
+
+    def __init__(self, histogram: Histogram, errors: Counter, **labels):
+        self.histogram = histogram
+        self.errors = errors
+        self.labels = labels
+        self._context = None
+
+    def __enter__(self):
+        self._context = _timed(self.histogram, self.errors, **self.labels)
+        return self._context.__enter__()
+
+    def __exit__(self, *exc):
+        return self._context.__exit__(*exc)
+
+    def __call__(self, func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with _timed(self.histogram, self.errors, **self.labels):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _timed(self.histogram, self.errors, **self.labels):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+def register_collector(collect: Callable[[], None]):
+    """`collect` runs before each render to copy live counts (queue sizes, hit counters) into metrics."""
+    _collectors.append(collect)
+
+def _collect_caches():
+    for cache in TTLCache.instances:
+        CACHE_HITS.set_total(cache.hits, cache=cache.name)
+        CACHE_MISSES.set_total(cache.misses, cache=cache.name)
+        CACHE_SIZE.set(len(cache), cache=cache.name)
+
+register_collector(_collect_caches)
+
+def render() -> str:
+    for collect in _collectors:
+        try:
+            collect()
+        except Exception as e:
+            logger.error(f"Metrics collector failed: {e}")
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
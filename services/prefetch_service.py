@@ -0,0 +1,114 @@
+import threading
+import logging
+from typing import Callable, List, Optional
+from models.db_models import Song
+
+logger = logging.getLogger(__name__)
+
+
+class AutoDJPick:
+    """A song Auto-DJ would play next, with the agent decision that picked it."""
+
+    __slots__ = ("song", "action", "context")
+
+    def __init__(self, song: Song, action: Optional[str] = None, context: Optional[list] = None):
+        self.song = song
+        self.action = action
+        self.context = context
+
+
+class AutoDJPrefetcher:
+    """
+    Keeps the next `size` Auto-DJ picks computed and hydrated, so pop_next on an empty
+    queue is a list pop instead of RL choice + embedding + vector query + DB reads.
+    invalidate() is called when now playing, the queue or the agent changes in a way that
+    affects the picks; the background thread then recomputes (bursts of invalidations coalesce into one run).
+    Picks computed for an older generation are never handed out.
+    """
+
+    def __init__(self, compute: Callable[[int], List[AutoDJPick]], size: int, on_ready: Optional[Callable] = None):
+        self.compute = compute
+        self.size = size
+        self.on_ready = on_ready # Called after a refresh, e.g. to republish state with up_next
+        self.hits = 0
+        self.misses = 0
+        self._picks: List[AutoDJPick] = []
+        self._generation = 0
+        self._ready_generation = -1
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+        self._wake.set()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    @property
+    def ready(self) -> bool:
+        """False between invalidate() and the end of the recompute."""
+        with self._lock:
+            return self._ready_generation == self._generation
+
+    def peek(self, include_stale: bool = False) -> List[AutoDJPick]:
+        """Current picks. While they are recomputed: [] or, with include_stale, the previous ones."""
+        with self._lock:
+            return list(self._picks) if include_stale or self._ready_generation == self._generation else []
+
+    def take(self) -> Optional[AutoDJPick]:
+        """Next prefetched pick if it is still valid for the current state."""
+        with self._lock:
+            if self._ready_generation == self._generation and self._picks:
+                self.hits += 1
+                return self._picks.pop(0)
+            self.misses += 1
+            return None
+
+    def refresh(self) -> bool:
+        with self._lock:
+            generation = self._generation
+        songs = self.compute(self.size)
+        with self._lock:
+            if generation != self._generation:
+                return False # State moved on while computing; the next run replaces it
+            self._picks = songs
+            self._ready_generation = generation
+        if self.on_ready:
+            self.on_ready()
+        return True
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            if self._stopping.is_set():
+                break
+            with self._lock:
+                if self._ready_generation == self._generation:
+                    continue
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Auto-DJ prefetch failed: {e}")
+
+    def start(self):
+        if self.size > 0 and not self._thread:
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="autodj-prefetch", daemon=True)
+            self._thread.start()
+            self.invalidate()
+
+    def stop(self):
+        if self._thread:
+            self._stopping.set()
+            self._wake.set()
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def stats(self) -> dict:
+        return {"size": self.size, "ready": len(self.peek()), "hits": self.hits, "misses": self.misses}
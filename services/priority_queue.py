@@ -0,0 +1,125 @@
+import heapq
+import itertools
+import threading
+from datetime import datetime
+from typing import Optional
+from models.db_models import Song
+
+
+class QueuedTrack:
+    """A song waiting in the queue, with its live vote tallies."""
+
+    __slots__ = ("seq", "song", "requested_by", "enqueued_at", "requester_rank", "up", "down", "skip", "version")
+
+    def __init__(self, seq: int, song: Song, requested_by: str, requester_rank: int):
+        self.seq = seq # Enqueue order, also the tie-breaker
+        self.song = song
+        self.requested_by = requested_by
+        self.enqueued_at = datetime.utcnow()
+        self.requester_rank = requester_rank # How many of this requester's songs were already waiting
+        self.up = 0
+        self.down = 0
+        self.skip = 0
+        self.version = 0 # Bumped on every vote; older heap entries become stale
+
+    def to_dict(self) -> dict:
+        return {
+            **self.song.model_dump(),
+            "requested_by": self.requested_by,
+            "votes": {"up": self.up, "down": self.down, "skip": self.skip}
+        }
+
+
+class VotePriorityQueue:
+    """
+    Queue ordered by live votes, requester fairness and enqueue time.
+    score = up - down - skip_weight * skip - fairness_weight * requester_rank
+    Highest score plays first, ties go to whoever was queued first.
+
+    Backed by a binary heap with lazy invalidation: a vote pushes a fresh heap entry
+    and the stale one is discarded when it surfaces, so votes and pops are O(log n).
+    The ordered view used by get_queue is built once per mutation and cached.
+    """
+
+    def __init__(self, skip_weight: float = 1.0, fairness_weight: float = 0.5):
+        self.skip_weight = skip_weight
+        self.fairness_weight = fairness_weight
+        self._heap = [] # (-score, seq, version, track)
+        self._live = {} # seq -> QueuedTrack
+        self._by_song = {} # song_id -> set of seqs
+        self._seq = itertools.count()
+        self._ordered: Optional[list] = None
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._live)
+
+    def score(self, track: QueuedTrack) -> float:
+        return (
+            track.up - track.down
+            - self.skip_weight * track.skip
+            - self.fairness_weight * track.requester_rank
+        )
+
+    def _push_entry(self, track: QueuedTrack):
+        heapq.heappush(self._heap, (-self.score(track), track.seq, track.version, track))
+        # Drop stale entries once they dominate the heap
+        if len(self._heap) > 2 * len(self._live) + 64:
+            self._heap = [
+                (-self.score(t), t.seq, t.version, t) for t in self._live.values()
+            ]
+            heapq.heapify(self._heap)
+
+    def push(self, song: Song, requested_by: str = "User") -> QueuedTrack:
+        with self._lock:
+            rank = sum(1 for t in self._live.values() if t.requested_by == requested_by)
+            track = QueuedTrack(next(self._seq), song, requested_by, rank)
+            self._live[track.seq] = track
+            self._by_song.setdefault(song.id, set()).add(track.seq)
+            self._push_entry(track)
+            self._ordered = None
+            return track
+
+    def pop(self) -> Optional[QueuedTrack]:
+        with self._lock:
+            while self._heap:
+                _, seq, version, track = heapq.heappop(self._heap)
+                if self._live.get(seq) is track and track.version == version:
+                    self._remove(track)
+                    return track
+            return None
+
+    def _remove(self, track: QueuedTrack):
+        del self._live[track.seq]
+        seqs = self._by_song.get(track.song.id)
+        if seqs:
+            seqs.discard(track.seq)
+            if not seqs:
+                del self._by_song[track.song.id]
+        self._ordered = None
+
+    def vote(self, song_id: int, vote_type: str) -> bool:
+        """Applies a vote to every queued copy of the song. Returns False if it isn't queued."""
+        if vote_type not in ("up", "down", "skip"):
+            return False
+        with self._lock:
+            seqs = self._by_song.get(song_id)
+            if not seqs:
+                return False
+            for seq in seqs:
+                track = self._live[seq]
+                setattr(track, vote_type, getattr(track, vote_type) + 1)
+                track.version += 1
+                self._push_entry(track)
+            self._ordered = None
+            return True
+
+    def ordered(self) -> list:
+        """Queued tracks in play order."""
+        with self._lock:
+            if self._ordered is None:
+                self._ordered = sorted(self._live.values(), key=lambda t: (-self.score(t), t.seq))
+            return self._ordered
+
+    def songs(self) -> list:
+        return [track.song for track in self.ordered()]
@@ -0,0 +1,311 @@
+import json
+import threading
+import uuid
+import logging
+from typing import Optional
+from sqlmodel import Session, select, func
+from sqlalchemy import update, delete
+from sqlalchemy.exc import IntegrityError
+from models.db_models import Song, QueueEntry, QueueState
+from models import database
+from services.priority_queue import VotePriorityQueue
+from config import QUEUE_BACKEND, QUEUE_SKIP_WEIGHT, QUEUE_FAIRNESS_WEIGHT
+
+logger = logging.getLogger(__name__)
+
+VOTE_COLUMNS = {"up": "up_votes", "down": "down_votes", "skip": "skip_votes"}
+
+
+class QueueBackend:
+    """
+    Storage for now-playing + the vote-ordered queue.
+    Every mutation bumps `version()`; `epoch` identifies the store so versions
+    from different stores (or a wiped memory queue) never compare equal.
+    """
+
+    epoch: str = ""
+
+    def version(self) -> int:
+        raise NotImplementedError
+
+    def enqueue(self, song: Song, requested_by: str = "User"):
+        """Starts the song if nothing is playing, otherwise queues it."""
+        raise NotImplementedError
+
+    def enqueue_many(self, songs: list, requested_by: str = "User"):
+        """Queues the songs in order as one change (one version bump)."""
+        raise NotImplementedError
+
+    def advance(self) -> Optional[Song]:
+        """Atomically moves the top queued song to now playing. None if the queue is empty."""
+        raise NotImplementedError
+
+    def set_now_playing(self, song: Optional[Song], requested_by: str = "Auto-DJ",
+                        action: Optional[str] = None, context: Optional[list] = None):
+        """action/context: the Auto-DJ decision that picked the song (see attribution())."""
+        raise NotImplementedError
+
+    def vote(self, song_id: int, vote_type: str) -> bool:
+        """Re-ranks queued copies of the song. False if it isn't queued."""
+        raise NotImplementedError
+
+    def refresh_song(self, song: Song):
+        """Called after a Song row changed (e.g. favorite) so snapshots show it."""
+        raise NotImplementedError
+
+    def attribution(self, song_id: int) -> Optional[tuple]:
+        """(action, context) that put the song on, if Auto-DJ picked it and it is still on."""
+        raise NotImplementedError
+
+    def snapshot(self) -> tuple:
+        """(now_playing Song or None, ordered list of queue entry dicts)."""
+        raise NotImplementedError
+
+
+class MemoryQueueBackend(QueueBackend):
+    """Process-local queue (single worker; lost on restart)."""
+
+    def __init__(self):
+        self.epoch = uuid.uuid4().hex[:8]
+        self.queue = VotePriorityQueue(skip_weight=QUEUE_SKIP_WEIGHT, fairness_weight=QUEUE_FAIRNESS_WEIGHT)
+        self.now_playing: Optional[Song] = None
+        self.now_playing_attribution: Optional[tuple] = None
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def version(self) -> int:
+        return self._version
+
+    def enqueue(self, song: Song, requested_by: str = "User"):
+        with self._lock:
+            if not self.now_playing:
+                self.now_playing = song
+                self.now_playing_attribution = None
+            else:
+                self.queue.push(song, requested_by)
+            self._version += 1
+
+    def enqueue_many(self, songs: list, requested_by: str = "User"):
+        with self._lock:
+            for song in songs:
+                if not self.now_playing:
+                    self.now_playing = song
+                    self.now_playing_attribution = None
+                else:
+                    self.queue.push(song, requested_by)
+            self._version += 1
+
+    def advance(self) -> Optional[Song]:
+        with self._lock:
+            track = self.queue.pop()
+            if not track:
+                return None
+            self.now_playing = track.song
+            self.now_playing_attribution = None
+            self._version += 1
+            return track.song
+
+    def set_now_playing(self, song: Optional[Song], requested_by: str = "Auto-DJ", action=None, context=None):
+        with self._lock:
+            self.now_playing = song
+            self.now_playing_attribution = (action, context) if action else None
+            self._version += 1
+
+    def vote(self, song_id: int, vote_type: str) -> bool:
+        with self._lock:
+            changed = self.queue.vote(song_id, vote_type)
+            if changed:
+                self._version += 1
+            return changed
+
+    def refresh_song(self, song: Song):
+        with self._lock:
+            for queued in [self.now_playing, *self.queue.songs()]:
+                if queued and queued.id == song.id:
+                    queued.is_favorite = song.is_favorite
+            self._version += 1
+
+    def attribution(self, song_id: int) -> Optional[tuple]:
+        now_playing = self.now_playing
+        if now_playing and now_playing.id == song_id:
+            return self.now_playing_attribution
+        return None
+
+    def snapshot(self) -> tuple:
+        return self.now_playing, [track.to_dict() for track in self.queue.ordered()]
+
+
+class SQLQueueBackend(QueueBackend):
+    """
+    Queue stored in the QueueEntry table, shared by every worker and kept across restarts.
+    Each mutation runs in one transaction that first bumps QueueState.version; that
+    write takes SQLite's write lock, so the reads that follow see the latest state and
+    concurrent workers are serialized.
+    """
+
+    def __init__(self):
+        self._cache_version = None
+        self._cache = (None, [])
+        self._lock = threading.Lock()
+        with Session(database.engine) as session:
+            state = session.get(QueueState, 1)
+            if not state:
+                session.add(QueueState(id=1, version=0, epoch=uuid.uuid4().hex[:8]))
+                try:
+                    session.commit()
+                except IntegrityError:
+                    session.rollback() # Another worker created it first
+                state = session.get(QueueState, 1)
+            self.epoch = state.epoch
+
+    def _priority(self, up: int, down: int, skip: int, rank: int) -> float:
+        return -(up - down - QUEUE_SKIP_WEIGHT * skip - QUEUE_FAIRNESS_WEIGHT * rank)
+
+    def _begin(self, session: Session):
+        session.exec(update(QueueState).where(QueueState.id == 1).values(version=QueueState.version + 1))
+
+    def version(self) -> int:
+        with Session(database.engine) as session:
+            return session.exec(select(QueueState.version).where(QueueState.id == 1)).one()
+
+    def _playing(self, session: Session) -> Optional[QueueEntry]:
+        return session.exec(select(QueueEntry).where(QueueEntry.status == "playing")).first()
+
+    def enqueue(self, song: Song, requested_by: str = "User"):
+        with Session(database.engine) as session:
+            self._begin(session)
+            if not self._playing(session):
+                session.add(QueueEntry(song_id=song.id, status="playing", requested_by=requested_by))
+            else:
+                rank = session.exec(
+                    select(func.count(QueueEntry.id))
+                    .where(QueueEntry.status == "queued", QueueEntry.requested_by == requested_by)
+                ).one()
+                session.add(QueueEntry(
+                    song_id=song.id,
+                    requested_by=requested_by,
+                    requester_rank=rank,
+                    priority=self._priority(0, 0, 0, rank)
+                ))
+            session.commit()
+
+    def enqueue_many(self, songs: list, requested_by: str = "User"):
+        if not songs:
+            return
+        with Session(database.engine) as session:
+            self._begin(session)
+            if not self._playing(session):
+                session.add(QueueEntry(song_id=songs[0].id, status="playing", requested_by=requested_by))
+                songs = songs[1:]
+            rank = session.exec(
+                select(func.count(QueueEntry.id))
+                .where(QueueEntry.status == "queued", QueueEntry.requested_by == requested_by)
+            ).one()
+            for offset, song in enumerate(songs):
+                session.add(QueueEntry(
+                    song_id=song.id,
+                    requested_by=requested_by,
+                    requester_rank=rank + offset,
+                    priority=self._priority(0, 0, 0, rank + offset)
+                ))
+            session.commit()
+
+    def advance(self) -> Optional[Song]:
+        with Session(database.engine) as session:
+            self._begin(session)
+            entry = session.exec(
+                select(QueueEntry)
+                .where(QueueEntry.status == "queued")
+                .order_by(QueueEntry.priority, QueueEntry.id)
+                .limit(1)
+            ).first()
+            if not entry:
+                session.rollback()
+                return None
+            session.exec(delete(QueueEntry).where(QueueEntry.status == "playing"))
+            entry.status = "playing"
+            session.add(entry)
+            session.commit()
+            return session.get(Song, entry.song_id)
+
+    def set_now_playing(self, song: Optional[Song], requested_by: str = "Auto-DJ", action=None, context=None):
+        with Session(database.engine) as session:
+            self._begin(session)
+            session.exec(delete(QueueEntry).where(QueueEntry.status == "playing"))
+            if song:
+                session.add(QueueEntry(
+                    song_id=song.id,
+                    status="playing",
+                    requested_by=requested_by,
+                    action=action,
+                    context=json.dumps(context) if context is not None else None
+                ))
+            session.commit()
+
+    def vote(self, song_id: int, vote_type: str) -> bool:
+        column = VOTE_COLUMNS.get(vote_type)
+        if not column:
+            return False
+        with Session(database.engine) as session:
+            self._begin(session)
+            entries = session.exec(
+                select(QueueEntry).where(QueueEntry.song_id == song_id, QueueEntry.status == "queued")
+            ).all()
+            if not entries:
+                session.rollback()
+                return False
+            for entry in entries:
+                setattr(entry, column, getattr(entry, column) + 1)
+                entry.priority = self._priority(entry.up_votes, entry.down_votes, entry.skip_votes, entry.requester_rank)
+                session.add(entry)
+            session.commit()
+            return True
+
+    def refresh_song(self, song: Song):
+        with Session(database.engine) as session:
+            self._begin(session)
+            session.commit()
+
+    def attribution(self, song_id: int) -> Optional[tuple]:
+        with Session(database.engine) as session:
+            row = session.exec(
+                select(QueueEntry.action, QueueEntry.context)
+                .where(QueueEntry.song_id == song_id, QueueEntry.action != None)
+            ).first()
+        if not row:
+            return None
+        return row[0], json.loads(row[1]) if row[1] else None
+
+    def snapshot(self) -> tuple:
+        """Reloads from the DB only when the version moved (one PK lookup otherwise)."""
+        version = self.version()
+        with self._lock:
+            if version == self._cache_version:
+                return self._cache
+        with Session(database.engine) as session:
+            rows = session.exec(
+                select(QueueEntry, Song)
+                .join(Song, Song.id == QueueEntry.song_id)
+                .order_by(QueueEntry.priority, QueueEntry.id)
+            ).all()
+        now_playing, queue = None, []
+        for entry, song in rows:
+            if entry.status == "playing":
+                now_playing = song
+            else:
+                queue.append({
+                    **song.model_dump(),
+                    "requested_by": entry.requested_by,
+                    "votes": {"up": entry.up_votes, "down": entry.down_votes, "skip": entry.skip_votes}
+                })
+        with self._lock:
+            self._cache_version, self._cache = version, (now_playing, queue)
+        return self._cache
+
+
+def create_queue_backend() -> QueueBackend:
+    if QUEUE_BACKEND == "memory":
+        return MemoryQueueBackend()
+    if QUEUE_BACKEND != "sqlite":
+        logger.warning(f"Unknown QUEUE_BACKEND: {QUEUE_BACKEND}. Using sqlite.")
+    return SQLQueueBackend()
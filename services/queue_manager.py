@@ -1,180 +1,585 @@
+import asyncio
+import json
+import math
+import time
 import logging
+import threading
+from concurrent.futures import Future
 from typing import List, Optional
 from models.db_models import Song, Vote, PlayHistory, Playlist, PlaylistSong
 from models.database import engine, create_db_and_tables
 from sqlmodel import Session, select, func, desc
-from services.youtube_service import search_video, get_video_details
-from services.rag_service import add_song_to_rag, retrieve_candidates
-from services.rl_service import agent
-from services.ai_service import correct_song_name
+from sqlalchemy.exc import IntegrityError
+from config import (
+    LLM_TIMEOUT,
+    YOUTUBE_TIMEOUT,
+    SUGGEST_MAX_CONCURRENCY,
+    STATE_SYNC_INTERVAL,
+    AUTO_DJ_RECENT_LIMIT,
+    AUTO_DJ_DIVERSITY,
+    AUTO_DJ_MUSIC_ONLY,
+    AUTO_DJ_PREFETCH
+)
+from services.youtube_service import (
+    search_video,
+    get_video_details,
+    search_video_async,
+    get_video_details_async,
+    parse_video_id,
+    MAX_IDS_PER_CALL,
+    THUMBNAIL_URL
+)
+from services import rag_service
+from services.rag_service import build_rag_tags, retrieve_candidates, MMR_POOL_FACTOR
+from services.rl_service import agent, SIMILAR_ACTION, VOTE_REWARDS
+from services.ai_service import correct_song_name, correct_song_name_async
+from services.catalog_service import find_local_song
+from services.event_service import state_broadcaster, SLIM_SONG_FIELDS
+from services.queue_backend import create_queue_backend
+from services.write_buffer import db_writer
+from services.prefetch_service import AutoDJPrefetcher, AutoDJPick
+from services.ingest_service import ingestor
+from services.metrics_service import (
+    span,
+    register_collector,
+    STAGE_SECONDS,
+    STAGE_TIMEOUTS,
+    AUTO_DJ_PREFETCH_PICKS,
+    RECOMMENDATION_REQUESTS
+)
 
 logger = logging.getLogger(__name__)
 
-# In-memory state for "Now Playing" (simple approach)
+PREFETCH_PUBLISH_WAIT = 0.5 # Longest a queue change waits for its Auto-DJ picks before being published
+
+# "Now Playing" + the vote-ordered queue live in a QueueBackend: the QueueEntry table by
+# default (shared by all workers, survives restarts) or in memory (QUEUE_BACKEND=memory).
 # Ideally this would be syncing with a real player, but we'll track "what should be playing"
 class QueueManager:
     def __init__(self):
         create_db_and_tables()
-        self.now_playing: Optional[Song] = None
-        self.queue: List[Song] = [] # This is an in-memory cache of the queue, or we fetch from DB every time? 
-        # For voting sorting, DB is better. 
+        self.backend = create_queue_backend()
+        self._suggest_semaphore: Optional[asyncio.Semaphore] = None
+        self._state_lock = threading.Lock()
+        self._recommendations = {} # favorites_only -> (key, Future of the song list)
+        self._recommendations_lock = threading.Lock()
+        self._favorites_version = 0 # Part of the recommendations key; bumped when a favorite is toggled
+        self._picks_for = object() # Now-playing id the Auto-DJ picks were computed after
+        self._published_up_next = None # Song ids in the last published up_next
+        self._deferred_publish = None # Timer publishing anyway if the prefetch is slow
+        self._synced_at = 0.0 # Monotonic time of the last shared-version lookup
+        self.prefetcher = AutoDJPrefetcher(
+            compute=self._prefetch_picks,
+            size=AUTO_DJ_PREFETCH,
+            on_ready=self._prefetch_ready
+        )
+        state_broadcaster.epoch = self.backend.epoch
+        register_collector(self._collect_metrics)
+        self._state_changed()
+
+    @property
+    def now_playing(self) -> Optional[Song]:
+        return self.backend.snapshot()[0]
+
+    @property
+    def version(self) -> int:
+        return self.backend.version()
         
     def get_queue(self) -> List[dict]:
         """Returns the sorted queue and now playing."""
-        with Session(engine) as session:
-            # Logic: Get songs that are in "Queue" state. 
-            # Simplified: Song is in queue if it hasn't been played yet? 
-            # Let's assume we delete from queue when played, or mark as played.
-            # We need a status field or just check PlayHistory.
-            
-            # Better approach for this MVP: 
-            # We track queue in-memory for order, but persist the objects in DB.
-            return {
-                "now_playing": self.now_playing,
-                "queue": self.queue
-            }
+        now_playing, queue = self.backend.snapshot()
+        taken = {entry["id"] for entry in queue} | ({now_playing.id} if now_playing else set())
+        return {
+            "now_playing": now_playing,
+            "queue": queue,
+            # Auto-DJ picks for when the queue runs dry (the previous ones while they are recomputed)
+            "up_next": [pick.song for pick in self.prefetcher.peek(include_stale=True) if pick.song.id not in taken]
+        }
 
+    @span("suggest")
     def add_song(self, query: str, requested_by: str = "User"):
-        """Search YouTube, Add to DB, Add to Queue, Add to RAG."""
+        """Resolve locally or search YouTube, Add to DB, Add to Queue, Add to RAG."""
         # 0. AI Correction
-        corrected_query = correct_song_name(query)
+        with span("llm"):
+            corrected_query = correct_song_name(query)
         logger.info(f"Original: {query} -> Corrected: {corrected_query}")
 
-        # 1. Search YouTube
-        results = search_video(corrected_query, max_results=1)
+        # 1. Known song? Skip YouTube entirely
+        song = find_local_song(corrected_query)
+        if song:
+            self._enqueue(song, requested_by)
+            return song
+
+        # 2. Search YouTube
+        with span("youtube_search"):
+            results = search_video(corrected_query, max_results=1)
         if not results:
             return None
         
         video = results[0]
         
-        with Session(engine) as session:
-            # Check if exists
-            existing = session.exec(select(Song).where(Song.youtube_id == video["youtube_id"])).first()
-            if existing:
-                song = existing
-            else:
-                # 2. Get Details (Duration, Category, Tags)
+        song = self._get_song_by_youtube_id(video["youtube_id"])
+        if not song:
+            # 3. Get Details (Duration, Category, Tags)
+            with span("youtube_details"):
                 details = get_video_details([video["youtube_id"]])
-                video_details = details.get(video["youtube_id"], {})
-                duration = video_details.get("duration", "PT3M") 
-                category_id = video_details.get("categoryId")
-                video_tags = video_details.get("tags", [])
-                
-                # Determine RAG tags
-                if category_id == '10': # Music Category ID
-                    if video_tags:
-                        rag_tags = ", ".join(video_tags[:5])
-                    else:
-                        rag_tags = "Music"
-                else:
-                    rag_tags = "Non-Music"
-
-                # 3. Save to DB
-                song = Song(
-                    youtube_id=video["youtube_id"],
-                    title=video["title"],
-                    artist=video["channel"],
-                    duration=0, # Simplify duration parsing for now
-                    thumbnail_url=video["thumbnail"]
-                )
-                session.add(song)
-                session.commit()
-                session.refresh(song)
-                
-                # 4. Add to RAG
-                add_song_to_rag(song.id, song.title, song.artist, tags=rag_tags)
+            video_details = details.get(video["youtube_id"], {})
+
+            # 4. Save to DB
+            tags = build_rag_tags(video_details)
+            song = self._create_song(video, tags if video_details else None) # None: re-index fetches them later
+
+            # 5. Add to RAG (embedded in the background)
+            ingestor.submit(song.id)
         
-        # 5. Add to Queue
-        if not self.now_playing:
-            self.now_playing = song
-        else:
-            self.queue.append(song)
-            
+        # 6. Add to Queue
+        self._enqueue(song, requested_by)
         return song
 
+    @span("suggest")
+    async def add_song_async(self, query: str, requested_by: str = "User"):
+        """
+        Async variant of add_song for the web/Teams endpoints. A YouTube link or video id
+        skips correction and search.
+        Network stages use pooled async clients, blocking stages (DB, embedding) run in
+        worker threads, every stage has its own timeout and the number of suggestions
+        in flight is bounded by SUGGEST_MAX_CONCURRENCY.
+        """
+        async with self._get_suggest_semaphore():
+            video = None
+            video_id = parse_video_id(query)
+            if not video_id:
+                # 0. AI Correction (fall back to the raw query if the LLM is slow)
+                corrected_query = await self._run_stage(
+                    "llm", correct_song_name_async(query), LLM_TIMEOUT, fallback=query
+                )
+                logger.info(f"Original: {query} -> Corrected: {corrected_query}")
+
+                # 1. Known song? Skip YouTube entirely
+                song = await asyncio.to_thread(find_local_song, corrected_query)
+                if song:
+                    await asyncio.to_thread(self._enqueue, song, requested_by)
+                    return song
+
+                # 2. Search YouTube
+                results = await self._run_stage(
+                    "youtube_search", search_video_async(corrected_query, max_results=1), YOUTUBE_TIMEOUT, fallback=[]
+                )
+                if not results:
+                    return None
+
+                video = results[0]
+                video_id = video["youtube_id"]
+            # else: a YouTube link or video id, nothing to correct or search
+
+            song = await asyncio.to_thread(self._get_song_by_youtube_id, video_id)
+            if not song:
+                # 3. Get Details (Duration, Category, Tags)
+                details = await self._run_stage(
+                    "youtube_details", get_video_details_async([video_id]), YOUTUBE_TIMEOUT, fallback={}
+                )
+                video_details = details.get(video_id, {})
+                if video is None:
+                    if not video_details:
+                        return None # Link to a missing/private video (or YouTube is down)
+                    video = self._video_from_details(video_id, video_details)
+
+                # 4. Save to DB
+                tags = build_rag_tags(video_details)
+                song = await asyncio.to_thread(self._create_song, video, tags if video_details else None)
+
+                # 5. Add to RAG (embedded in the background; the response doesn't wait for it)
+                ingestor.submit(song.id)
+
+        # 6. Add to Queue (a DB transaction plus a state publish; kept off the event loop)
+        await asyncio.to_thread(self._enqueue, song, requested_by)
+        return song
+
+    async def add_songs_batch(self, items: List[str], requested_by: str = "User"):
+        """
+        Bulk variant of add_song_async for playlist imports. Items are search queries,
+        YouTube links or video ids. Async generator: yields one progress dict per item
+        ("not_found" as soon as a search comes back empty, "queued"/"duplicate" once the
+        batch is queued) and a final summary. Each stage runs once for the whole batch:
+        corrections and searches concurrently, one IN query for known videos, details 50
+        ids per call, one transaction for new rows, one embedding batch and one queue change.
+        """
+        started = time.perf_counter()
+        limit = asyncio.Semaphore(SUGGEST_MAX_CONCURRENCY)
+
+        async def bounded(awaitable):
+            async with limit:
+                return await awaitable
+
+        def event(index: int, status: str, song: Optional[Song] = None) -> dict:
+            result = {"index": index, "item": items[index], "status": status}
+            if song:
+                result["song"] = {field: getattr(song, field) for field in SLIM_SONG_FIELDS}
+            return result
+
+        songs = {} # index -> Song
+        video_ids = {} # index -> youtube_id (links, ids and search hits)
+        videos = {} # youtube_id -> search result; links only get details
+        queries = {}
+        for index, item in enumerate(items):
+            video_id = parse_video_id(item)
+            if video_id:
+                video_ids[index] = video_id
+            elif item.strip():
+                queries[index] = item.strip()
+        not_found = [index for index in range(len(items)) if index not in video_ids and index not in queries]
+        for index in not_found:
+            yield event(index, "not_found")
+
+        # 0. AI Correction, once per distinct query
+        distinct = list(dict.fromkeys(queries.values()))
+        corrections = await asyncio.gather(*(
+            bounded(self._run_stage("llm", correct_song_name_async(query), LLM_TIMEOUT, fallback=query))
+            for query in distinct
+        ))
+        corrected = dict(zip(distinct, corrections))
+
+        # 1. Known songs skip YouTube
+        local = await asyncio.to_thread(
+            lambda: {query: find_local_song(query) for query in set(corrected.values())}
+        )
+        searches = {}
+        for index, query in queries.items():
+            song = local[corrected[query]]
+            if song:
+                songs[index] = song
+            else:
+                searches.setdefault(corrected[query], []).append(index)
+
+        # 2. Search YouTube for the rest; misses are reported as they come back
+        async def search(query: str):
+            results = await bounded(self._run_stage(
+                "youtube_search", search_video_async(query, max_results=1), YOUTUBE_TIMEOUT, fallback=[]
+            ))
+            return query, results
+
+        for next_search in asyncio.as_completed([search(query) for query in searches]):
+            query, results = await next_search
+            for index in searches[query]:
+                if results:
+                    video_ids[index] = results[0]["youtube_id"]
+                    videos.setdefault(results[0]["youtube_id"], results[0])
+                else:
+                    not_found.append(index)
+                    yield event(index, "not_found")
+
+        # 3. Known videos in one query; details for the new ones, 50 ids per call
+        wanted = list(dict.fromkeys(video_ids.values()))
+        known = await asyncio.to_thread(self._get_songs_by_youtube_ids, wanted)
+        new_ids = [video_id for video_id in wanted if video_id not in known]
+        details = {}
+        if new_ids:
+            details = await self._run_stage(
+                "youtube_details", get_video_details_async(new_ids),
+                YOUTUBE_TIMEOUT * math.ceil(len(new_ids) / MAX_IDS_PER_CALL), fallback={}
+            )
+
+        # 4. Save new songs in one transaction
+        new_videos = []
+        for video_id in new_ids:
+            video_details = details.get(video_id)
+            video = videos.get(video_id)
+            if video is None:
+                if not video_details:
+                    continue # Link to a missing/private video (or YouTube is down)
+                video = self._video_from_details(video_id, video_details)
+            new_videos.append((video, build_rag_tags(video_details) if video_details else None))
+        if new_videos:
+            created = await asyncio.to_thread(self._create_songs, new_videos)
+            known.update(created)
+            # 5. Add to RAG: one batch for the whole import (embedded in the background)
+            ingestor.submit_many([song.id for song in created.values()])
+
+        # 6. Add to Queue in input order, each song once
+        queued, duplicates, seen = [], [], set()
+        for index in range(len(items)):
+            song = songs.get(index) or known.get(video_ids.get(index))
+            if song is None:
+                if index not in not_found:
+                    not_found.append(index)
+                    yield event(index, "not_found")
+            elif song.id in seen:
+                songs[index] = song
+                duplicates.append(index)
+            else:
+                seen.add(song.id)
+                songs[index] = song
+                queued.append(index)
+        if queued:
+            await asyncio.to_thread(self._enqueue_many, [songs[index] for index in queued], requested_by)
+        for index in sorted(queued + duplicates):
+            yield event(index, "duplicate" if index in duplicates else "queued", songs.get(index))
+
+        yield {
+            "status": "done",
+            "queued": len(queued),
+            "duplicates": len(duplicates),
+            "not_found": len(not_found),
+            "new_songs": len(new_videos),
+            "seconds": round(time.perf_counter() - started, 3)
+        }
+
+    def _video_from_details(self, video_id: str, video_details: dict) -> dict:
+        """The search-result shape _create_song expects, for videos suggested by link or id."""
+        return {
+            "youtube_id": video_id,
+            "title": video_details["title"],
+            "channel": video_details["channel"],
+            "thumbnail": THUMBNAIL_URL.format(video_id)
+        }
+
+    def _get_suggest_semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so it binds to the server's running event loop
+        if self._suggest_semaphore is None:
+            self._suggest_semaphore = asyncio.Semaphore(SUGGEST_MAX_CONCURRENCY)
+        return self._suggest_semaphore
+
+    async def _run_stage(self, stage: str, awaitable, timeout: float, fallback):
+        started = time.perf_counter()
+        try:
+            return await asyncio.wait_for(awaitable, timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Suggest stage '{stage}' timed out after {timeout}s")
+            STAGE_TIMEOUTS.inc(stage=stage)
+            return fallback
+        finally:
+            STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage)
+
+    def _get_song_by_youtube_id(self, youtube_id: str) -> Optional[Song]:
+        with Session(engine) as session:
+            return session.exec(select(Song).where(Song.youtube_id == youtube_id)).first()
+
+    def _get_songs_by_youtube_ids(self, youtube_ids: list) -> dict:
+        if not youtube_ids:
+            return {}
+        with Session(engine) as session:
+            songs = session.exec(select(Song).where(Song.youtube_id.in_(youtube_ids))).all()
+            return {song.youtube_id: song for song in songs}
+
+    @span("db_write")
+    def _create_song(self, video: dict, tags: Optional[str] = None) -> Song:
+        with Session(engine) as session:
+            song = self._new_song(video, tags)
+            session.add(song)
+            try:
+                session.commit()
+            except IntegrityError:
+                # A concurrent suggestion saved the same video first
+                session.rollback()
+                return session.exec(select(Song).where(Song.youtube_id == video["youtube_id"])).one()
+            session.refresh(song)
+            return song
+
+    def _new_song(self, video: dict, tags: Optional[str]) -> Song:
+        return Song(
+            youtube_id=video["youtube_id"],
+            title=video["title"],
+            artist=video["channel"],
+            duration=0, # Simplify duration parsing for now
+            thumbnail_url=video["thumbnail"],
+            tags=tags
+        )
+
+    @span("db_write")
+    def _create_songs(self, videos: list) -> dict:
+        """Saves (video, tags) pairs in one transaction. youtube_id -> Song."""
+        youtube_ids = [video["youtube_id"] for video, _ in videos]
+        with Session(engine) as session:
+            session.add_all([self._new_song(video, tags) for video, tags in videos])
+            try:
+                session.commit()
+            except IntegrityError:
+                # A concurrent suggestion saved some of them first: keep those, save the rest
+                session.rollback()
+                existing = set(session.exec(select(Song.youtube_id).where(Song.youtube_id.in_(youtube_ids))).all())
+                session.add_all([
+                    self._new_song(video, tags) for video, tags in videos if video["youtube_id"] not in existing
+                ])
+                session.commit()
+        return self._get_songs_by_youtube_ids(youtube_ids)
+
+    def _enqueue(self, song: Song, requested_by: str = "User"):
+        self.backend.enqueue(song, requested_by)
+        self._state_changed()
+
+    def _enqueue_many(self, songs: List[Song], requested_by: str = "User"):
+        self.backend.enqueue_many(songs, requested_by)
+        self._state_changed()
+
+    def _collect_metrics(self):
+        AUTO_DJ_PREFETCH_PICKS.set_total(self.prefetcher.hits, result="hit")
+        AUTO_DJ_PREFETCH_PICKS.set_total(self.prefetcher.misses, result="miss")
+
+    def _state_changed(self):
+        """Pushes the snapshot for the backend's current version to subscribers."""
+        now_playing, queue = self.backend.snapshot()
+        if self._picks_stale(now_playing, queue):
+            self.prefetcher.invalidate()
+            if self.prefetcher.running:
+                # Published once with the new up_next; the timer caps how long that may take
+                self._defer_publish()
+                return
+        self._publish_state()
+
+    def _defer_publish(self):
+        with self._state_lock:
+            if self._deferred_publish is None:
+                self._deferred_publish = threading.Timer(PREFETCH_PUBLISH_WAIT, self._publish_state)
+                self._deferred_publish.daemon = True
+                self._deferred_publish.start()
+
+    def _publish_state(self):
+        with self._state_lock:
+            if self._deferred_publish is not None:
+                self._deferred_publish.cancel()
+                self._deferred_publish = None
+            state = self.get_queue()
+            state_broadcaster.publish(self.backend.version(), state)
+            self._published_up_next = [song.id for song in state["up_next"]]
+
+    def _prefetch_picks(self, size: int) -> List[AutoDJPick]:
+        now_playing = self.now_playing
+        self._picks_for = now_playing.id if now_playing else None
+        return self._auto_dj_picks(now_playing, size)
+
+    def _prefetch_ready(self):
+        # Publishes a deferred change, otherwise only if up_next actually changed
+        up_next = [song.id for song in self.get_queue()["up_next"]]
+        if self._deferred_publish is not None or up_next != self._published_up_next:
+            self._publish_state()
+
+    def _pick_ids(self) -> set:
+        return {pick.song.id for pick in self.prefetcher.peek(include_stale=True)}
+
+    def _picks_stale(self, now_playing: Optional[Song], queue: list) -> bool:
+        """
+        Auto-DJ picks continue from now playing and exclude queued songs, so they only
+        need recomputing when now playing changed or one of them got queued or played.
+        """
+        if (now_playing.id if now_playing else None) != self._picks_for:
+            return True
+        if not self.prefetcher.ready:
+            return False # Already being recomputed for this now playing
+        taken = {entry["id"] for entry in queue} | ({now_playing.id} if now_playing else set())
+        return not self._pick_ids().isdisjoint(taken)
+
+    def sync_state(self, max_age: float = 0.0):
+        """
+        Republishes if another worker changed the shared queue (one version lookup).
+        Skipped if the last lookup is less than `max_age` seconds old.
+        """
+        now = time.monotonic()
+        if now - self._synced_at < max_age:
+            return
+        self._synced_at = now
+        if self.backend.version() != state_broadcaster.version:
+            self._state_changed()
+
+    async def watch_state(self):
+        """Background task: picks up other workers' queue changes and pushes them to this worker's sockets."""
+        while True:
+            await asyncio.sleep(STATE_SYNC_INTERVAL)
+            try:
+                await asyncio.to_thread(self.sync_state)
+            except Exception as e:
+                logger.error(f"State sync error: {e}")
+
     def vote(self, song_id: int, vote_type: str):
         """Register vote and update RL agent."""
-        with Session(engine) as session:
-            if vote_type == "favorite":
+        if vote_type == "favorite":
+            with Session(engine) as session:
                 song = session.get(Song, song_id)
                 if song:
                     song.is_favorite = not song.is_favorite
                     session.add(song)
                     session.commit()
+                    # Keep the copies shown in /api/state and in recommendations in sync
+                    self.backend.refresh_song(song)
+                    with self._recommendations_lock:
+                        # Computations already running carry the old version, so they can't be stored as current
+                        self._favorites_version += 1
+                        self._recommendations.clear()
+                    if song_id in self._pick_ids():
+                        self.prefetcher.invalidate() # up_next shows the old is_favorite
+                    self._state_changed()
                     return {"status": "toggled", "is_favorite": song.is_favorite}
                 return {"status": "error", "message": "Song not found"}
 
-            vote = Vote(song_id=song_id, vote_type=vote_type)
-            session.add(vote)
-            session.commit()
-            
-            # Simple RL Update immediately (or batch later)
-            # If vote is for Now Playing, update immediately?
-            # Or if it's for something in queue?
-            # Let's update RL only if it's "Now Playing" or recently played?
-            # Actually, user feedback on suggestions is valuable.
-            if vote_type == "up":
-                agent.update(agent.choose_action(), 1.0) # Assumption: User likes the CURRENT vibe?
-                # This is tricky without tracking WHICH action produced this song.
-                # For MVP: We assume the Agent's *current* context/action is what is being voted on
-                # if the song was Auto-Suggested. 
-                # If User suggested it, maybe we don't update RL? 
-                pass
-            elif vote_type == "down":
-                agent.update(agent.choose_action(), -1.0)
-
-            # Re-sort queue if in queue
-            # (Simplified: logic to sort self.queue based on vote counts)
-            # self.sort_queue()
-            
+        # Group-committed with other votes by the background writer
+        db_writer.add(Vote(song_id=song_id, vote_type=vote_type))
+        agent.observe_vote(vote_type)
+
+        # Credit the Auto-DJ decision that put this song on. Songs requested by users
+        # carry no attribution and don't train the agent.
+        reward = VOTE_REWARDS.get(vote_type)
+        attribution = self.backend.attribution(song_id) if reward is not None else None
+        if attribution:
+            action, context = attribution
+            agent.update(action, reward, context)
+        if reward is not None and (not self.backend.snapshot()[1] or song_id in self._pick_ids()):
+            # Recent-vote features moved; re-pick with the updated agent if the picks play next.
+            # With songs queued, now playing changes (and invalidates them) before they're used.
+            self.prefetcher.invalidate()
+
+        # Re-rank the song if it's waiting in the queue
+        if self.backend.vote(song_id, vote_type):
+            self._state_changed()
+
+    @span("pop_next")
     def pop_next(self):
         """Move queue to now playing. If empty, auto-generate."""
-        if self.queue:
-            self.now_playing = self.queue.pop(0)
-        else:
+        now_playing = self.backend.advance()
+        pick = None
+        if not now_playing:
             # AUTO GENERATE
-            # Use previous song context if available
-            if self.now_playing:
-                query = f"Songs similar to {self.now_playing.title} by {self.now_playing.artist}"
-                logger.info(f"Queue empty. Auto-generating based on previous: {query}")
-            else:
-                query = agent.choose_action() # e.g. "Upbeat Pop"
-                logger.info(f"Queue empty. Agent chose: {query}")
-            
-            candidates = retrieve_candidates(query)
-            
-            if candidates:
-                # Pick one random candidate from top 5 that isn't recently played
-                # For now just pick first that isn't the one that just finished
-                found_new = False
-                for cand in candidates:
-                    if self.now_playing and str(cand["id"]) == str(self.now_playing.id):
-                        continue
-                    
-                    song_id = cand["id"]
-                    with Session(engine) as session:
-                        song = session.get(Song, int(song_id))
-                        self.now_playing = song
-                        found_new = True
-                        break
-                
-                if not found_new and candidates:
-                     # Fallback if all candidates were the same (unlikely but possible with small DB)
-                     song_id = candidates[0]["id"]
-                     with Session(engine) as session:
-                        song = session.get(Song, int(song_id))
-                        self.now_playing = song
+            # Normally picked ahead of time by the prefetcher; compute inline if it isn't ready
+            pick = self.prefetcher.take()
+            if not pick:
+                picks = self._auto_dj_picks(self.now_playing, n_results=1)
+                pick = picks[0] if picks else None
+
+            # Silence if nothing found
+            now_playing = pick.song if pick else None
+            if pick:
+                self.backend.set_now_playing(now_playing, action=pick.action, context=pick.context)
             else:
-                self.now_playing = None # Silence if nothing found
+                self.backend.set_now_playing(None)
                 
         # Log PlayHistory
-        if self.now_playing:
-            with Session(engine) as session:
-                ph = PlayHistory(song_id=self.now_playing.id)
-                session.add(ph)
-                session.commit()
+        if now_playing:
+            db_writer.add(PlayHistory(
+                song_id=now_playing.id,
+                action=pick.action if pick else None,
+                context=json.dumps(pick.context) if pick and pick.context is not None else None
+            ))
+            agent.observe_play(now_playing.title, now_playing.artist, now_playing.tags)
                 
-        return self.now_playing
+        self._state_changed()
+        return now_playing
+
+    @span("auto_dj_picks")
+    def _auto_dj_picks(self, previous: Optional[Song], n_results: int) -> List[AutoDJPick]:
+        """The songs Auto-DJ would play next, best first, with the agent decision behind them."""
+        action, context = agent.decide(similar_available=previous is not None)
+        if action == SIMILAR_ACTION:
+            # Continue from the previous song
+            query = f"Songs similar to {previous.title} by {previous.artist}"
+        else:
+            query = action # e.g. "Upbeat Pop"
+        logger.info(f"Auto-DJ: agent chose '{action}' -> {query}")
+
+        candidates = self.find_candidates(query, n_results=max(n_results, 1), exclude_ids=self._excluded_song_ids())
+        if not candidates:
+            # Small library: everything was played recently, so repeat rather than go silent
+            fallback = self.find_candidates(query, n_results=2)
+            fresh = [song for song in fallback if not previous or song.id != previous.id]
+            candidates = (fresh or fallback)[:1]
+        return [AutoDJPick(song, action, context) for song in candidates]
 
     def create_playlist(self, name: str):
         with Session(engine) as session:
@@ -195,29 +600,100 @@ class QueueManager:
         with Session(engine) as session:
             return session.exec(select(Playlist)).all()
 
-    def get_recommendations(self):
+    def get_recommendations(self, favorites_only: bool = False):
+        """
+        Top 3 recommendations, shared by every client until the answer can change.
+        Keyed by now playing, the queued songs (excluded from results), the RAG catalogue
+        version, favorite toggles and, when nothing plays, the agent's policy version. Concurrent callers
+        with the same key wait for one computation instead of each running their own.
+        """
+        now_playing, queue = self.backend.snapshot()
+        key = (
+            now_playing.id if now_playing else None,
+            frozenset(track["id"] for track in queue),
+            rag_service.catalogue_version,
+            None if now_playing else agent.version
+        )
+        with self._recommendations_lock:
+            key += (self._favorites_version,)
+            entry = self._recommendations.get(favorites_only)
+            owner = entry is None or entry[0] != key
+            if owner:
+                entry = (key, Future())
+                self._recommendations[favorites_only] = entry
+        future = entry[1]
+        RECOMMENDATION_REQUESTS.inc(result="miss" if owner else "hit")
+        if owner:
+            try:
+                songs = self._compute_recommendations(now_playing, favorites_only)
+            except Exception as e:
+                self._forget_recommendations(favorites_only, entry)
+                future.set_exception(e)
+                raise
+            if not songs:
+                # RAG still warming up or nothing indexed yet: don't pin an empty answer
+                self._forget_recommendations(favorites_only, entry)
+            future.set_result(songs)
+        return future.result()
+
+    def _forget_recommendations(self, favorites_only: bool, entry: tuple):
+        with self._recommendations_lock:
+            if self._recommendations.get(favorites_only) is entry:
+                del self._recommendations[favorites_only]
+
+    def _compute_recommendations(self, now_playing: Optional[Song], favorites_only: bool) -> List[Song]:
         """Get top 3 recommendations based on recent history or random vibe."""
         # Query RAG with "Similar to [Last Song]" if available
-        if self.now_playing:
-            query = f"Songs similar to {self.now_playing.title} by {self.now_playing.artist}"
+        if now_playing:
+            query = f"Songs similar to {now_playing.title} by {now_playing.artist}"
             logger.info(f"Fetching recommendations for: {query}")
         else:
             # Fallback to agent's choice
             query = agent.choose_action()
             logger.info(f"Fetching recommendations for agent action: {query}")
 
-        candidates = retrieve_candidates(query, n_results=3)
-        
-        recommendations = []
+        # Avoid recommending what is playing, queued or was just played
+        return self.find_candidates(
+            query, n_results=3, exclude_ids=self._excluded_song_ids(), favorites_only=favorites_only
+        )
+
+    def find_candidates(self, query: str, n_results: int = 5, exclude_ids=(), favorites_only: bool = False,
+                        music_only: bool = AUTO_DJ_MUSIC_ONLY) -> List[Song]:
+        """RAG candidates for the query as Song rows, diversity re-ranked and filtered."""
+        where = {"tags": {"$ne": "Non-Music"}} if music_only else None
+        # is_favorite lives in the DB, so favorites are filtered after hydration from a larger pool
+        fetch = n_results * MMR_POOL_FACTOR if favorites_only else n_results
+        candidates = retrieve_candidates(
+            query, n_results=fetch, exclude_ids=exclude_ids, where=where, diversity=AUTO_DJ_DIVERSITY
+        )
+        if not candidates and music_only:
+            # Songs saved without YouTube details are indexed as Non-Music (rag_service.index_tags);
+            # don't go silent over them
+            return self.find_candidates(query, n_results, exclude_ids, favorites_only, music_only=False)
+        return self._hydrate([c["id"] for c in candidates], favorites_only)[:n_results]
+
+    def _excluded_song_ids(self) -> set:
+        """Now playing, queued and the last AUTO_DJ_RECENT_LIMIT played songs."""
+        now_playing, queue = self.backend.snapshot()
+        excluded = {entry["id"] for entry in queue}
+        if now_playing:
+            excluded.add(now_playing.id)
         with Session(engine) as session:
-            for cand in candidates:
-                # Avoid recommending the exact same song that is playing
-                if self.now_playing and str(cand["id"]) == str(self.now_playing.id):
-                    continue
-                    
-                song = session.get(Song, int(cand["id"]))
-                if song:
-                    recommendations.append(song)
-        return recommendations
+            excluded.update(session.exec(
+                select(PlayHistory.song_id).order_by(desc(PlayHistory.played_at)).limit(AUTO_DJ_RECENT_LIMIT)
+            ).all())
+        return excluded
+
+    def _hydrate(self, song_ids: list, favorites_only: bool = False) -> List[Song]:
+        """Loads Song rows for candidate ids with one IN query, keeping the ranking order."""
+        ids = [int(song_id) for song_id in song_ids]
+        if not ids:
+            return []
+        statement = select(Song).where(Song.id.in_(ids))
+        if favorites_only:
+            statement = statement.where(Song.is_favorite == True)
+        with Session(engine) as session:
+            songs = {song.id: song for song in session.exec(statement).all()}
+        return [songs[song_id] for song_id in ids if song_id in songs]
 
 queue_manager = QueueManager()
@@ -1,72 +1,391 @@
-import chromadb
-from chromadb.utils import embedding_functions
 import os
-from config import DATA_DIR
+import time
+import hashlib
+import threading
+from concurrent.futures import Future
+from typing import Optional
+import numpy as np
+from config import (
+    DATA_DIR,
+    RAG_READY_TIMEOUT,
+    EMBEDDING_CACHE_SIZE,
+    EMBEDDING_PROCESSES,
+    EMBEDDING_BATCH_WINDOW_MS,
+    EMBEDDING_MAX_BATCH,
+    VECTOR_BACKEND
+)
+from services.cache_service import TTLCache
+from services.vector_backend import open_vector_backend, drop_vector_backend
+from services.metrics_service import span
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Initialize Chroma Client
-# PersistentClient to save data to disk
-chroma_client = chromadb.PersistentClient(path=os.path.join(DATA_DIR, "chroma_db"))
-
-# Embedding Function - Local Sentence Transformer
-# This removes dependency on OpenAI API Key for embeddings
-try:
-    embedding_func = embedding_functions.SentenceTransformerEmbeddingFunction(
-        model_name="all-MiniLM-L6-v2"
-    )
-    logger.info("Initialized local SentenceTransformer embedding function.")
-except Exception as e:
-    logger.error(f"Failed to initialize SentenceTransformer: {e}")
-    embedding_func = None
-
-# Collection
-collection = chroma_client.get_or_create_collection(
-    name="jukebox_songs",
-    embedding_function=embedding_func
-)
+COLLECTION_NAME = "jukebox_songs"
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+MMR_POOL_FACTOR = 4 # Diversity re-rank picks from n_results * this many nearest songs
 
-def add_song_to_rag(song_id: str, title: str, artist: str, tags: str = ""):
-    """Adds a song to the vector DB."""
-    if not embedding_func: 
-        logger.warning("Embedding function not available. Skipping RAG addition.")
+# Chroma and the SentenceTransformer model take seconds to load, so they are loaded
+# lazily (warm_up() from the startup hook) and handed out through a readiness future.
+_ready = Future() # Resolves to (collection, embedding_func)
+_warm_lock = threading.Lock()
+_warm_started = False
+warmup_seconds = None # Measured load time, reported by /health/ready
+_client = None
+embedding_pool = None # EmbeddingPool when EMBEDDING_PROCESSES > 0
+catalogue_version = 0 # Bumped when songs are added or the active index changes (caches key on it)
+
+# Content hash of embedded text -> float32 vector
+embedding_cache = TTLCache("embeddings", maxsize=EMBEDDING_CACHE_SIZE)
+
+_pointer_stamp = None # Pointer file version the active index was opened from
+_follow_lock = threading.Lock()
+
+def _pointer_path() -> str:
+    return os.path.join(DATA_DIR, "rag_collection.txt")
+
+def _retired_path() -> str:
+    return os.path.join(DATA_DIR, "rag_collection_retired.txt")
+
+def _read_pointer_stamp():
+    # The pointer is replaced with os.replace, so a new inode (or mtime) means it changed
+    try:
+        stat = os.stat(_pointer_path())
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+def _write_atomic(path: str, value: str):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(value)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def active_collection_name() -> str:
+    """Name of the collection serving queries (changed by a shadow re-index)."""
+    try:
+        with open(_pointer_path()) as f:
+            return f.read().strip() or COLLECTION_NAME
+    except FileNotFoundError:
+        return COLLECTION_NAME
+
+def _load(embedding_func=None):
+    global _client, embedding_pool
+
+    # Embedding Function - Local Sentence Transformer (unless one was passed in, e.g. by simulate.py)
+    # This removes dependency on OpenAI API Key for embeddings
+    if embedding_func is None and EMBEDDING_PROCESSES > 0:
+        from services.embedding_pool import EmbeddingPool
+        pool = None
+        try:
+            pool = EmbeddingPool(
+                EMBEDDING_MODEL_NAME,
+                processes=EMBEDDING_PROCESSES,
+                batch_window=EMBEDDING_BATCH_WINDOW_MS / 1000,
+                max_batch=EMBEDDING_MAX_BATCH
+            )
+            pool.warm_up()
+            embedding_func = embedding_pool = pool
+        except Exception as e:
+            logger.error(f"Failed to start the embedding pool, encoding in-process: {e}")
+            if pool is not None:
+                pool.shutdown()
+    if embedding_func is None:
+        from chromadb.utils import embedding_functions
+        try:
+            embedding_func = embedding_functions.SentenceTransformerEmbeddingFunction(
+                model_name=EMBEDDING_MODEL_NAME
+            )
+            logger.info("Initialized local SentenceTransformer embedding function.")
+        except Exception as e:
+            logger.error(f"Failed to initialize SentenceTransformer: {e}")
+            embedding_func = None
+
+    # Vector index: a Chroma collection (PersistentClient saves to disk) or the in-process NumPy index
+    if VECTOR_BACKEND != "numpy":
+        import chromadb
+        _client = chromadb.PersistentClient(path=os.path.join(DATA_DIR, "chroma_db"))
+    global _pointer_stamp
+    _pointer_stamp = _read_pointer_stamp()
+    index = open_vector_backend(active_collection_name(), _client, embedding_func)
+    logger.info(f"RAG index '{index.name}' ({type(index).__name__}) has {index.count()} songs.")
+    return index, embedding_func
+
+def _warm(embedding_func=None):
+    global warmup_seconds
+    started = time.perf_counter()
+    try:
+        result = _load(embedding_func)
+    except Exception as e:
+        logger.error(f"RAG warm-up failed: {e}")
+        _ready.set_exception(e)
         return
-        
-    text_representation = f"{title} by {artist}. {tags}"
-    
+    warmup_seconds = time.perf_counter() - started
+    logger.info(f"RAG ready in {warmup_seconds:.2f}s.")
+    _ready.set_result(result)
+
+def warm_up(background: bool = True, embedding_func=None):
+    """
+    Starts loading Chroma + the embedding model once. Safe to call repeatedly.
+    embedding_func replaces the SentenceTransformer model (any callable: list of texts -> vectors).
+    """
+    global _warm_started
+    with _warm_lock:
+        if _warm_started:
+            return
+        _warm_started = True
+    if background:
+        threading.Thread(target=_warm, args=(embedding_func,), name="rag-warmup", daemon=True).start()
+    else:
+        _warm(embedding_func)
+
+def _catalogue_changed():
+    global catalogue_version
+    with _warm_lock:
+        catalogue_version += 1
+
+def close():
+    """Stops the embedding worker processes (called on app shutdown)."""
+    if embedding_pool is not None:
+        embedding_pool.shutdown()
+
+def is_ready() -> bool:
+    return _ready.done() and _ready.exception() is None
+
+def _get_rag(timeout: float = RAG_READY_TIMEOUT):
+    """(vector index, embedding_func), waiting for warm-up; (None, None) if it failed or timed out."""
+    warm_up()
+    try:
+        index, embedding_func = _ready.result(timeout=timeout)
+    except Exception as e:
+        logger.warning(f"RAG not available: {e or 'still warming up'}")
+        return None, None
+    if _read_pointer_stamp() != _pointer_stamp:
+        return _follow_pointer()
+    return index, embedding_func
+
+def _follow_pointer():
+    """Switches to the index named by the pointer file after another worker swapped it."""
+    global _ready, _pointer_stamp
+    with _follow_lock:
+        index, embedding_func = _ready.result()
+        stamp = _read_pointer_stamp()
+        if stamp == _pointer_stamp:
+            return index, embedding_func # Another thread followed it first
+        name = active_collection_name()
+        if name != index.name:
+            index = open_vector_backend(name, _client, embedding_func)
+            followed = Future()
+            followed.set_result((index, embedding_func))
+            _ready = followed
+            _catalogue_changed()
+            logger.info(f"RAG collection changed by another worker: now {name}")
+        _pointer_stamp = stamp
+        return index, embedding_func
+
+def get_collection(name: str):
+    """Opens (or creates) another index with the same backend, e.g. a re-index shadow."""
+    index, embedding_func = _get_rag()
+    if index is None:
+        return None
+    if name == index.name:
+        return index
+    return open_vector_backend(name, _client, embedding_func)
+
+def swap_collection(name: str):
+    """
+    Makes `name` the active index: the pointer file is replaced atomically, then
+    queries switch over. Returns the name of the index that was active before.
+    """
+    global _ready, _pointer_stamp
+    index, embedding_func = _get_rag()
+    previous = index.name
+    new_index = get_collection(name)
+
+    with _follow_lock:
+        _write_atomic(_pointer_path(), name) # Other workers follow it on their next RAG call
+        _pointer_stamp = _read_pointer_stamp()
+        swapped = Future()
+        swapped.set_result((new_index, embedding_func))
+        _ready = swapped # Single reference assignment; readers see the old or the new pair
+    _catalogue_changed()
+    logger.info(f"RAG collection swapped: {previous} -> {name}")
+    return previous
+
+def delete_collection(name: str):
+    index, _ = _get_rag()
+    if index is not None and name != index.name:
+        drop_vector_backend(name, _client)
+
+def retire_collection(name: str):
+    """
+    Called with the index a swap replaced. Other workers may still be reading it until
+    their next RAG call, so it is kept and only dropped when the next swap retires another.
+    """
+    try:
+        with open(_retired_path()) as f:
+            older = f.read().strip()
+    except FileNotFoundError:
+        older = ""
+    _write_atomic(_retired_path(), name)
+    if older and older != name:
+        delete_collection(older)
+
+def indexed_ids(song_ids: list) -> Optional[set]:
+    """Which of these song ids the active index already holds; None if RAG isn't available."""
+    index, _ = _get_rag()
+    if index is None:
+        return None
+    return set(index.contains([str(song_id) for song_id in song_ids]))
+
+def build_rag_tags(video_details: dict) -> str:
+    """Derives the RAG tag string from YouTube video details (category + tags)."""
+    category_id = video_details.get("categoryId")
+    video_tags = video_details.get("tags", [])
+
+    if category_id == '10': # Music Category ID
+        if video_tags:
+            return ", ".join(video_tags[:5])
+        return "Music"
+    return "Non-Music"
+
+def index_tags(tags: Optional[str]) -> str:
+    """
+    Tags a song is indexed with. Songs saved without YouTube details (tags NULL until a
+    re-index fetches them) are indexed as build_rag_tags({}), i.e. Non-Music, on every path.
+    """
+    return tags if tags is not None else build_rag_tags({})
+
+def song_document(title: str, artist: str, tags: str = "") -> str:
+    """Text that gets embedded for a song."""
+    return f"{title} by {artist}. {tags}"
+
+def _embedding_key(text: str) -> str:
+    return hashlib.sha1(f"{EMBEDDING_MODEL_NAME}:{text}".encode("utf-8")).hexdigest()
+
+@span("rag_embed")
+def embed_texts(texts: list[str], use_cache: bool = True) -> Optional[list]:
+    """
+    Embeds texts as float32 vectors. Cached by content hash; all misses are encoded
+    together in one model forward pass. None if the model isn't available.
+    Bulk jobs pass use_cache=False so they don't evict the hot query vectors.
+    """
+    _, embedding_func = _get_rag()
+    if not embedding_func:
+        return None
+
+    vectors = [None] * len(texts)
+    misses = {} # text -> positions
+    for i, text in enumerate(texts):
+        vector = embedding_cache.get(_embedding_key(text)) if use_cache else None
+        if vector is None:
+            misses.setdefault(text, []).append(i)
+        else:
+            vectors[i] = vector
+
+    if misses:
+        unique_texts = list(misses)
+        encoded = embedding_func(unique_texts)
+        for text, raw in zip(unique_texts, encoded):
+            vector = np.asarray(raw, dtype=np.float32)
+            if use_cache:
+                embedding_cache.set(_embedding_key(text), vector)
+            for i in misses[text]:
+                vectors[i] = vector
+    return vectors
+
+@span("rag_upsert")
+def add_songs_to_rag(songs: list[dict], collection=None, use_cache: bool = True) -> bool:
+    """
+    Batch ingestion: embeds all songs in one forward pass and upserts them in one call.
+    Each item needs song_id, title, artist and optionally tags.
+    Goes to the active collection unless another one is given. False on failure.
+    """
+    if not songs:
+        return True
+    active_index, embedding_func = _get_rag()
+    if not embedding_func:
+        logger.warning("Embedding function not available. Skipping RAG addition.")
+        return False
+    collection = collection or active_index
+
+    documents = [song_document(s["title"], s["artist"], s.get("tags") or "") for s in songs]
     try:
+        vectors = embed_texts(documents, use_cache=use_cache)
         collection.upsert(
-            documents=[text_representation],
-            metadatas=[{"title": title, "artist": artist, "type": "song"}],
-            ids=[str(song_id)]
+            ids=[str(s["song_id"]) for s in songs],
+            vectors=vectors,
+            documents=documents,
+            metadatas=[
+                {"title": s["title"], "artist": s["artist"], "type": "song", "tags": s.get("tags") or ""}
+                for s in songs
+            ]
         )
-        logger.info(f"Added {title} to RAG.")
+        logger.info(f"Added {len(songs)} songs to RAG.")
+        if collection is active_index:
+            _catalogue_changed()
+        return True
     except Exception as e:
         logger.error(f"Error adding to RAG: {e}")
+        return False
 
-def retrieve_candidates(query_text: str, n_results: int = 5):
-    """Retrieves similar songs based on query text (e.g. 'Upbeat pop')."""
+def add_song_to_rag(song_id: str, title: str, artist: str, tags: str = ""):
+    """Adds a song to the vector DB."""
+    add_songs_to_rag([{"song_id": song_id, "title": title, "artist": artist, "tags": tags}])
+
+def mmr_rerank(query_vector, candidates: list[dict], n_results: int, lambda_: float) -> list[dict]:
+    """
+    Maximal marginal relevance: repeatedly takes the candidate with the best
+    lambda * similarity-to-query - (1 - lambda) * similarity-to-already-picked,
+    so the list isn't five near-identical songs. Candidates need a "vector".
+    """
+    if len(candidates) <= 1:
+        return candidates[:n_results]
+    vectors = np.stack([c["vector"] for c in candidates]).astype(np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    query_vector = np.asarray(query_vector, dtype=np.float32)
+    relevance = vectors @ (query_vector / (np.linalg.norm(query_vector) or 1))
+    similarity = vectors @ vectors.T
+
+    picked = [int(np.argmax(relevance))]
+    redundancy = similarity[picked[0]].copy()
+    while len(picked) < min(n_results, len(candidates)):
+        scores = lambda_ * relevance - (1 - lambda_) * redundancy
+        scores[picked] = -np.inf
+        best = int(np.argmax(scores))
+        picked.append(best)
+        redundancy = np.maximum(redundancy, similarity[best])
+    return [candidates[i] for i in picked]
+
+@span("rag_query")
+def retrieve_candidates(query_text: str, n_results: int = 5, exclude_ids=None, where: Optional[dict] = None,
+                        diversity: Optional[float] = None):
+    """
+    Retrieves similar songs based on query text (e.g. 'Upbeat pop').
+    exclude_ids: song ids never to return (recently played, queued).
+    where: metadata filter, e.g. {"tags": {"$ne": "Non-Music"}}.
+    diversity: MMR lambda (1.0 = pure similarity); re-ranks a larger candidate pool.
+    """
+    index, embedding_func = _get_rag()
     if not embedding_func:
         return []
         
     try:
-        results = collection.query(
-            query_texts=[query_text],
-            n_results=n_results
+        # Queries repeat a lot (agent actions, "Songs similar to ..."), so the vector is usually cached
+        query_vector = embed_texts([query_text])[0]
+        exclude_ids = {str(song_id) for song_id in exclude_ids or ()}
+        if diversity is None:
+            return index.query(query_vector, n_results=n_results, where=where, exclude_ids=exclude_ids)
+
+        pool = index.query(
+            query_vector, n_results=n_results * MMR_POOL_FACTOR, where=where,
+            exclude_ids=exclude_ids, include_vectors=True
         )
-        
-        # helper to flatten results
-        candidates = []
-        if results['ids']:
-            ids = results['ids'][0]
-            metas = results['metadatas'][0]
-            for i, song_id in enumerate(ids):
-                candidates.append({
-                    "id": song_id,
-                    "metadata": metas[i]
-                })
-                
+        candidates = mmr_rerank(query_vector, pool, n_results, diversity)
+        for candidate in candidates:
+            candidate.pop("vector", None)
         return candidates
     except Exception as e:
         logger.error(f"Error retrieving from RAG: {e}")
@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from sqlmodel import Session, select
+from sqlalchemy import String, cast, func, update
+from models.db_models import Song
+from models import database
+from services import rag_service
+from services.youtube_service import get_video_details
+from config import DATA_DIR, REINDEX_CHUNK_SIZE, REINDEX_WORKERS
+
+logger = logging.getLogger(__name__)
+
+
+class Reindexer:
+    """
+    Rebuilds the RAG collection from the Song table.
+    Songs are streamed in id order (keyset pages of `chunk_size`), missing tags are
+    fetched in bulk from YouTube, and each page is split across `workers` threads that
+    embed + upsert in parallel (the model releases the GIL during its forward pass).
+    After every page the last song id is checkpointed, so an interrupted run resumes
+    where it stopped. In shadow mode the rebuild goes into a new collection that only
+    replaces the live one once it is complete; queries keep using the old one until then,
+    and songs are only marked as indexed (embedding_id) after the swap.
+    """
+
+    def __init__(self, checkpoint_path: str, chunk_size: int, workers: int):
+        self.checkpoint_path = checkpoint_path
+        self.chunk_size = chunk_size
+        self.workers = max(1, workers)
+        self.progress = {"status": "idle"}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, shadow: bool = True, resume: bool = True) -> bool:
+        """Runs in a background thread. False if a rebuild is already running."""
+        with self._lock:
+            if self.running:
+                return False
+            self._thread = threading.Thread(
+                target=self.run, args=(shadow, resume), name="rag-reindex", daemon=True
+            )
+            self._thread.start()
+            return True
+
+    def run(self, shadow: bool = True, resume: bool = True) -> dict:
+        try:
+            self._run(shadow, resume)
+        except Exception as e:
+            logger.error(f"Re-index failed (resumable from checkpoint): {e}")
+            self.progress.update(status="failed", error=str(e))
+        return self.progress
+
+    def _run(self, shadow: bool, resume: bool):
+        checkpoint = self._load_checkpoint() if resume else None
+        if checkpoint and checkpoint.get("shadow") != shadow:
+            logger.warning("Checkpoint was written for another mode. Starting over.")
+            checkpoint = None
+
+        if checkpoint:
+            target_name, last_id = checkpoint["target"], checkpoint["last_id"]
+            logger.info(f"Resuming re-index into {target_name} after song {last_id}")
+        else:
+            active = rag_service.active_collection_name()
+            target_name = f"{rag_service.COLLECTION_NAME}_{int(time.time())}" if shadow else active
+            last_id = 0
+
+        target = rag_service.get_collection(target_name)
+        if target is None:
+            raise RuntimeError("RAG is not available")
+
+        with Session(database.engine) as session:
+            total = session.exec(select(func.count()).select_from(Song)).one()
+            done = session.exec(select(func.count()).select_from(Song).where(Song.id <= last_id)).one()
+        started = time.perf_counter()
+        self.progress = {
+            "status": "running", "target": target_name, "shadow": shadow,
+            "total": total, "done": done, "last_id": last_id,
+            "songs_per_second": None, "eta_seconds": None
+        }
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="reindex") as pool:
+            indexed_at_start = done
+            while True:
+                songs = self._next_chunk(last_id)
+                if not songs:
+                    break
+                self._index_chunk(pool, target, songs, mark_indexed=not shadow)
+                last_id = songs[-1]["song_id"]
+                done += len(songs)
+                self._save_checkpoint({"target": target_name, "shadow": shadow, "last_id": last_id})
+
+                rate = (done - indexed_at_start) / max(time.perf_counter() - started, 1e-6)
+                self.progress.update(
+                    done=done, last_id=last_id, songs_per_second=round(rate, 1),
+                    eta_seconds=round(max(total - done, 0) / rate, 1) if rate else None
+                )
+                logger.info(f"Re-index: {done}/{total} songs ({rate:.0f}/s)")
+
+            if shadow:
+                previous = rag_service.swap_collection(target_name)
+                self._mark_indexed(last_id) # Every song up to the last page is in the new active collection
+                # Songs suggested while the shadow was being built were written to the old
+                # collection; pick up anything saved after the last page
+                while True:
+                    songs = self._next_chunk(last_id)
+                    if not songs:
+                        break
+                    self._index_chunk(pool, target, songs)
+                    last_id = songs[-1]["song_id"]
+                    done += len(songs)
+                if previous != target_name:
+                    # Not dropped yet: other workers may still query it until they follow the pointer
+                    rag_service.retire_collection(previous)
+
+        self._clear_checkpoint()
+        elapsed = time.perf_counter() - started
+        self.progress.update(status="done", done=done, last_id=last_id, elapsed_seconds=round(elapsed, 1))
+        logger.info(f"Re-index into {target_name} finished: {done} songs in {elapsed:.1f}s")
+
+    def _next_chunk(self, after_id: int) -> list:
+        with Session(database.engine) as session:
+            rows = session.exec(
+                select(Song.id, Song.youtube_id, Song.title, Song.artist, Song.tags)
+                .where(Song.id > after_id)
+                .order_by(Song.id)
+                .limit(self.chunk_size)
+            ).all()
+        songs = [
+            {"song_id": row[0], "youtube_id": row[1], "title": row[2], "artist": row[3], "tags": row[4]}
+            for row in rows
+        ]
+        self._fill_missing_tags(songs)
+        return songs
+
+    def _fill_missing_tags(self, songs: list):
+        """Songs saved before tags were stored get them from one bulk details lookup."""
+        missing = [song for song in songs if song["tags"] is None]
+        if not missing:
+            return
+        details = get_video_details([song["youtube_id"] for song in missing])
+        updates = []
+        for song in missing:
+            video_details = details.get(song["youtube_id"])
+            song["tags"] = rag_service.build_rag_tags(video_details) if video_details else rag_service.index_tags(None)
+            if video_details:
+                updates.append(song)
+        if updates:
+            with Session(database.engine) as session:
+                for song in updates:
+                    session.exec(update(Song).where(Song.id == song["song_id"]).values(tags=song["tags"]))
+                session.commit()
+
+    def _index_chunk(self, pool: ThreadPoolExecutor, target, songs: list, mark_indexed: bool = True):
+        batch_size = -(-len(songs) // self.workers)
+        batches = [songs[i:i + batch_size] for i in range(0, len(songs), batch_size)]
+        results = pool.map(
+            lambda batch: rag_service.add_songs_to_rag(batch, collection=target, use_cache=False), batches
+        )
+        if not all(results):
+            raise RuntimeError(f"Embedding failed for songs after id {songs[0]['song_id'] - 1}")
+        if mark_indexed:
+            with Session(database.engine) as session:
+                for song in songs:
+                    session.exec(update(Song).where(Song.id == song["song_id"]).values(embedding_id=str(song["song_id"])))
+                session.commit()
+
+    def _mark_indexed(self, up_to_id: int):
+        """Takes songs written to the shadow collection out of the ingestion backlog once it is active."""
+        with Session(database.engine) as session:
+            session.exec(
+                update(Song)
+                .where(Song.id <= up_to_id, Song.embedding_id == None)
+                .values(embedding_id=cast(Song.id, String))
+            )
+            session.commit()
+
+    def _load_checkpoint(self) -> Optional[dict]:
+        try:
+            with open(self.checkpoint_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.error(f"Ignoring unreadable re-index checkpoint: {e}")
+            return None
+
+    def _save_checkpoint(self, checkpoint: dict):
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _clear_checkpoint(self):
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+
+reindexer = Reindexer(
+    checkpoint_path=os.path.join(DATA_DIR, "rag_reindex_checkpoint.json"),
+    chunk_size=REINDEX_CHUNK_SIZE,
+    workers=REINDEX_WORKERS
+)
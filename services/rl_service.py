@@ -1,8 +1,15 @@
-import random
 import json
 import os
+import math
+import atexit
+import tempfile
+import threading
+from collections import deque
 from datetime import datetime
-from config import DATA_DIR
+from typing import Optional
+import numpy as np
+from config import DATA_DIR, RL_FLUSH_INTERVAL, RL_UCB_ALPHA, RL_RECENT_VOTES, RL_RECENT_PLAYS
+from services.metrics_service import span
 import logging
 
 logger = logging.getLogger(__name__)
@@ -18,15 +25,64 @@ ACTIONS = [
     "Electronic Dance Focus",
     "Acoustic Coffee Shop"
 ]
+SIMILAR_ACTION = "Similar to Now Playing" # Arm that continues from the previous song
+
+# Rewards for votes on a song the agent picked
+VOTE_REWARDS = {"up": 1.0, "down": -1.0, "skip": -1.0}
+
+# Context features (the last one is per action: how close the vibe is to what was just played)
+FEATURES = [
+    "bias",
+    "hour_sin", "hour_cos",
+    "day_sin", "day_cos",
+    "weekend",
+    "recent_up", "recent_down", "recent_skip",
+    "centroid_similarity"
+]
 
 class JukeboxAgent:
-    def __init__(self):
-        self.q_table = {} # Key: "Day-TimeBlock", Value: {Action: Score}
+    """
+    LinUCB contextual bandit over the Auto-DJ actions.
+
+    Each action keeps a ridge regression of reward on the context features, stored as
+    stacked NumPy arrays (A_inv: actions x d x d, b: actions x d). Choosing scores all
+    actions at once (expected reward + alpha * uncertainty); an update touches one
+    action with a Sherman-Morrison step, O(d^2), so thousands of actions stay cheap.
+    Callers keep the (action, context) a pick was made with and pass it back with
+    the reward, so votes credit the decision that actually produced the song.
+    """
+
+    def __init__(self, state_file: Optional[str] = RL_STATE_FILE, flush_interval: float = RL_FLUSH_INTERVAL,
+                 alpha: float = RL_UCB_ALPHA, actions: Optional[list] = None, clock=datetime.now):
+        self.state_file = state_file
+        self.clock = clock # Simulations substitute a virtual clock
+        self.flush_interval = flush_interval
+        self.alpha = alpha
+        self.dim = len(FEATURES)
+        self.version = 0 # Bumped whenever the learned policy changes (caches key on it)
+        self._lock = threading.Lock()
+        self._dirty = False # Model changed since the last snapshot
+        self._stopping = threading.Event()
+        self._snapshotter = None
+        self._recent_votes = deque(maxlen=RL_RECENT_VOTES)
+        self._recent_plays = deque(maxlen=RL_RECENT_PLAYS) # RAG documents of recently played songs
+        self._action_vectors = None # Embedded action names, once the RAG model is up
+        self._set_actions(list(actions or ACTIONS) + [SIMILAR_ACTION])
         self.load_state()
+        # Last-chance flush for scripts that never start the snapshotter
+        atexit.register(self.flush)
+
+    def _set_actions(self, actions: list):
+        self.actions = actions
+        self._index = {action: i for i, action in enumerate(actions)}
+        self.A_inv = np.tile(np.eye(self.dim), (len(actions), 1, 1))
+        self.b = np.zeros((len(actions), self.dim))
+        self.counts = np.zeros(len(actions), dtype=np.int64)
+        self._action_vectors = None
         
     def get_context(self):
         """Returns context string: DayOfWeek-TimeBlock"""
-        now = datetime.now()
+        now = self.clock()
         day = now.strftime("%A") # Monday, Tuesday...
         hour = now.hour
         
@@ -38,53 +94,198 @@ class JukeboxAgent:
             time_block = "Evening"
             
         return f"{day}-{time_block}"
+
+    # --- Observations ---
+
+    def observe_vote(self, vote_type: str):
+        self._recent_votes.append(vote_type)
+
+    def observe_play(self, title: str, artist: str, tags: Optional[str] = None):
+        from services.rag_service import song_document
+        self._recent_plays.append(song_document(title, artist, tags or ""))
+
+    # --- Features ---
+
+    def features(self, now: Optional[datetime] = None) -> np.ndarray:
+        """Context matrix, one row per action (actions x d)."""
+        now = now or self.clock()
+        hour = now.hour + now.minute / 60
+        day = now.weekday()
+        votes = list(self._recent_votes)
+        total = max(len(votes), 1)
+        shared = np.array([
+            1.0,
+            math.sin(2 * math.pi * hour / 24), math.cos(2 * math.pi * hour / 24),
+            math.sin(2 * math.pi * day / 7), math.cos(2 * math.pi * day / 7),
+            1.0 if day >= 5 else 0.0,
+            votes.count("up") / total, votes.count("down") / total, votes.count("skip") / total,
+            0.0
+        ])
+        X = np.tile(shared, (len(self.actions), 1))
+        X[:, -1] = self._centroid_similarity()
+        return X
+
+    def _centroid_similarity(self) -> np.ndarray:
+        """Cosine similarity of each action's vibe to the centroid of recently played songs."""
+        from services import rag_service
+        similarity = np.zeros(len(self.actions))
+        plays = list(self._recent_plays)
+        if not plays or not rag_service.is_ready():
+            return similarity # Never block a pick on the model loading
+        try:
+            if self._action_vectors is None or len(self._action_vectors) != len(self.actions):
+                self._action_vectors = np.stack(rag_service.embed_texts(self.actions))
+            centroid = np.mean(np.stack(rag_service.embed_texts(plays)), axis=0)
+            norms = np.linalg.norm(self._action_vectors, axis=1) * (np.linalg.norm(centroid) or 1)
+            similarity = self._action_vectors @ centroid / np.maximum(norms, 1e-12)
+            similarity[self._index[SIMILAR_ACTION]] = 1.0
+        except Exception as e:
+            logger.error(f"RL centroid features unavailable: {e}")
+        return similarity
+
+    # --- Bandit ---
+
+    @span("rl_decide")
+    def decide(self, similar_available: bool = True, features: Optional[np.ndarray] = None) -> tuple:
+        """(action, context) with the highest upper confidence bound. Keep the context for update()."""
+        X = self.features() if features is None else features
+        with self._lock:
+            theta = np.einsum("kij,kj->ki", self.A_inv, self.b)
+            mean = np.einsum("ki,ki->k", theta, X)
+            variance = np.einsum("ki,kij,kj->k", X, self.A_inv, X)
+        ucb = mean + self.alpha * np.sqrt(np.maximum(variance, 0))
+        ucb += np.random.random(len(ucb)) * 1e-9 # Random tie-break between untried actions
+        if not similar_available:
+            ucb[self._index[SIMILAR_ACTION]] = -np.inf
+        best = int(np.argmax(ucb))
+        return self.actions[best], X[best].tolist()
+
+    def choose_action(self, similar_available: bool = False) -> str:
+        return self.decide(similar_available)[0]
+
+    @span("rl_update")
+    def update(self, action: str, reward: float, context: Optional[list] = None):
+        """Sherman-Morrison update of the chosen action's model with the observed reward."""
+        i = self._index.get(action)
+        if i is None:
+            logger.warning(f"RL update for unknown action: {action}")
+            return
+        x = np.asarray(context if context is not None else self.features()[i], dtype=float)
         
-    def choose_action(self, epsilon: float = 0.2):
-        """Epsilon-Greedy Action Selection"""
-        context = self.get_context()
-        
-        # Initialize context if new
-        if context not in self.q_table:
-            self.q_table[context] = {action: 1.0 for action in ACTIONS} # Start neutral/positive
-            
-        # Explore
-        if random.random() < epsilon:
-            return random.choice(ACTIONS)
-            
-        # Exploit (Choose Max Q)
-        action_scores = self.q_table[context]
-        best_action = max(action_scores, key=action_scores.get)
-        return best_action
-
-    def update(self, action: str, reward: float):
-        """Update Q-Value: Q(s,a) = Q(s,a) + alpha * (reward - Q(s,a))"""
-        context = self.get_context()
-        alpha = 0.1 # Learning rate
-        
-        if context not in self.q_table:
-            self.q_table[context] = {a: 1.0 for a in ACTIONS}
-            
-        current_q = self.q_table[context].get(action, 1.0)
-        new_q = current_q + alpha * (reward - current_q)
-        self.q_table[context][action] = new_q
+        with self._lock:
+            A_inv_x = self.A_inv[i] @ x
+            self.A_inv[i] -= np.outer(A_inv_x, A_inv_x) / (1.0 + x @ A_inv_x)
+            self.b[i] += reward * x
+            self.counts[i] += 1
+            self.version += 1
+            # Persisted by the background snapshotter, not on the request thread
+            self._dirty = True
         
-        self.save_state()
-        logger.info(f"RL Update: {context} | {action} | Reward: {reward} | NewQ: {new_q:.2f}")
+        logger.info(f"RL Update: {self.get_context()} | {action} | Reward: {reward} | Pulls: {self.counts[i]}")
 
     def save_state(self):
+        """Atomically writes the model: unique temp file + fsync + rename, so a crash or a concurrent
+        save from another worker never leaves a torn file. Each worker learns in memory; the file holds
+        the most recent snapshot from whichever worker saved last."""
+        with self._lock:
+            data = json.dumps({
+                "model": "linucb",
+                "features": FEATURES,
+                "actions": self.actions,
+                "A_inv": self.A_inv.tolist(),
+                "b": self.b.tolist(),
+                "counts": self.counts.tolist()
+            })
+            self._dirty = False
+        tmp_path = None
         try:
-            with open(RL_STATE_FILE, "w") as f:
-                json.dump(self.q_table, f)
+            with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(self.state_file) or ".",
+                                             prefix=os.path.basename(self.state_file) + ".", suffix=".tmp",
+                                             delete=False) as f:
+                tmp_path = f.name
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.state_file)
         except Exception as e:
+            self._dirty = True # Retry on the next flush
             logger.error(f"Failed to save RL state: {e}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def flush(self):
+        """Saves only if something changed since the last snapshot."""
+        if self._dirty and self.state_file:
+            self.save_state()
+
+    def _run_snapshotter(self):
+        while not self._stopping.wait(self.flush_interval):
+            self.flush()
+
+    def start(self):
+        """Starts the background snapshotter (called on app startup)."""
+        if not self._snapshotter:
+            self._stopping.clear()
+            self._snapshotter = threading.Thread(target=self._run_snapshotter, name="rl-snapshotter", daemon=True)
+            self._snapshotter.start()
+
+    def stop(self):
+        """Stops the snapshotter and writes pending updates (called on shutdown)."""
+        if self._snapshotter:
+            self._stopping.set()
+            self._snapshotter.join(timeout=5)
+            self._snapshotter = None
+        self.flush()
 
     def load_state(self):
-        if os.path.exists(RL_STATE_FILE):
+        if self.state_file and os.path.exists(self.state_file):
             try:
-                with open(RL_STATE_FILE, "r") as f:
-                    self.q_table = json.load(f)
-            except Exception:
-                self.q_table = {}
+                with open(self.state_file, "r") as f:
+                    state = json.load(f)
+            except Exception as e:
+                # Keep the unreadable file for inspection instead of overwriting it on the next save
+                corrupt_path = f"{self.state_file}.corrupt"
+                logger.error(f"RL state file is unreadable ({e}); moved to {corrupt_path}, starting fresh.")
+                os.replace(self.state_file, corrupt_path)
+                return
+            if state.get("model") != "linucb" or state.get("features") != FEATURES:
+                logger.info("RL state is from an older agent (Q-table or different features); starting fresh.")
+                return
+            # Actions are matched by name, so adding or removing vibes keeps what was learned for the rest
+            for j, action in enumerate(state["actions"]):
+                i = self._index.get(action)
+                if i is not None:
+                    self.A_inv[i] = np.asarray(state["A_inv"][j])
+                    self.b[i] = np.asarray(state["b"][j])
+                    self.counts[i] = state["counts"][j]
+
+def replay_evaluate(agent: JukeboxAgent, events: list) -> dict:
+    """
+    Offline replay evaluation (Li et al., 2011) of `agent` on logged Auto-DJ decisions.
+    Events are {"action", "context", "reward"} in time order. The agent picks an action
+    for each logged context; only events where it agrees with the logged action count
+    and are learned from, which estimates the reward the agent would have earned live.
+    Logged contexts hold the chosen action's feature row, which is used for every action.
+    """
+    matched, replay_reward = 0, 0.0
+    chosen = {}
+    for event in events:
+        x = np.asarray(event["context"], dtype=float)
+        action, _ = agent.decide(features=np.tile(x, (len(agent.actions), 1)))
+        chosen[action] = chosen.get(action, 0) + 1
+        if action != event["action"]:
+            continue
+        matched += 1
+        replay_reward += event["reward"]
+        agent.update(action, event["reward"], x.tolist())
+    logged_reward = sum(event["reward"] for event in events)
+    return {
+        "events": len(events),
+        "matched": matched,
+        "replay_reward_per_pick": replay_reward / matched if matched else None,
+        "logged_reward_per_pick": logged_reward / len(events) if events else None,
+        "chosen": chosen
+    }
 
 # Singleton Agent
 agent = JukeboxAgent()
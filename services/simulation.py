@@ -0,0 +1,128 @@
+import re
+import random
+import hashlib
+from datetime import datetime, timedelta
+import numpy as np
+
+# Building blocks for simulate.py: a synthetic catalogue, a local embedding stand-in and
+# simulated office voters. Nothing here talks to YouTube, an LLM or a model download.
+
+# Genre -> words used in titles/tags; the words overlap with the agent's vibe names on purpose
+GENRES = {
+    "pop": ["upbeat", "pop", "hits", "dance", "summer"],
+    "lofi": ["lo-fi", "study", "beats", "chill", "rain"],
+    "rock": ["classic", "rock", "anthems", "guitar", "stadium"],
+    "jazz": ["smooth", "jazz", "saxophone", "lounge", "night"],
+    "edm": ["electronic", "dance", "focus", "synth", "bass"],
+    "acoustic": ["acoustic", "coffee", "shop", "folk", "unplugged"],
+}
+NOUNS = ["Heart", "City", "Dream", "Fire", "Ocean", "Road", "Light", "Echo", "Sky", "Stone", "Wave", "Star"]
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9\-]+")
+
+
+class HashingEmbedder:
+    """
+    Deterministic bag-of-words embedding: each token maps to a fixed random unit
+    vector (seeded by its hash) and a text is the normalized sum. Texts sharing words
+    land close together, which is all the recommendation loop needs, at microseconds per text.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self._token_vectors = {}
+
+    def _token_vector(self, token: str) -> np.ndarray:
+        vector = self._token_vectors.get(token)
+        if vector is None:
+            seed = int.from_bytes(hashlib.sha1(token.encode("utf-8")).digest()[:8], "little")
+            vector = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+            self._token_vectors[token] = vector
+        return vector
+
+    def __call__(self, input: list) -> list:
+        vectors = []
+        for text in input:
+            vector = np.zeros(self.dim, dtype=np.float32)
+            for token in TOKEN_PATTERN.findall(text.lower()):
+                vector += self._token_vector(token)
+            vectors.append(vector / (np.linalg.norm(vector) or 1))
+        return vectors
+
+
+def synthetic_catalogue(size: int, seed: int = 7) -> list:
+    """Songs as dicts (youtube_id, title, artist, tags, genre), spread evenly over GENRES."""
+    rng = random.Random(seed)
+    genres = list(GENRES)
+    songs = []
+    for i in range(size):
+        genre = genres[i % len(genres)]
+        words = GENRES[genre]
+        songs.append({
+            "youtube_id": f"sim{i:08d}", # 11 characters, like real video ids
+            "title": f"{rng.choice(words).title()} {rng.choice(NOUNS)} {i}",
+            "artist": f"The {genre.title()} Collective {i % 50}",
+            "tags": ", ".join(rng.sample(words, 3)),
+            "genre": genre
+        })
+    return songs
+
+
+class SimulatedOffice:
+    """
+    Voters with genre tastes that shift during the day (lo-fi and jazz in the morning,
+    pop and EDM in the afternoon, rock in the evening) plus a virtual clock that moves
+    one song length per play, so time-of-day features matter.
+    """
+
+    DAYPART_TASTES = {
+        "morning": {"lofi": 0.9, "jazz": 0.8, "acoustic": 0.6, "pop": 0.3, "edm": 0.2, "rock": 0.1},
+        "afternoon": {"pop": 0.9, "edm": 0.8, "rock": 0.4, "acoustic": 0.3, "lofi": 0.3, "jazz": 0.2},
+        "evening": {"rock": 0.9, "jazz": 0.6, "pop": 0.4, "edm": 0.4, "acoustic": 0.3, "lofi": 0.2},
+    }
+
+    def __init__(self, voters: int = 10, vote_probability: float = 0.3, seed: int = 7,
+                 start: datetime = datetime(2024, 1, 8, 9, 0), song_minutes: float = 3.5):
+        self.voters = voters
+        self.vote_probability = vote_probability
+        self.now = start
+        self.song_minutes = song_minutes
+        self._rng = random.Random(seed)
+        # Individual taste = office taste + personal noise
+        self._bias = [{genre: self._rng.gauss(0, 0.15) for genre in GENRES} for _ in range(voters)]
+
+    def clock(self) -> datetime:
+        return self.now
+
+    def advance(self):
+        self.now += timedelta(minutes=self.song_minutes)
+        if self.now.hour >= 19: # Office closed: skip to 9:00 the next morning
+            self.now = (self.now + timedelta(days=1)).replace(hour=9, minute=0)
+
+    def daypart(self) -> str:
+        if self.now.hour < 12:
+            return "morning"
+        if self.now.hour < 17:
+            return "afternoon"
+        return "evening"
+
+    def best_genre(self) -> str:
+        tastes = self.DAYPART_TASTES[self.daypart()]
+        return max(tastes, key=tastes.get)
+
+    def votes_for(self, genre: str) -> list:
+        """The votes ("up"/"down"/"skip") the office casts on a song of this genre right now."""
+        tastes = self.DAYPART_TASTES[self.daypart()]
+        votes = []
+        for bias in self._bias:
+            if self._rng.random() >= self.vote_probability:
+                continue
+            liking = tastes.get(genre, 0.5) + bias[genre]
+            roll = self._rng.random()
+            if roll < liking:
+                votes.append("up")
+            elif roll < liking + (1 - liking) / 2:
+                votes.append("down")
+            else:
+                votes.append("skip")
+        return votes
@@ -0,0 +1,114 @@
+import json
+import logging
+from sqlmodel import Session, select
+from sqlalchemy import func
+from sqlalchemy.dialects import sqlite, postgresql
+from models.db_models import Song, Vote, PlayHistory, SongStats
+from models import database
+
+logger = logging.getLogger(__name__)
+
+VOTE_FIELDS = {"up": "up_count", "down": "down_count", "skip": "skip_count"}
+
+def apply_stats(session: Session, rows: list):
+    """
+    Folds new Vote/PlayHistory rows into SongStats inside the caller's transaction.
+    Deltas are summed per song first, then applied with one atomic upsert per song.
+    """
+    deltas = {}
+    for row in rows:
+        if isinstance(row, Vote):
+            field = VOTE_FIELDS.get(row.vote_type)
+            if not field:
+                continue
+            delta = deltas.setdefault(row.song_id, _empty_delta(row.song_id))
+            delta[field] += 1
+            delta["score"] += 1 if row.vote_type == "up" else -1
+        elif isinstance(row, PlayHistory):
+            delta = deltas.setdefault(row.song_id, _empty_delta(row.song_id))
+            delta["play_count"] += 1
+            if delta["last_played_at"] is None or row.played_at > delta["last_played_at"]:
+                delta["last_played_at"] = row.played_at
+
+    if not deltas:
+        return
+
+    dialect = session.get_bind().dialect.name
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    for delta in deltas.values():
+        statement = insert(SongStats).values(**delta)
+        excluded = statement.excluded
+        statement = statement.on_conflict_do_update(
+            index_elements=[SongStats.song_id],
+            set_={
+                "up_count": SongStats.up_count + excluded.up_count,
+                "down_count": SongStats.down_count + excluded.down_count,
+                "skip_count": SongStats.skip_count + excluded.skip_count,
+                "play_count": SongStats.play_count + excluded.play_count,
+                "score": SongStats.score + excluded.score,
+                # New plays are always the latest ones
+                "last_played_at": func.coalesce(excluded.last_played_at, SongStats.last_played_at),
+            }
+        )
+        session.exec(statement)
+
+def _empty_delta(song_id: int) -> dict:
+    return {
+        "song_id": song_id,
+        "up_count": 0,
+        "down_count": 0,
+        "skip_count": 0,
+        "play_count": 0,
+        "score": 0,
+        "last_played_at": None
+    }
+
+def get_leaderboard(limit: int = 10) -> list:
+    """Top songs by vote score (index scan on SongStats.score)."""
+    with Session(database.engine) as session:
+        rows = session.exec(
+            select(SongStats, Song)
+            .join(Song, Song.id == SongStats.song_id)
+            .order_by(SongStats.score.desc(), SongStats.play_count.desc())
+            .limit(limit)
+        ).all()
+        return [{"song": song, "stats": stats} for stats, song in rows]
+
+def get_song_stats(song_id: int):
+    with Session(database.engine) as session:
+        return session.get(SongStats, song_id)
+
+def get_auto_dj_events(rewards: dict) -> list:
+    """
+    Logged Auto-DJ decisions for offline evaluation, oldest first: the action and
+    context of every Auto-DJ play, rewarded with the votes its song got until the next play.
+    """
+    with Session(database.engine) as session:
+        plays = session.exec(
+            select(PlayHistory.song_id, PlayHistory.played_at, PlayHistory.action, PlayHistory.context)
+            .order_by(PlayHistory.played_at, PlayHistory.id)
+        ).all()
+        first_auto = next((played_at for _, played_at, action, _ in plays if action), None)
+        if first_auto is None:
+            return []
+        votes = session.exec(
+            select(Vote.song_id, Vote.vote_type, Vote.timestamp)
+            .where(Vote.timestamp >= first_auto)
+            .order_by(Vote.timestamp)
+        ).all()
+
+    votes_by_song = {}
+    for song_id, vote_type, timestamp in votes:
+        votes_by_song.setdefault(song_id, []).append((timestamp, rewards.get(vote_type, 0.0)))
+
+    events = []
+    for i, (song_id, played_at, action, context) in enumerate(plays):
+        if not action or not context:
+            continue
+        until = plays[i + 1][1] if i + 1 < len(plays) else None
+        reward = sum(
+            value for timestamp, value in votes_by_song.get(song_id, [])
+            if timestamp >= played_at and (until is None or timestamp < until)
+        )
+        events.append({"action": action, "context": json.loads(context), "reward": reward})
+    return events
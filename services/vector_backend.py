@@ -0,0 +1,463 @@
+import os
+import json
+import time
+import shutil
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Optional
+import numpy as np
+from config import DATA_DIR, VECTOR_BACKEND, VECTOR_COMPACT_RATIO
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+REFRESH_INTERVAL = 1.0 # Seconds between checks for rows other processes appended to a NumPy index
+
+
+class VectorBackend:
+    """
+    Stores song vectors + metadata and answers nearest-neighbour queries.
+    Vectors are passed in precomputed (rag_service owns the embedding model).
+    """
+
+    name: str = ""
+
+    def upsert(self, ids: list[str], vectors: list, metadatas: list[dict], documents: Optional[list[str]] = None):
+        raise NotImplementedError
+
+    def delete(self, ids: list[str]):
+        raise NotImplementedError
+
+    def query(self, vector, n_results: int = 5, where: Optional[dict] = None,
+              exclude_ids: Optional[set] = None, include_vectors: bool = False) -> list[dict]:
+        """
+        Closest songs first, as [{"id", "metadata"}] (+ "vector" if include_vectors).
+        `where` filters on metadata, Chroma style: {"tags": {"$ne": "Non-Music"}};
+        ids in `exclude_ids` are never returned.
+        """
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def contains(self, ids: list[str]) -> list[str]:
+        """The subset of `ids` stored in the index."""
+        raise NotImplementedError
+
+
+class ChromaVectorBackend(VectorBackend):
+    """A Chroma collection (HNSW index, persisted by Chroma under DATA_DIR/chroma_db)."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.name = collection.name
+
+    def upsert(self, ids, vectors, metadatas, documents=None):
+        self.collection.upsert(
+            ids=ids,
+            embeddings=[np.asarray(v, dtype=np.float32).tolist() for v in vectors],
+            documents=documents,
+            metadatas=metadatas
+        )
+
+    def delete(self, ids):
+        self.collection.delete(ids=ids)
+
+    def query(self, vector, n_results=5, where=None, exclude_ids=None, include_vectors=False):
+        exclude_ids = exclude_ids or set()
+        include = ["metadatas", "embeddings"] if include_vectors else ["metadatas"]
+        if where and len(where) > 1:
+            where = {"$and": [{key: value} for key, value in where.items()]}
+        # Chroma can't filter on ids, so over-fetch by the number of exclusions
+        results = self.collection.query(
+            query_embeddings=[np.asarray(vector, dtype=np.float32).tolist()],
+            n_results=n_results + len(exclude_ids),
+            where=where or None,
+            include=include
+        )
+        # helper to flatten results
+        candidates = []
+        if results['ids']:
+            ids = results['ids'][0]
+            metas = results['metadatas'][0]
+            for i, song_id in enumerate(ids):
+                if song_id in exclude_ids:
+                    continue
+                candidate = {"id": song_id, "metadata": metas[i]}
+                if include_vectors:
+                    candidate["vector"] = np.asarray(results['embeddings'][0][i], dtype=np.float32)
+                candidates.append(candidate)
+        return candidates[:n_results]
+
+    def count(self):
+        return self.collection.count()
+
+    def contains(self, ids):
+        return self.collection.get(ids=ids, include=[])["ids"]
+
+
+class NumpyVectorBackend(VectorBackend):
+    """
+    Exact cosine search over a memory-mapped float32 matrix, in-process.
+
+    Files (in `path`), all belonging to the generation named in meta.json:
+      vectors.<gen>.f32  - append-only rows of `dim` unit-length float32 values
+      rows.<gen>.jsonl   - append log, one line per vector row ({"row", "id", "metadata"})
+                           plus {"delete": id} lines
+    Re-upserting an id appends a new row and tombstones the old one. Once tombstones
+    exceed `compact_ratio` of the rows, live rows are rewritten into a new generation
+    and meta.json is swapped atomically, so a crash at any point leaves a readable store.
+
+    Several processes (uvicorn workers) can share one index: writes hold an exclusive
+    flock on `lock` and first replay whatever other processes appended, and queries pick
+    up other processes' changes at most every REFRESH_INTERVAL. Without fcntl (Windows)
+    there is no cross-process lock, so only one process may use the index.
+    """
+
+    def __init__(self, path: str, compact_ratio: float = 0.25):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.compact_ratio = compact_ratio
+        self._lock = threading.Lock()
+        self._mask_lock = threading.Lock()
+        self._synced_at = 0.0
+        os.makedirs(path, exist_ok=True)
+        self._lock_file = open(os.path.join(path, "lock"), "a")
+        if fcntl is None:
+            logger.warning(f"No file locking on this platform: vector index {self.name} must be used by one process only.")
+        with self._lock, self._locked(exclusive=True):
+            self._load()
+
+    # --- Files ---
+
+    def _meta_path(self) -> str:
+        return os.path.join(self.path, "meta.json")
+
+    def _vectors_path(self, gen: int) -> str:
+        return os.path.join(self.path, f"vectors.{gen}.f32")
+
+    def _rows_path(self, gen: int) -> str:
+        return os.path.join(self.path, f"rows.{gen}.jsonl")
+
+    @contextmanager
+    def _locked(self, exclusive: bool):
+        """Cross-process lock on the index. Threads of this process are serialized by _lock."""
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _write_meta(self, gen: int, dim: Optional[int]):
+        tmp_path = self._meta_path() + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"generation": gen, "dim": dim}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._meta_path())
+
+    def _load(self):
+        try:
+            with open(self._meta_path()) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            meta = {"generation": 0, "dim": None}
+            self._write_meta(0, None)
+        self.gen, self.dim = meta["generation"], meta["dim"]
+
+        self._row_ids = [] # Row -> id; append-only (dead rows keep their id)
+        self._row_meta = []
+        self._row_of = {} # id -> live row
+        self._alive = np.zeros(0, dtype=bool) # Grown geometrically; False for dead rows
+        self._masks = {} # where-filter key -> (match flags, rows evaluated)
+        self._log_offset = 0 # Bytes of the rows log applied so far
+        self._read_log(repair=True)
+        self._truncate_vectors()
+        self._remap()
+        self._drop_stale_generations()
+
+    def _read_log(self, repair: bool = False):
+        """Applies rows-log lines past _log_offset (all of them on load)."""
+        try:
+            with open(self._rows_path(self.gen), "rb") as f:
+                f.seek(self._log_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        complete = data[:data.rfind(b"\n") + 1]
+        if repair and len(complete) < len(data):
+            # Torn last line from a crash: cut it so the next append starts a fresh line
+            with open(self._rows_path(self.gen), "r+b") as f:
+                f.truncate(self._log_offset + len(complete))
+        for line in complete.splitlines():
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                logger.error(f"Unreadable line in vector index {self.name} log; ignoring the rest.")
+                break
+            self._log_offset += len(line) + 1
+            if "delete" in entry:
+                self._tombstone(entry["delete"])
+            else:
+                self._append_row(entry["id"], entry["metadata"])
+
+    def _truncate_vectors(self):
+        # Vector bytes written without their log line (crash mid-append) are dropped
+        vectors_path = self._vectors_path(self.gen)
+        if self.dim and os.path.exists(vectors_path):
+            expected = len(self._row_ids) * self.dim * 4
+            if os.path.getsize(vectors_path) > expected:
+                with open(vectors_path, "r+b") as f:
+                    f.truncate(expected)
+
+    def _append_row(self, song_id: str, metadata: dict) -> int:
+        self._tombstone(song_id)
+        row = len(self._row_ids)
+        if row >= len(self._alive):
+            grown = np.zeros(max(64, 2 * len(self._alive)), dtype=bool)
+            grown[:row] = self._alive[:row]
+            self._alive = grown
+        self._alive[row] = True
+        self._row_of[song_id] = row
+        self._row_ids.append(song_id)
+        self._row_meta.append(metadata)
+        return row
+
+    def _tombstone(self, song_id: str):
+        row = self._row_of.pop(song_id, None)
+        if row is not None:
+            self._alive[row] = False
+
+    def _remap(self):
+        rows = len(self._row_ids)
+        if rows and self.dim:
+            matrix = np.memmap(self._vectors_path(self.gen), dtype=np.float32, mode="r", shape=(rows, self.dim))
+        else:
+            matrix = np.zeros((0, self.dim or 0), dtype=np.float32)
+        # Queries read this tuple without the lock. The lists, dicts and flag buffers are
+        # shared with the writer, which only appends past `rows` or clears an alive flag;
+        # a reload or compaction builds new ones.
+        self._view = (matrix, rows, self._alive, self._row_ids, self._row_meta, self._row_of, self._masks)
+
+    def _sync(self):
+        """Replays what other processes changed since this one last looked (locks held)."""
+        self._synced_at = time.monotonic()
+        try:
+            with open(self._meta_path()) as f:
+                meta = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        if meta["generation"] != self.gen:
+            self._load() # Compacted by another process
+            return
+        self.dim = meta["dim"]
+        try:
+            appended = os.path.getsize(self._rows_path(self.gen)) > self._log_offset
+        except FileNotFoundError:
+            appended = False
+        if appended:
+            self._read_log()
+            self._remap()
+
+    def _refresh(self):
+        if fcntl is None or time.monotonic() - self._synced_at < REFRESH_INTERVAL:
+            return
+        if not self._lock.acquire(blocking=False):
+            return # A write is in progress here; it syncs first anyway
+        try:
+            with self._locked(exclusive=False):
+                self._sync()
+        finally:
+            self._lock.release()
+
+    def _drop_stale_generations(self):
+        current = {os.path.basename(self._vectors_path(self.gen)), os.path.basename(self._rows_path(self.gen))}
+        for file_name in os.listdir(self.path):
+            if file_name.startswith(("vectors.", "rows.")) and file_name not in current:
+                try:
+                    os.remove(os.path.join(self.path, file_name))
+                except OSError:
+                    pass # Still mapped by an in-flight query (Windows); removed on next load
+
+    def _append_log(self, lines: list):
+        data = "".join(line + "\n" for line in lines).encode("utf-8")
+        with open(self._rows_path(self.gen), "ab") as f:
+            f.write(data)
+        self._log_offset += len(data)
+
+    # --- VectorBackend ---
+
+    def upsert(self, ids, vectors, metadatas, documents=None):
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms == 0, 1, norms)
+        with self._lock, self._locked(exclusive=True):
+            self._sync()
+            if self.dim is None:
+                self.dim = matrix.shape[1]
+                self._write_meta(self.gen, self.dim)
+            elif matrix.shape[1] != self.dim:
+                raise ValueError(f"Vector size {matrix.shape[1]} does not match index size {self.dim}")
+
+            # Vectors first: a log line never points past the end of the vector file
+            self._truncate_vectors()
+            with open(self._vectors_path(self.gen), "ab") as f:
+                f.write(matrix.tobytes())
+            self._append_log([
+                json.dumps({"row": self._append_row(song_id, metadata), "id": song_id, "metadata": metadata})
+                for song_id, metadata in zip(ids, metadatas)
+            ])
+            self._maybe_compact()
+            self._remap()
+
+    def delete(self, ids):
+        with self._lock, self._locked(exclusive=True):
+            self._sync()
+            present = [song_id for song_id in ids if song_id in self._row_of]
+            if not present:
+                return
+            self._append_log([json.dumps({"delete": song_id}) for song_id in present])
+            for song_id in present:
+                self._tombstone(song_id)
+            self._maybe_compact()
+            self._remap()
+
+    def query(self, vector, n_results=5, where=None, exclude_ids=None, include_vectors=False):
+        self._refresh()
+        matrix, rows, alive, row_ids, row_meta, row_of, masks = self._view
+        allowed = alive[:rows].copy()
+        if where:
+            allowed &= self._matches(masks, where, row_meta, rows)
+        for song_id in exclude_ids or ():
+            row = row_of.get(song_id)
+            if row is not None and row < rows:
+                allowed[row] = False
+        live = int(allowed.sum())
+        if not live:
+            return []
+        query_vector = np.asarray(vector, dtype=np.float32)
+        query_vector = query_vector / (np.linalg.norm(query_vector) or 1)
+        scores = matrix @ query_vector
+        scores[~allowed] = -np.inf
+        k = min(n_results, live)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        candidates = [{"id": row_ids[row], "metadata": row_meta[row]} for row in top]
+        if include_vectors:
+            for candidate, row in zip(candidates, top):
+                candidate["vector"] = np.array(matrix[row])
+        return candidates
+
+    def _matches(self, masks: dict, where: dict, row_meta: list, rows: int) -> np.ndarray:
+        """Filter flags for the first `rows` rows; only rows added since the last call are evaluated."""
+        key = json.dumps(where, sort_keys=True)
+        with self._mask_lock:
+            flags, evaluated = masks.get(key, (np.zeros(0, dtype=bool), 0))
+            if evaluated < rows:
+                if len(flags) < rows:
+                    grown = np.zeros(max(64, 2 * rows), dtype=bool)
+                    grown[:evaluated] = flags[:evaluated]
+                    flags = grown
+                flags[evaluated:rows] = [matches_where(meta, where) for meta in row_meta[evaluated:rows]]
+                masks[key] = (flags, rows)
+            return flags[:rows]
+
+    def count(self):
+        return len(self._row_of)
+
+    def contains(self, ids):
+        self._refresh()
+        row_of = self._view[5]
+        return [song_id for song_id in ids if song_id in row_of]
+
+    # --- Compaction ---
+
+    def _maybe_compact(self):
+        dead = len(self._row_ids) - len(self._row_of)
+        if dead and dead >= self.compact_ratio * len(self._row_ids):
+            self._compact()
+
+    def _compact(self):
+        """Rewrites live rows into the next generation, then switches meta.json over."""
+        gen = self.gen + 1
+        live_rows = sorted(self._row_of.values())
+        if live_rows:
+            source = np.memmap(self._vectors_path(self.gen), dtype=np.float32, mode="r",
+                               shape=(len(self._row_ids), self.dim))
+            with open(self._vectors_path(gen), "wb") as f:
+                f.write(np.ascontiguousarray(source[live_rows]).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            del source
+        else:
+            open(self._vectors_path(gen), "wb").close()
+
+        new_ids = [self._row_ids[row] for row in live_rows]
+        new_meta = [self._row_meta[row] for row in live_rows]
+        with open(self._rows_path(gen), "w") as f:
+            for row, (song_id, metadata) in enumerate(zip(new_ids, new_meta)):
+                f.write(json.dumps({"row": row, "id": song_id, "metadata": metadata}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+        self._write_meta(gen, self.dim)
+        dropped = len(self._row_ids) - len(new_ids)
+        self.gen = gen
+        self._row_ids, self._row_meta = new_ids, new_meta
+        self._row_of = {song_id: row for row, song_id in enumerate(new_ids)}
+        self._alive = np.ones(len(new_ids), dtype=bool)
+        self._masks = {} # Row numbers changed
+        self._log_offset = os.path.getsize(self._rows_path(gen))
+        self._remap()
+        self._drop_stale_generations()
+        logger.info(f"Compacted vector index {self.name}: dropped {dropped} dead rows, {len(new_ids)} live")
+
+    def compact(self):
+        with self._lock, self._locked(exclusive=True):
+            self._sync()
+            self._compact()
+
+
+def matches_where(metadata: dict, where: dict) -> bool:
+    """Evaluates the subset of Chroma's `where` syntax we use: equality, $eq, $ne, $in, $nin."""
+    for field, condition in where.items():
+        value = metadata.get(field)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for operator, operand in condition.items():
+            if operator == "$eq" and value != operand:
+                return False
+            if operator == "$ne" and value == operand:
+                return False
+            if operator == "$in" and value not in operand:
+                return False
+            if operator == "$nin" and value in operand:
+                return False
+    return True
+
+def _numpy_path(name: str) -> str:
+    return os.path.join(DATA_DIR, "vector_index", name)
+
+def open_vector_backend(name: str, chroma_client=None, embedding_function=None) -> VectorBackend:
+    """Opens (or creates) the named index with the configured VECTOR_BACKEND."""
+    if VECTOR_BACKEND == "numpy":
+        return NumpyVectorBackend(_numpy_path(name), compact_ratio=VECTOR_COMPACT_RATIO)
+    if VECTOR_BACKEND != "chroma":
+        logger.warning(f"Unknown VECTOR_BACKEND: {VECTOR_BACKEND}. Using chroma.")
+    return ChromaVectorBackend(
+        chroma_client.get_or_create_collection(name=name, embedding_function=embedding_function)
+    )
+
+def drop_vector_backend(name: str, chroma_client=None):
+    if VECTOR_BACKEND == "numpy":
+        shutil.rmtree(_numpy_path(name), ignore_errors=True)
+    else:
+        chroma_client.delete_collection(name)
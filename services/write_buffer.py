@@ -0,0 +1,175 @@
+import threading
+import logging
+from sqlalchemy.exc import OperationalError
+from sqlmodel import SQLModel, Session
+from models import database
+from services.stats_service import apply_stats
+from services.metrics_service import Counter
+from config import DB_WRITE_BUFFER, DB_FLUSH_INTERVAL_MS, DB_FLUSH_MAX_ROWS, DB_BUFFER_MAX_ROWS
+
+logger = logging.getLogger(__name__)
+
+DROPPED_ROWS = Counter("jukebox_db_write_dropped_rows_total",
+                       "Vote/PlayHistory rows lost because their write kept failing.")
+
+MAX_BACKOFF = 30.0 # Longest wait between retries of a failing flush (seconds)
+ISOLATE_AFTER = 3 # Failed flushes in a row before the batch is retried in halves to find bad rows
+
+
+class BufferedWriter:
+    """
+    Group-commits append-only rows (Vote, PlayHistory) from a background thread,
+    every `flush_interval` seconds or as soon as `max_rows` are waiting, so a vote
+    burst costs one transaction instead of one per vote. SongStats aggregates are
+    updated in the same transaction.
+    A failed flush (e.g. the database is locked) puts its rows back at the front of the
+    buffer and is retried with exponential backoff. After ISOLATE_AFTER failures in a row
+    the batch is written in halves, so a row that can never be written (constraint error,
+    bad value) is dropped on its own instead of holding back the rows behind it.
+    At most `max_pending` rows are kept; beyond that the oldest are dropped.
+    Every dropped row is counted in DROPPED_ROWS.
+    Rows are written immediately when buffering is disabled or the thread isn't running.
+    """
+
+    def __init__(self, flush_interval: float, max_rows: int, max_pending: int, enabled: bool = True):
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self.max_pending = max_pending
+        self.enabled = enabled
+        self.flushes = 0
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def add(self, row: SQLModel):
+        if not self.enabled or not self._thread:
+            if not self._write([row]):
+                self._dropped(1)
+            return
+        with self._lock:
+            self._buffer.append(row)
+            full = len(self._buffer) >= self.max_rows
+            overflow = self._trim()
+        if overflow:
+            self._dropped(overflow)
+        if full:
+            self._wake.set()
+
+    def flush(self, isolate: bool = False) -> bool:
+        """
+        Writes the buffered rows. On failure the rows not written are put back and False
+        is returned. With `isolate`, rows that fail on their own are dropped instead.
+        """
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+        if not rows:
+            return True
+        if isolate:
+            rows = self._isolate(rows)
+        elif self._write(rows):
+            rows = []
+        if not rows:
+            return True
+        with self._lock:
+            # In front of rows added meanwhile, so they are written in order
+            self._buffer = rows + self._buffer
+            overflow = self._trim()
+        if overflow:
+            self._dropped(overflow)
+        return False
+
+    def _trim(self) -> int:
+        """Drops the oldest rows beyond max_pending (lock held). Returns how many."""
+        overflow = len(self._buffer) - self.max_pending
+        if overflow <= 0:
+            return 0
+        del self._buffer[:overflow]
+        return overflow
+
+    def _dropped(self, count: int):
+        self.rows_dropped += count
+        DROPPED_ROWS.inc(count)
+        logger.error(f"Dropped {count} buffered rows that could not be written.")
+
+    def _commit(self, rows: list):
+        with Session(database.engine) as session:
+            session.add_all(rows)
+            apply_stats(session, rows)
+            session.commit()
+        self.flushes += 1
+        self.rows_written += len(rows)
+
+    def _write(self, rows: list) -> bool:
+        try:
+            self._commit(rows)
+            return True
+        except Exception as e:
+            logger.error(f"Buffered write of {len(rows)} rows failed: {e}")
+            return False
+
+    def _isolate(self, rows: list) -> list:
+        """
+        Writes `rows` in ever smaller halves. A row that fails alone with a data error is
+        dropped; on a database error (e.g. locked) the rows not yet written are returned.
+        """
+        try:
+            self._commit(rows)
+            return []
+        except OperationalError as e:
+            logger.error(f"Buffered write of {len(rows)} rows failed: {e}")
+            return rows
+        except Exception as e:
+            if len(rows) == 1:
+                logger.error(f"Buffered row cannot be written: {e}")
+                self._dropped(1)
+                return []
+        middle = len(rows) // 2
+        retry = self._isolate(rows[:middle])
+        if retry:
+            return retry + rows[middle:]
+        return self._isolate(rows[middle:])
+
+    def _run(self):
+        failures = 0
+        while not self._stopping.is_set():
+            if failures:
+                # Backing off: a full buffer doesn't cut the wait short
+                self._stopping.wait(min(self.flush_interval * 2 ** failures, MAX_BACKOFF))
+            else:
+                self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            failures = 0 if self.flush(isolate=failures >= ISOLATE_AFTER) else failures + 1
+
+    def start(self):
+        if self.enabled and not self._thread:
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stops the thread and writes whatever is still buffered (called on shutdown)."""
+        if self._thread:
+            self._stopping.set()
+            self._wake.set()
+            self._thread.join(timeout=5)
+            self._thread = None
+        if not self.flush(isolate=True):
+            with self._lock:
+                rows, self._buffer = self._buffer, []
+            self._dropped(len(rows))
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer)
+
+
+db_writer = BufferedWriter(
+    flush_interval=DB_FLUSH_INTERVAL_MS / 1000,
+    max_rows=DB_FLUSH_MAX_ROWS,
+    max_pending=DB_BUFFER_MAX_ROWS,
+    enabled=DB_WRITE_BUFFER
+)
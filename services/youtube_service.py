@@ -1,70 +1,298 @@
 import os
+import re
+import asyncio
+import threading
+import httpx
 import requests
-from config import YOUTUBE_API_KEY
+from concurrent.futures import Future, ThreadPoolExecutor, InvalidStateError
+from typing import Optional
+from requests.adapters import HTTPAdapter
+from config import (
+    YOUTUBE_API_KEY,
+    YOUTUBE_PROVIDER,
+    YOUTUBE_TIMEOUT,
+    HTTP_MAX_CONNECTIONS,
+    YOUTUBE_CACHE_SIZE,
+    YOUTUBE_SEARCH_CACHE_TTL,
+    YOUTUBE_DETAILS_CACHE_TTL,
+    YOUTUBE_BATCH_WINDOW_MS
+)
+from services.cache_service import TTLCache
+from services import fake_providers
+from services.metrics_service import external_call
 import logging
 
 logger = logging.getLogger(__name__)
 
 YOUTUBE_SEARCH_URL = "https://www.googleapis.com/youtube/v3/search"
 YOUTUBE_VIDEOS_URL = "https://www.googleapis.com/youtube/v3/videos"
+MAX_IDS_PER_CALL = 50 # videos.list limit
+THUMBNAIL_URL = "https://i.ytimg.com/vi/{}/default.jpg" # What search.list returns as the default thumbnail
 
-def search_video(query: str, max_results: int = 5):
-    if not YOUTUBE_API_KEY:
-        logger.warning("No YOUTUBE_API_KEY set.")
-        return []
-    
-    params = {
+# watch?v=, youtu.be/, /embed/, /shorts/ and music.youtube.com links
+VIDEO_URL_PATTERN = re.compile(r"(?:youtube\.com/(?:watch\?(?:.*&)?v=|embed/|shorts/|live/)|youtu\.be/)([A-Za-z0-9_-]{11})")
+VIDEO_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{11}")
+
+search_cache = TTLCache("youtube_search", maxsize=YOUTUBE_CACHE_SIZE, ttl=YOUTUBE_SEARCH_CACHE_TTL)
+details_cache = TTLCache("youtube_details", maxsize=YOUTUBE_CACHE_SIZE, ttl=YOUTUBE_DETAILS_CACHE_TTL)
+
+# Shared keep-alive session for the sync API calls
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=HTTP_MAX_CONNECTIONS))
+
+# Shared async client so concurrent suggestions reuse keep-alive connections
+_async_client = None
+
+def get_async_client() -> httpx.AsyncClient:
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(
+            timeout=YOUTUBE_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_CONNECTIONS
+            )
+        )
+    return _async_client
+
+async def close_async_client():
+    """Closes the pooled async client (called on app shutdown)."""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+def _search_params(query: str, max_results: int) -> dict:
+    return {
         "part": "snippet",
         "q": query,
         "type": "video",
         "key": YOUTUBE_API_KEY,
         "maxResults": max_results
     }
-    
+
+def _details_params(video_ids: list[str]) -> dict:
+    return {
+        "part": "contentDetails,snippet",
+        "id": ",".join(video_ids),
+        "key": YOUTUBE_API_KEY
+    }
+
+def _parse_search(data: dict) -> list[dict]:
+    results = []
+    for item in data.get("items", []):
+        results.append({
+            "youtube_id": item["id"]["videoId"],
+            "title": item["snippet"]["title"],
+            "channel": item["snippet"]["channelTitle"],
+            "thumbnail": item["snippet"]["thumbnails"]["default"]["url"]
+        })
+    return results
+
+def _parse_details(data: dict) -> dict:
+    details = {}
+    for item in data.get("items", []):
+        vid = item["id"]
+        details[vid] = {
+            "duration": item["contentDetails"]["duration"], # Needs parsing (PT4M13S)
+            "title": item["snippet"]["title"],
+            "channel": item["snippet"]["channelTitle"],
+            "categoryId": item["snippet"].get("categoryId"),
+            "tags": item["snippet"].get("tags", [])
+        }
+    return details
+
+def parse_video_id(text: str) -> Optional[str]:
+    """The video id in a YouTube link or a bare id, None for a search query."""
+    text = text.strip()
+    match = VIDEO_URL_PATTERN.search(text)
+    if match:
+        return match.group(1)
+    # Bare ids: 11 url-safe characters; all-letter words stay queries
+    if VIDEO_ID_PATTERN.fullmatch(text) and not text.isalpha():
+        return text
+    return None
+
+def _search_cache_key(query: str, max_results: int) -> str:
+    return f"{max_results}:{' '.join(query.casefold().split())}"
+
+def _enabled() -> bool:
+    if YOUTUBE_PROVIDER == "fake":
+        return True
+    if not YOUTUBE_API_KEY:
+        logger.warning("No YOUTUBE_API_KEY set.")
+        return False
+    return True
+
+# Raw API calls: the only place that picks the provider. Everything above and below them
+# (caches, batching, parsing) is shared, so the fake exercises the same pipeline.
+
+@external_call("youtube", "search")
+def _fetch_search(query: str, max_results: int) -> dict:
+    if YOUTUBE_PROVIDER == "fake":
+        return fake_providers.get_youtube().search(query, max_results)
+    response = _session.get(YOUTUBE_SEARCH_URL, params=_search_params(query, max_results), timeout=YOUTUBE_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+@external_call("youtube", "search")
+async def _fetch_search_async(query: str, max_results: int) -> dict:
+    if YOUTUBE_PROVIDER == "fake":
+        return await fake_providers.get_youtube().search_async(query, max_results)
+    response = await get_async_client().get(YOUTUBE_SEARCH_URL, params=_search_params(query, max_results))
+    response.raise_for_status()
+    return response.json()
+
+@external_call("youtube", "videos")
+def _fetch_details(video_ids: list[str]) -> dict:
+    """One videos.list call (at most MAX_IDS_PER_CALL ids). Raises on HTTP errors."""
+    if YOUTUBE_PROVIDER == "fake":
+        return _parse_details(fake_providers.get_youtube().videos(video_ids))
+    response = _session.get(YOUTUBE_VIDEOS_URL, params=_details_params(video_ids), timeout=YOUTUBE_TIMEOUT)
+    response.raise_for_status()
+    return _parse_details(response.json())
+
+
+class DetailsBatcher:
+    """
+    Coalesces concurrent detail lookups into videos.list calls of up to 50 ids.
+    Ids requested within the batch window share one call; full batches go out immediately.
+    Callers get one Future per id resolving to the details dict (or None if not found/failed).
+    """
+
+    def __init__(self, window: float, max_batch: int = MAX_IDS_PER_CALL, max_workers: int = 4):
+        self.window = window
+        self.max_batch = max_batch
+        self.calls = 0
+        self._pending = {} # video_id -> Future (requested but not yet resolved)
+        self._waiting = [] # video_ids not yet assigned to a call
+        self._timer = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="yt-details")
+
+    def submit(self, video_ids: list[str]) -> dict:
+        futures = {}
+        with self._lock:
+            for vid in video_ids:
+                future = self._pending.get(vid)
+                if future is None or future.cancelled():
+                    future = Future()
+                    self._pending[vid] = future
+                    self._waiting.append(vid)
+                futures[vid] = future
+
+            while len(self._waiting) >= self.max_batch:
+                batch, self._waiting = self._waiting[:self.max_batch], self._waiting[self.max_batch:]
+                self._executor.submit(self._run, batch)
+            if self._waiting and self._timer is None:
+                self._timer = threading.Timer(self.window, self._flush)
+                self._timer.daemon = True
+                self._timer.start()
+        return futures
+
+    def _flush(self):
+        with self._lock:
+            self._timer = None
+            waiting, self._waiting = self._waiting, []
+        for i in range(0, len(waiting), self.max_batch):
+            self._executor.submit(self._run, waiting[i:i + self.max_batch])
+
+    def _run(self, batch: list[str]):
+        self.calls += 1
+        details = {}
+        try:
+            details = _fetch_details(batch)
+            for vid, info in details.items():
+                details_cache.set(vid, info)
+        except Exception as e:
+            logger.error(f"YouTube Details Error: {e}")
+        finally:
+            # Every future of the batch is resolved, whatever happened above
+            with self._lock:
+                futures = [(vid, self._pending.pop(vid, None)) for vid in batch]
+            for vid, future in futures:
+                if future is None or future.done():
+                    continue
+                try:
+                    future.set_result(details.get(vid))
+                except InvalidStateError:
+                    pass # Cancelled in the meantime
+
+
+details_batcher = DetailsBatcher(window=YOUTUBE_BATCH_WINDOW_MS / 1000)
+
+def search_video(query: str, max_results: int = 5):
+    if not _enabled():
+        return []
+
+    key = _search_cache_key(query, max_results)
+    cached = search_cache.get(key)
+    if cached is not None:
+        return cached
+
     try:
-        response = requests.get(YOUTUBE_SEARCH_URL, params=params)
-        response.raise_for_status()
-        data = response.json()
-        
-        results = []
-        for item in data.get("items", []):
-            results.append({
-                "youtube_id": item["id"]["videoId"],
-                "title": item["snippet"]["title"],
-                "channel": item["snippet"]["channelTitle"],
-                "thumbnail": item["snippet"]["thumbnails"]["default"]["url"]
-            })
+        results = _parse_search(_fetch_search(query, max_results))
+        search_cache.set(key, results)
         return results
     except Exception as e:
         logger.error(f"YouTube Search Error: {e}")
         return []
 
+def _split_cached(video_ids: list[str]):
+    found, missing = {}, []
+    for vid in dict.fromkeys(video_ids): # dedupe, keep order
+        info = details_cache.get(vid)
+        if info is not None:
+            found[vid] = info
+        else:
+            missing.append(vid)
+    return found, missing
+
 def get_video_details(video_ids: list[str]):
-    if not YOUTUBE_API_KEY:
+    """
+    Details for any number of ids (bulk imports can pass hundreds).
+    Served from cache where possible; the rest is batched 50 ids per API call.
+    """
+    if YOUTUBE_PROVIDER != "fake" and not YOUTUBE_API_KEY:
         return {}
-        
-    params = {
-        "part": "contentDetails,snippet",
-        "id": ",".join(video_ids),
-        "key": YOUTUBE_API_KEY
-    }
-    
+
+    details, missing = _split_cached(video_ids)
+    if missing:
+        for vid, future in details_batcher.submit(missing).items():
+            info = future.result()
+            if info is not None:
+                details[vid] = info
+    return details
+
+async def search_video_async(query: str, max_results: int = 5):
+    """Async variant of search_video using the pooled httpx client."""
+    if not _enabled():
+        return []
+
+    key = _search_cache_key(query, max_results)
+    cached = search_cache.get(key)
+    if cached is not None:
+        return cached
+
     try:
-        response = requests.get(YOUTUBE_VIDEOS_URL, params=params)
-        response.raise_for_status()
-        data = response.json()
-        
-        details = {}
-        for item in data.get("items", []):
-            vid = item["id"]
-            details[vid] = {
-                "duration": item["contentDetails"]["duration"], # Needs parsing (PT4M13S)
-                "title": item["snippet"]["title"],
-                "channel": item["snippet"]["channelTitle"],
-                "categoryId": item["snippet"].get("categoryId"),
-                "tags": item["snippet"].get("tags", [])
-            }
-        return details
+        results = _parse_search(await _fetch_search_async(query, max_results))
+        search_cache.set(key, results)
+        return results
     except Exception as e:
-        logger.error(f"YouTube Details Error: {e}")
+        logger.error(f"YouTube Search Error: {e}")
+        return []
+
+async def get_video_details_async(video_ids: list[str]):
+    """Async variant of get_video_details; awaits the shared batcher without blocking the loop."""
+    if YOUTUBE_PROVIDER != "fake" and not YOUTUBE_API_KEY:
         return {}
+
+    details, missing = _split_cached(video_ids)
+    if missing:
+        futures = details_batcher.submit(missing)
+        # Shielded: the futures are shared with other callers, so a timed-out caller mustn't cancel them
+        results = await asyncio.gather(*(asyncio.shield(asyncio.wrap_future(f)) for f in futures.values()))
+        for vid, info in zip(futures, results):
+            if info is not None:
+                details[vid] = info
+    return details
@@ -0,0 +1,198 @@
+import sys
+import os
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import logging
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Offline simulation of the recommendation loop: Auto-DJ picks (QueueManager + JukeboxAgent +
+# rag_service) against a synthetic catalogue and simulated voters, with no YouTube, LLM or
+# model download. Reports pop_next throughput/latency, memory and how fast the agent learns.
+#   python simulate.py --songs 5000 --picks 2000
+#   python simulate.py --max-p99-ms 20 --min-final-reward 0.5   # exit 1 on regression
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Simulate the Auto-DJ recommendation loop.")
+    parser.add_argument("--songs", type=int, default=2000, help="Synthetic catalogue size")
+    parser.add_argument("--picks", type=int, default=1000, help="Songs to play")
+    parser.add_argument("--voters", type=int, default=10)
+    parser.add_argument("--vote-probability", type=float, default=0.3, help="Chance each voter votes on a song")
+    parser.add_argument("--suggest-rate", type=float, default=0.1, help="Chance per song that someone queues a song")
+    parser.add_argument("--window", type=int, default=100, help="Picks per reward-curve point")
+    parser.add_argument("--vector-backend", default="numpy", choices=["numpy", "chroma"])
+    parser.add_argument("--queue-backend", default="sqlite", choices=["sqlite", "memory"])
+    parser.add_argument("--prefetch", type=int, default=3, help="AUTO_DJ_PREFETCH, 0 = compute picks inline")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--data-dir", help="Keep the simulation data here instead of a temp dir")
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--min-picks-per-sec", type=float)
+    parser.add_argument("--max-p99-ms", type=float)
+    parser.add_argument("--min-final-reward", type=float, help="Minimum reward per Auto-DJ pick in the last window")
+    return parser.parse_args()
+
+def peak_memory_mb():
+    try:
+        import resource
+    except ImportError:
+        return None # Windows
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def main():
+    args = parse_args()
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="jukebox-sim-")
+    # Settings are read on import, so the environment goes first
+    os.environ["DATA_DIR"] = data_dir
+    os.environ["VECTOR_BACKEND"] = args.vector_backend
+    os.environ["QUEUE_BACKEND"] = args.queue_backend
+    os.environ["AUTO_DJ_PREFETCH"] = str(args.prefetch)
+    logging.basicConfig(level=logging.WARNING)
+
+    import numpy as np
+    from sqlmodel import Session
+    from models.db_models import Song
+    from models import database
+    from services import rag_service
+    from services.catalog_service import find_local_song
+    from services.queue_manager import queue_manager
+    from services.rl_service import agent, VOTE_REWARDS
+    from services.write_buffer import db_writer
+    from services.simulation import HashingEmbedder, SimulatedOffice, synthetic_catalogue
+
+    random.seed(args.seed)
+    np.random.seed(args.seed)
+    office = SimulatedOffice(voters=args.voters, vote_probability=args.vote_probability, seed=args.seed)
+    agent.clock = office.clock
+    agent.state_file = None # Learn in memory only
+    rag_service.warm_up(background=False, embedding_func=HashingEmbedder())
+
+    # 1. Catalogue: Song rows + vectors
+    started = time.perf_counter()
+    catalogue = synthetic_catalogue(args.songs, seed=args.seed)
+    with Session(database.engine) as session:
+        session.add_all([
+            Song(youtube_id=s["youtube_id"], title=s["title"], artist=s["artist"], duration=210,
+                 thumbnail_url="", tags=s["tags"])
+            for s in catalogue
+        ])
+        session.commit()
+        ids = dict(session.exec(Song.__table__.select().with_only_columns(Song.youtube_id, Song.id)).all())
+    for start in range(0, len(catalogue), 512):
+        rag_service.add_songs_to_rag([
+            {"song_id": ids[s["youtube_id"]], "title": s["title"], "artist": s["artist"], "tags": s["tags"]}
+            for s in catalogue[start:start + 512]
+        ], use_cache=False)
+    genre_of = {ids[s["youtube_id"]]: s["genre"] for s in catalogue}
+    seed_seconds = time.perf_counter() - started
+
+    db_writer.start()
+    queue_manager.prefetcher.start()
+
+    # 2. Play
+    latencies, curve = [], []
+    window = {"auto": 0, "reward": 0.0, "best": 0, "requested": 0}
+    started = time.perf_counter()
+    for pick in range(1, args.picks + 1):
+        if random.random() < args.suggest_rate:
+            # Stand-in for the suggest flow: the LLM correction is the identity and the
+            # local catalogue replaces YouTube search
+            wanted = random.choice(catalogue)
+            song = find_local_song(f"{wanted['title']} {wanted['artist']}")
+            if song:
+                queue_manager._enqueue(song, requested_by=f"voter{random.randrange(args.voters)}")
+
+        if args.prefetch:
+            # Songs last minutes in real life; give the prefetcher its chance to finish
+            deadline = time.perf_counter() + 1.0
+            while not queue_manager.prefetcher.peek() and time.perf_counter() < deadline:
+                time.sleep(0.0005)
+
+        call_started = time.perf_counter()
+        song = queue_manager.pop_next()
+        latencies.append(time.perf_counter() - call_started)
+        if not song:
+            continue
+
+        auto = queue_manager.backend.attribution(song.id) is not None
+        votes = office.votes_for(genre_of[song.id])
+        for vote_type in votes:
+            queue_manager.vote(song.id, vote_type)
+        if auto:
+            window["auto"] += 1
+            window["reward"] += sum(VOTE_REWARDS[v] for v in votes)
+            window["best"] += genre_of[song.id] == office.best_genre()
+        else:
+            window["requested"] += 1
+        office.advance()
+
+        if pick % args.window == 0:
+            auto_picks = max(window["auto"], 1)
+            curve.append({
+                "picks": pick,
+                "reward_per_auto_pick": round(window["reward"] / auto_picks, 3),
+                "best_genre_share": round(window["best"] / auto_picks, 3),
+                "requested": window["requested"]
+            })
+            window = {"auto": 0, "reward": 0.0, "best": 0, "requested": 0}
+    wall_seconds = time.perf_counter() - started
+
+    queue_manager.prefetcher.stop()
+    db_writer.stop()
+
+    latencies_ms = np.array(latencies) * 1000
+    results = {
+        "songs": args.songs,
+        "picks": args.picks,
+        "vector_backend": args.vector_backend,
+        "queue_backend": args.queue_backend,
+        "prefetch_size": args.prefetch,
+        "seed_seconds": round(seed_seconds, 2),
+        "wall_seconds": round(wall_seconds, 2),
+        "picks_per_sec": round(len(latencies) / latencies_ms.sum() * 1000, 1),
+        "pop_next_p50_ms": round(float(np.percentile(latencies_ms, 50)), 3),
+        "pop_next_p99_ms": round(float(np.percentile(latencies_ms, 99)), 3),
+        "pop_next_max_ms": round(float(latencies_ms.max()), 3),
+        "prefetch": queue_manager.prefetcher.stats(),
+        "peak_memory_mb": peak_memory_mb(),
+        "agent_pulls": dict(zip(agent.actions, agent.counts.tolist())),
+        "reward_curve": curve
+    }
+
+    print(f"Catalogue: {args.songs} songs seeded in {results['seed_seconds']}s "
+          f"({args.vector_backend} vectors, {args.queue_backend} queue)")
+    print(f"pop_next: {results['picks_per_sec']} picks/s, p50 {results['pop_next_p50_ms']} ms, "
+          f"p99 {results['pop_next_p99_ms']} ms, max {results['pop_next_max_ms']} ms "
+          f"(prefetch hits {results['prefetch']['hits']}, misses {results['prefetch']['misses']})")
+    print(f"Peak memory: {results['peak_memory_mb']} MB, wall time {results['wall_seconds']}s")
+    print(f"{'picks':>7} {'reward/pick':>12} {'best genre':>11} {'requested':>10}")
+    for point in curve:
+        print(f"{point['picks']:>7} {point['reward_per_auto_pick']:>12.3f} "
+              f"{point['best_genre_share']:>11.3f} {point['requested']:>10}")
+    print("Agent pulls:", results["agent_pulls"])
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if not args.data_dir:
+        database.engine.dispose()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    failures = []
+    if args.min_picks_per_sec is not None and results["picks_per_sec"] < args.min_picks_per_sec:
+        failures.append(f"picks/s {results['picks_per_sec']} < {args.min_picks_per_sec}")
+    if args.max_p99_ms is not None and results["pop_next_p99_ms"] > args.max_p99_ms:
+        failures.append(f"p99 {results['pop_next_p99_ms']} ms > {args.max_p99_ms} ms")
+    if args.min_final_reward is not None and curve and curve[-1]["reward_per_auto_pick"] < args.min_final_reward:
+        failures.append(f"final reward {curve[-1]['reward_per_auto_pick']} < {args.min_final_reward}")
+    for failure in failures:
+        print(f"REGRESSION: {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -54,16 +54,67 @@ function onPlayerStateChange(event) {
 // API Interaction
 const API_BASE = "http://localhost:8000/api";
 
+let stateEtag = null; // Last seen state version, sent as If-None-Match
+let stateEpoch = null; // Queue store id; versions restart when it changes
+let stateVersion = 0;
+
 async function fetchState() {
     try {
-        const response = await fetch(`${API_BASE}/state`);
-        const data = await response.json();
-        renderState(data);
+        const headers = stateEtag ? { 'If-None-Match': stateEtag } : {};
+        const response = await fetch(`${API_BASE}/state`, { headers: headers, cache: 'no-store' });
+        if (response.status === 304) return; // Unchanged
+        stateEtag = response.headers.get('ETag');
+        applyState(await response.json());
     } catch (e) {
         console.error("Error fetching state:", e);
     }
 }
 
+function applyState(data) {
+    // Ignore snapshots older than what we already rendered (push and poll can interleave)
+    if (data.epoch === stateEpoch && data.version < stateVersion) return;
+    stateEpoch = data.epoch;
+    stateVersion = data.version;
+    renderState(data);
+}
+
+// Live updates: the server pushes a snapshot on every queue change.
+// While the socket is down we fall back to cheap conditional polling.
+let stateSocket = null;
+let pollTimer = null;
+let reconnectDelay = 1000;
+
+function connectStateSocket() {
+    stateSocket = new WebSocket(`${API_BASE.replace(/^http/, 'ws')}/ws/state`);
+
+    stateSocket.onopen = () => {
+        reconnectDelay = 1000;
+        stopPolling();
+    };
+
+    stateSocket.onmessage = (event) => {
+        stateEtag = null; // Version changed, force a full fetch if we fall back to polling
+        applyState(JSON.parse(event.data));
+    };
+
+    stateSocket.onclose = () => {
+        startPolling();
+        setTimeout(connectStateSocket, reconnectDelay);
+        reconnectDelay = Math.min(reconnectDelay * 2, 30000);
+    };
+}
+
+function startPolling() {
+    if (!pollTimer) pollTimer = setInterval(fetchState, 5000);
+}
+
+function stopPolling() {
+    if (pollTimer) {
+        clearInterval(pollTimer);
+        pollTimer = null;
+    }
+}
+
 async function suggestSong() {
     const input = document.getElementById('suggestion-input');
     const query = input.value.trim();
@@ -174,6 +225,25 @@ function renderState(data) {
         list.appendChild(item);
     });
 
+    // Queue empty: show what Auto-DJ will play next
+    const upNext = data.up_next || [];
+    if (data.queue.length === 0) {
+        upNext.forEach(song => {
+            const item = document.createElement('div');
+            item.className = 'queue-item';
+            item.style.opacity = '0.6';
+            item.innerHTML = `
+                <img src="${song.thumbnail_url}" alt="art">
+                <div class="queue-info">
+                    <span class="queue-title">${song.title}</span>
+                    <span class="queue-artist">${song.artist} · Auto-DJ</span>
+                </div>
+            `;
+            list.appendChild(item);
+        });
+    }
+    preloadNext(data.queue[0] || upNext[0]);
+
     // Update Heart on Now Playing
     const heartBtn = document.getElementById('np-heart');
     if (data.now_playing) {
@@ -182,6 +252,22 @@ function renderState(data) {
     }
 }
 
+// Warm the browser cache for the next track so the transition doesn't wait on the network
+let preloadedId = null;
+function preloadNext(song) {
+    if (!song || !song.youtube_id || song.youtube_id === preloadedId) return;
+    preloadedId = song.youtube_id;
+    if (song.thumbnail_url) new Image().src = song.thumbnail_url;
+    let link = document.getElementById('next-embed-prefetch');
+    if (!link) {
+        link = document.createElement('link');
+        link.id = 'next-embed-prefetch';
+        link.rel = 'prefetch';
+        document.head.appendChild(link);
+    }
+    link.href = `https://www.youtube.com/embed/${song.youtube_id}`;
+}
+
 async function toggleFavorite(songId) {
     if (!songId) return;
     try {
@@ -253,8 +339,8 @@ async function fetchRecommendations() {
 fetchPlaylists();
 fetchRecommendations();
 
-// Polling
-setInterval(fetchState, 5000);
+// Live state (WebSocket push, polling fallback)
+connectStateSocket();
 
 // ============ PLAYBACK CONTROLS ============
 
@@ -1,9 +1,10 @@
 import chromadb
 import os
 from config import DATA_DIR
+from services.rag_service import active_collection_name
 
 client = chromadb.PersistentClient(path=os.path.join(DATA_DIR, "chroma_db"))
-collection = client.get_collection("jukebox_songs")
+collection = client.get_collection(active_collection_name()) # May be a re-indexed copy
 
 # Get all items
 results = collection.get()